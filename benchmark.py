@@ -0,0 +1,222 @@
+"""
+Benchmark do ETL com dados sintéticos (sem SQL Server).
+
+Para cada fator de escala:
+1. Gera os dados no formato do AdventureWorks (src.synthetic)
+2. Grava num SQLite local e aponta o pool de conexões para ele
+3. Roda extract_all, transform_data e load_data
+4. Registra tempo, vazão (linhas/s) e pico de memória de cada estágio
+
+Cada escala roda num processo novo para o pico de memória de uma
+não contaminar a outra. Dentro da escala, o pico do processo é zerado
+antes de cada estágio (Linux, src.metrics.reset_peak_rss); onde isso não
+existe, só a variação de RSS do estágio é registrada.
+
+Uso:
+    python benchmark.py                       # escalas 1 e 10
+    python benchmark.py --scales 1 10 100
+    python benchmark.py --compare .etl_reports/benchmark_anterior.json
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+
+BENCH_DIR = ".etl_bench"
+REPORT_DIR = ".etl_reports"
+DEFAULT_SCALES = [1, 10]
+
+# Um estágio é regressão se ficar mais de 20% mais lento que a referência
+REGRESSION_TOLERANCE = 0.20
+
+STAGES = ["generate", "extract", "transform", "load"]
+
+
+def run_scale(scale, seed=42, engine="pandas", workers=None, keep_db=False):
+    """
+    Executa o ETL completo numa escala e devolve as medições.
+
+    Roda dentro do processo filho criado por main().
+
+    Returns:
+        dict: Medições por estágio + relatório completo do src.metrics
+    """
+    from src.connection_pool import configure_pool
+    from src.extract import extract_all
+    from src.load import load_data
+    from src.metrics import current_rss_mb, peak_rss_mb, reset_peak_rss, set_verbosity, start_run
+    from src.synthetic import clear_table, create_sqlite_database, generate_data
+    from src.transform import transform_data
+
+    set_verbosity(0)
+    metrics = start_run(f"bench_x{scale:g}")
+    results = {"scale": scale, "seed": seed, "engine": engine, "workers": workers, "stages": {}}
+    stage_start = {}
+
+    def begin():
+        # Os estágios rodam um de cada vez neste processo: o pico zerado
+        # aqui é só do estágio que vai começar
+        stage_start["peak_reset"] = reset_peak_rss()
+        stage_start["rss_mb"] = current_rss_mb()
+        return time.perf_counter()
+
+    def record(stage, seconds, rows):
+        rss = current_rss_mb()
+        results["stages"][stage] = {
+            "seconds": round(seconds, 4),
+            "rows": rows,
+            "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": peak_rss_mb() if stage_start["peak_reset"] else None,
+            "rss_delta_mb": (None if rss is None or stage_start["rss_mb"] is None
+                             else round(rss - stage_start["rss_mb"], 1)),
+        }
+
+    # 1. Geração + banco local
+    directory = os.path.join(BENCH_DIR, f"x{scale:g}")
+    start = begin()
+    data = generate_data(scale, seed)
+    source_rows = sum(len(df) for df in data.values())
+    factory = create_sqlite_database(directory, data)
+    del data
+    record("generate", time.perf_counter() - start, source_rows)
+
+    configure_pool(factory=factory)
+
+    # 2. Extração
+    start = begin()
+    extracted = extract_all()
+    if extracted is None:
+        raise RuntimeError(f"Extração falhou na escala {scale}")
+    record("extract", time.perf_counter() - start, sum(len(df) for df in extracted.values()))
+
+    # 3. Transformação (vazão em linhas de detalhe processadas)
+    detail_rows = len(extracted["sales_detail"])
+    start = begin()
+    transformed = transform_data(extracted, workers=workers, engine=engine)
+    if transformed is None:
+        raise RuntimeError(f"Transformação falhou na escala {scale}")
+    record("transform", time.perf_counter() - start, detail_rows)
+    del extracted
+
+    # 4. Carga (SQLite não tem TRUNCATE)
+    clear_table(factory)
+    start = begin()
+    if not load_data(transformed, truncate=False):
+        raise RuntimeError(f"Carga falhou na escala {scale}")
+    record("load", time.perf_counter() - start, len(transformed))
+
+    # Latência dos lotes da carga
+    batch_seconds = [s["seconds"] for s in metrics.stages
+                     if s["stage"] == "load" and str(s.get("step", "")).startswith("lote")]
+    if batch_seconds:
+        results["stages"]["load"]["batch_p50_seconds"] = float(np.percentile(batch_seconds, 50))
+        results["stages"]["load"]["batch_p95_seconds"] = float(np.percentile(batch_seconds, 95))
+
+    results["report"] = metrics.to_dict()
+
+    if not keep_db:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    return results
+
+
+def compare_results(current, reference, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compara duas execuções do benchmark estágio a estágio.
+
+    Returns:
+        list: (escala, estágio, segundos antes, segundos agora) das regressões
+    """
+    previous = {r["scale"]: r for r in reference["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(result["scale"])
+        if before is None:
+            continue
+        for stage, values in result["stages"].items():
+            old = before["stages"].get(stage)
+            if old and values["seconds"] > old["seconds"] * (1 + tolerance):
+                regressions.append((result["scale"], stage, old["seconds"], values["seconds"]))
+    return regressions
+
+
+def print_results(results):
+    print("\n" + "="*78)
+    print("RESULTADO DO BENCHMARK")
+    print("="*78)
+    print(f"{'escala':>7} {'estágio':<10} {'linhas':>12} {'tempo (s)':>10} "
+          f"{'linhas/s':>12} {'pico RSS (MB)':>14} {'Δ RSS (MB)':>11}")
+    for result in results:
+        for stage in STAGES:
+            values = result["stages"].get(stage)
+            if values is None:
+                continue
+            rate = values["rows_per_second"]
+            peak = values["peak_rss_mb"]
+            delta = values.get("rss_delta_mb")
+            print(f"{result['scale']:>6g}x {stage:<10} {values['rows']:>12,} "
+                  f"{values['seconds']:>10.2f} "
+                  f"{(f'{rate:,.0f}' if rate else '-'):>12} "
+                  f"{(f'{peak:,.0f}' if peak else '-'):>14} "
+                  f"{(f'{delta:+,.0f}' if delta is not None else '-'):>11}")
+        load = result["stages"].get("load", {})
+        if "batch_p95_seconds" in load:
+            print(f"{'':>7} lotes da carga: p50 {load['batch_p50_seconds']*1000:.1f} ms, "
+                  f"p95 {load['batch_p95_seconds']*1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do ETL com dados sintéticos")
+    parser.add_argument("--scales", type=float, nargs="+", default=DEFAULT_SCALES,
+                        help="Fatores de escala (1 = tamanho do AdventureWorks)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--engine", default="pandas", help="Backend do transform_data")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos do modo particionado do transform_data")
+    parser.add_argument("--output", help="Arquivo JSON de saída")
+    parser.add_argument("--compare", help="JSON de um benchmark anterior para detectar regressões")
+    parser.add_argument("--keep-db", action="store_true", help="Mantém os bancos SQLite gerados")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        print(f"\nRodando escala {scale:g}x...")
+        # Processo novo por escala: o pico de RSS é medido isoladamente
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(run_scale, scale, args.seed, args.engine,
+                                     args.workers, args.keep_db)
+            results.append(future.result())
+
+    print_results(results)
+
+    output = {"created_at": datetime.now().isoformat(), "results": results}
+    path = args.output
+    if path is None:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = os.path.join(REPORT_DIR, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, default=str)
+    print(f"\nResultados gravados em {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            reference = json.load(f)
+        regressions = compare_results(output, reference)
+        if regressions:
+            print(f"\n⚠️  REGRESSÕES (> {REGRESSION_TOLERANCE:.0%} mais lento):")
+            for scale, stage, before, now in regressions:
+                print(f"   - {scale:g}x {stage}: {before:.2f}s -> {now:.2f}s")
+            raise SystemExit(1)
+        print("\nNenhuma regressão em relação à referência.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,72 @@
-num = int(input("Insira aqui uma informação para auxiliar"))
\ No newline at end of file
+"""
+Ponto de entrada do ETL.
+
+Roda extract, transform e load em pipeline (src.pipeline): a extração,
+a agregação e a carga se sobrepõem e a memória fica limitada à fila.
+
+Uso:
+    python main.py
+    python main.py --chunksize 100000 --queue-depth 8 --strategy merge
+    python main.py --no-load -v
+    python main.py --batch-size auto
+"""
+
+import argparse
+
+from src.extract import DEFAULT_CHUNK_SIZE
+from src.load import DEFAULT_BATCH_SIZE, LOAD_STRATEGIES
+from src.metrics import get_metrics, set_verbosity
+from src.pipeline import DEFAULT_QUEUE_DEPTH, run_pipeline
+from src.transform import YEARS_TO_ANALYZE
+
+
+def batch_size_arg(value):
+    """--batch-size: número de linhas ou "auto" (lote adaptativo)."""
+    if value == "auto":
+        return value
+    size = int(value)
+    if size < 1:
+        raise argparse.ArgumentTypeError("o lote precisa de ao menos 1 linha")
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ETL AdventureWorks -> Analytics.ProductSalesMetrics")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Linhas por chunk de Sales.SalesOrderDetail")
+    parser.add_argument("--queue-depth", type=int, default=DEFAULT_QUEUE_DEPTH,
+                        help="Máximo de chunks esperando a agregação")
+    parser.add_argument("--years", type=int, default=YEARS_TO_ANALYZE,
+                        help="Janela de anos analisada")
+    parser.add_argument("--strategy", choices=LOAD_STRATEGIES, default="insert",
+                        help="Estratégia de carga do load_data")
+    parser.add_argument("--batch-size", type=batch_size_arg, default=DEFAULT_BATCH_SIZE,
+                        help="Linhas por executemany na carga, ou \"auto\" para ajustar "
+                             "pela latência e vazão medidas")
+    parser.add_argument("--no-load", action="store_true", help="Para depois da classificação")
+    parser.add_argument("-v", "--verbose", action="count", default=1,
+                        help="Modo diagnóstico (prévia dos dados e memória)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Só erros e o resumo")
+    args = parser.parse_args()
+
+    set_verbosity(0 if args.quiet else min(args.verbose, 2))
+
+    result = run_pipeline(
+        chunksize=args.chunksize,
+        queue_depth=args.queue_depth,
+        years=args.years,
+        load=not args.no_load,
+        strategy=args.strategy,
+        batch_size=args.batch_size,
+    )
+
+    metrics = get_metrics()
+    metrics.print_summary()
+    metrics.write_report()
+
+    if result is None:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
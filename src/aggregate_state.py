@@ -0,0 +1,494 @@
+"""
+Estado incremental da agregação por produto (STEP 5 do transform_data).
+
+Responsabilidade:
+- Guardar somas e contagens parciais por produto e por dia
+- Somar nelas só as linhas de venda novas de cada execução
+- Subtrair os dias que saem da janela de YEARS_TO_ANALYZE anos
+- Gerar a mesma tabela de métricas do transform_data a partir do estado
+
+Por que?
+- O transform_data reagrega a janela inteira a cada execução;
+  aqui o custo acompanha o tamanho do delta, não o do histórico:
+  o fold soma o delta nos totais por produto, o expire descarta meses
+  inteiros e o save grava só as partes novas.
+
+Limitações:
+- Só linhas novas (SalesOrderDetailID maior que o último visto) entram.
+  Linhas alteradas ou apagadas na origem exigem rebuild().
+- Os buckets são por dia (OrderDate sem hora). No AdventureWorks OrderDate
+  não tem hora, então a janela é exatamente a do transform_data.
+"""
+
+import json
+import os
+
+import pandas as pd
+from src.metrics import log
+from src.transform import (
+    YEARS_TO_ANALYZE,
+    add_derived_metrics,
+    attach_product_attributes,
+    classify_performance,
+    finalize_metrics,
+)
+
+
+# Mesma pasta de estado do src.incremental
+STATE_DIR = ".etl_state"
+PARTIALS_DIR = "aggregate_partials"
+TOTALS_FILE = "aggregate_totals.parquet"
+META_FILE = "aggregate_state.json"
+PARTITION_PREFIX = "month="
+
+# Colunas somáveis do estado (UnitPriceSum / NumLines = AvgUnitPrice)
+SUM_COLUMNS = ["LineTotal", "OrderQty", "UnitPriceSum"]
+
+# Como juntar parciais da mesma chave
+AGGREGATIONS = {**{col: "sum" for col in SUM_COLUMNS}, "NumLines": "sum", "LastOrderDate": "max"}
+
+
+class ProductAggregateState:
+    """
+    Parciais por (ProductID, OrderDay) em partições mensais e totais
+    correntes por ProductID.
+
+    - partitions: mês (AAAA-MM) -> lista de partes; cada parte são os
+      parciais de um fold (um delta), com o seu próprio arquivo
+    - totals: soma das partes ainda na janela, indexada por ProductID
+
+    Por que partições por mês?
+    - fold acrescenta partes novas e soma o delta nos totais alinhando pelo
+      ProductID: nada é reagrupado além do delta
+    - expire descarta os meses inteiros fora da janela; só o mês do corte
+      é filtrado dia a dia
+    - save grava só as partes novas; as antigas ficam como estão
+    """
+
+    def __init__(self, years=YEARS_TO_ANALYZE):
+        self.years = years
+        self.partitions = {}
+        self.totals = self._empty(["ProductID"])
+        self.max_order_date = None
+        self.last_detail_id = None
+
+        self._state_dir = None      # de onde ler as partes ainda não carregadas
+        self._next_file = 1
+        self._dropped_files = []    # apagados no próximo save
+
+    @staticmethod
+    def _empty(index):
+        empty = pd.DataFrame({
+            "ProductID": pd.Series(dtype="int64"),
+            "OrderDay": pd.Series(dtype="datetime64[ns]"),
+            **{col: pd.Series(dtype="float64") for col in SUM_COLUMNS},
+            "NumLines": pd.Series(dtype="int64"),
+            "LastOrderDate": pd.Series(dtype="datetime64[ns]"),
+        })
+        if "OrderDay" not in index:
+            empty = empty.drop(columns="OrderDay")
+        return empty.set_index(index)
+
+    # ---------------- partes ----------------
+
+    @staticmethod
+    def _new_piece(frame):
+        days = frame.index.get_level_values("OrderDay")
+        return {"file": None, "frame": frame, "rows": len(frame),
+                "min_day": days.min(), "max_day": days.max()}
+
+    def _piece_frame(self, piece):
+        """Parciais da parte; lê o arquivo na primeira vez."""
+        if piece["frame"] is None:
+            path = os.path.join(self._state_dir, piece["file"])
+            piece["frame"] = pd.read_parquet(path).set_index(["ProductID", "OrderDay"])
+        return piece["frame"]
+
+    def _drop_piece(self, piece):
+        if piece["file"] is not None:
+            self._dropped_files.append(piece["file"])
+
+    def _add_pieces(self, partials):
+        months = partials.index.get_level_values("OrderDay").strftime("%Y-%m")
+        for month, frame in partials.groupby(months, sort=False):
+            self.partitions.setdefault(month, []).append(self._new_piece(frame))
+
+    @property
+    def num_partials(self):
+        """Linhas de parciais guardadas (produto/dia, somando todas as partes)."""
+        return sum(piece["rows"] for pieces in self.partitions.values() for piece in pieces)
+
+    @property
+    def partials(self):
+        """
+        Todos os parciais numa tabela, uma linha por (ProductID, OrderDay).
+
+        Lê e reagrupa todas as partes: só para inspeção e testes.
+        """
+        frames = [self._piece_frame(piece)
+                  for month in sorted(self.partitions) for piece in self.partitions[month]]
+        if not frames:
+            return self._empty(["ProductID", "OrderDay"])
+        return self.combine_partials(frames)
+
+    def _add_totals(self, per_product, sign=1):
+        """
+        Soma (sign=1) ou subtrai (sign=-1) totais por produto, alinhando pelo
+        índice: o custo é o do número de produtos, não o da janela.
+        """
+        columns = SUM_COLUMNS + ["NumLines"]
+        index = self.totals.index.union(per_product.index)
+        totals = self.totals.reindex(index)
+        change = per_product.reindex(index)
+
+        updated = totals[columns].fillna(0) + sign * change[columns].fillna(0)
+        updated["NumLines"] = updated["NumLines"].round().astype("int64")
+        if sign > 0:
+            updated["LastOrderDate"] = pd.concat(
+                [totals["LastOrderDate"], change["LastOrderDate"]], axis=1).max(axis=1)
+        else:
+            # LastOrderDate não é subtraível, mas o máximo de um produto que ainda
+            # tem vendas na janela é sempre um dia dentro da janela: não muda.
+            updated["LastOrderDate"] = totals["LastOrderDate"]
+
+        # Produtos sem nenhuma venda na janela saem do resultado
+        self.totals = updated[updated["NumLines"] > 0]
+
+    # ---------------- atualização ----------------
+
+    @staticmethod
+    def partial_aggregate(sales_lines):
+        """
+        Agrega linhas de venda (com OrderDate) por produto e dia.
+
+        Args:
+            sales_lines (pd.DataFrame): ProductID, OrderDate, LineTotal,
+                OrderQty, UnitPrice
+
+        Returns:
+            pd.DataFrame: Parciais indexados por (ProductID, OrderDay)
+        """
+        lines = sales_lines.assign(OrderDay=sales_lines["OrderDate"].dt.normalize())
+        partials = lines.groupby(["ProductID", "OrderDay"]).agg(
+            LineTotal=("LineTotal", "sum"),
+            OrderQty=("OrderQty", "sum"),
+            UnitPriceSum=("UnitPrice", "sum"),
+            NumLines=("LineTotal", "size"),
+            LastOrderDate=("OrderDate", "max"),
+        )
+        partials["OrderQty"] = partials["OrderQty"].astype("float64")
+        return partials
+
+    @staticmethod
+    def combine_partials(frames):
+        """
+        Junta saídas de partial_aggregate() numa só, uma linha por
+        (ProductID, OrderDay).
+
+        Args:
+            frames (list[pd.DataFrame]): Parciais de chunks ou partições
+
+        Returns:
+            pd.DataFrame: Parciais indexados por (ProductID, OrderDay)
+        """
+        return pd.concat(frames).groupby(level=["ProductID", "OrderDay"]).agg(AGGREGATIONS)
+
+    def fold_partials(self, partials):
+        """
+        Soma parciais já agregados (de um chunk, partição ou outra fonte).
+
+        Os parciais viram partes novas dos seus meses (sem juntar com as
+        existentes) e só o delta é agrupado por produto.
+
+        Args:
+            partials (pd.DataFrame): Saída de partial_aggregate()
+        """
+        if partials.empty:
+            return
+
+        batch_max = partials["LastOrderDate"].max()
+        if self.max_order_date is None or batch_max > self.max_order_date:
+            self.max_order_date = batch_max
+
+        self._add_pieces(partials)
+        self._add_totals(partials.groupby(level="ProductID").agg(AGGREGATIONS))
+
+    def fold(self, data):
+        """
+        Soma no estado as linhas de venda ainda não vistas.
+
+        Args:
+            data (dict): Mesmo formato do extract_all / extract_incremental
+                ("sales_detail" e "sales_header" são usados)
+
+        Returns:
+            int: Número de linhas novas somadas
+        """
+        detail = data["sales_detail"]
+        if self.last_detail_id is not None:
+            detail = detail[detail["SalesOrderDetailID"] > self.last_detail_id]
+
+        if detail.empty:
+            return 0
+
+        # Só OrderDate é necessária do header (mesmo INNER JOIN do STEP 2)
+        header = data["sales_header"][["SalesOrderID", "OrderDate"]]
+        lines = pd.merge(detail, header, on="SalesOrderID", how="inner")
+
+        # Linhas que chegam já fora da janela seriam expiradas em seguida
+        cutoff = self.cutoff_date()
+        if cutoff is not None:
+            lines = lines[lines["OrderDate"] >= cutoff]
+
+        self.fold_partials(self.partial_aggregate(lines))
+
+        new_last_id = int(detail["SalesOrderDetailID"].max())
+        if self.last_detail_id is None or new_last_id > self.last_detail_id:
+            self.last_detail_id = new_last_id
+
+        return len(lines)
+
+    def cutoff_date(self):
+        """Data de corte da janela (mesma regra do STEP 4) ou None se vazio."""
+        if self.max_order_date is None:
+            return None
+        return self.max_order_date - pd.DateOffset(years=self.years)
+
+    def expire(self):
+        """
+        Remove os dias fora da janela e subtrai seus parciais dos totais.
+
+        Meses inteiros antes do corte saem de uma vez; só as partes do mês
+        do corte que têm dias anteriores a ele são filtradas.
+
+        Returns:
+            int: Número de parciais (produto/dia) removidos
+        """
+        cutoff = self.cutoff_date()
+        if cutoff is None or not self.partitions:
+            return 0
+
+        cutoff_day = cutoff.normalize()
+        cutoff_month = cutoff_day.strftime("%Y-%m")
+        removed = []
+
+        for month in sorted(m for m in self.partitions if m <= cutoff_month):
+            pieces = self.partitions.pop(month)
+            if month < cutoff_month:
+                for piece in pieces:
+                    removed.append(self._piece_frame(piece))
+                    self._drop_piece(piece)
+                continue
+
+            kept = []
+            for piece in pieces:
+                if piece["min_day"] >= cutoff_day:
+                    kept.append(piece)
+                    continue
+                frame = self._piece_frame(piece)
+                expired_mask = frame.index.get_level_values("OrderDay") < cutoff_day
+                removed.append(frame[expired_mask])
+                self._drop_piece(piece)
+                if not expired_mask.all():
+                    kept.append(self._new_piece(frame[~expired_mask]))
+            if kept:
+                self.partitions[month] = kept
+
+        if not removed:
+            return 0
+
+        expired = pd.concat(removed)
+        self._add_totals(expired.groupby(level="ProductID")[SUM_COLUMNS + ["NumLines"]].sum(), sign=-1)
+        return len(expired)
+
+    def rebuild(self, data):
+        """Descarta o estado e reconstrói a partir do histórico completo."""
+        dropped = self._dropped_files + [
+            piece["file"] for pieces in self.partitions.values() for piece in pieces
+            if piece["file"] is not None
+        ]
+        state_dir, next_file = self._state_dir, self._next_file
+        self.__init__(self.years)
+        # Os arquivos antigos saem no próximo save; os nomes novos não colidem
+        self._state_dir, self._next_file, self._dropped_files = state_dir, next_file, dropped
+
+        self.fold(data)
+        self.expire()
+
+    # ---------------- resultado ----------------
+
+    def to_metrics(self, products):
+        """
+        Gera a saída do STEP 5 (uma linha por produto) a partir do estado.
+
+        Args:
+            products (pd.DataFrame | ProductDimension): Production.Product
+                extraída ou a dimensão em cache (src.dimension)
+
+        Returns:
+            pd.DataFrame: Mesmas colunas de aggregate_by_product()
+        """
+        totals = self.totals.sort_index()
+        metrics = pd.DataFrame({
+            "ProductID": totals.index.astype("int64"),
+            "TotalSales": totals["LineTotal"].to_numpy(),
+            "QtySold": totals["OrderQty"].round().astype("int64").to_numpy(),
+            "AvgUnitPrice": (totals["UnitPriceSum"] / totals["NumLines"]).to_numpy(),
+            "LastSaleDate": totals["LastOrderDate"].to_numpy(),
+            "NumOrders": totals["NumLines"].astype("int64").to_numpy(),
+        })
+
+        return attach_product_attributes(metrics, products)
+
+    # ---------------- persistência ----------------
+
+    def save(self, state_dir=STATE_DIR):
+        """
+        Grava as partes novas, os totais e o manifesto.
+
+        Layout:
+            .etl_state/aggregate_state.json      (metadados + partes de cada mês)
+            .etl_state/aggregate_totals.parquet
+            .etl_state/aggregate_partials/month=2013-06/part-00001.parquet
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        # Em outra pasta, nenhuma parte existe ainda: grava todas
+        moved = self._state_dir is not None and \
+            os.path.abspath(state_dir) != os.path.abspath(self._state_dir)
+
+        for month, pieces in sorted(self.partitions.items()):
+            for piece in pieces:
+                if piece["file"] is not None and not moved:
+                    continue
+                frame = self._piece_frame(piece)
+                name = os.path.join(PARTIALS_DIR, PARTITION_PREFIX + month,
+                                    f"part-{self._next_file:05d}.parquet")
+                self._next_file += 1
+                path = os.path.join(state_dir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                frame.reset_index().to_parquet(path + ".tmp", index=False)
+                os.replace(path + ".tmp", path)
+                piece["file"] = name
+
+        path = os.path.join(state_dir, TOTALS_FILE)
+        self.totals.reset_index().to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+        meta_path = os.path.join(state_dir, META_FILE)
+        meta = {
+            "years": self.years,
+            "max_order_date": None if self.max_order_date is None else self.max_order_date.isoformat(),
+            "last_detail_id": self.last_detail_id,
+            "next_file": self._next_file,
+            "partitions": {
+                month: [
+                    {"file": piece["file"], "rows": piece["rows"],
+                     "min_day": piece["min_day"].isoformat(), "max_day": piece["max_day"].isoformat()}
+                    for piece in pieces
+                ]
+                for month, pieces in sorted(self.partitions.items())
+            },
+        }
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        # Os arquivos descartados só saem depois do manifesto novo: uma falha
+        # no meio deixa arquivos órfãos, nunca um manifesto sem as suas partes
+        if not moved:
+            for name in self._dropped_files:
+                try:
+                    os.remove(os.path.join(state_dir, name))
+                except FileNotFoundError:
+                    pass
+        self._dropped_files = []
+        self._state_dir = state_dir
+
+    @classmethod
+    def load(cls, state_dir=STATE_DIR, years=YEARS_TO_ANALYZE):
+        """
+        Lê o estado salvo; retorna um estado vazio se não houver
+        ou se a janela (years) mudou.
+
+        Só os totais e o manifesto são lidos: as partes de cada mês ficam
+        no disco até o expire precisar delas.
+        """
+        state = cls(years)
+        meta_path = os.path.join(state_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            return state
+
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta["years"] != years:
+            log(f"   Janela mudou ({meta['years']} -> {years} anos): estado descartado")
+            return state
+
+        state._state_dir = state_dir
+        state.totals = pd.read_parquet(os.path.join(state_dir, TOTALS_FILE)).set_index("ProductID")
+        if meta["max_order_date"] is not None:
+            state.max_order_date = pd.Timestamp(meta["max_order_date"])
+        state.last_detail_id = meta["last_detail_id"]
+
+        state._next_file = meta["next_file"]
+        for month, entries in meta["partitions"].items():
+            state.partitions[month] = [
+                {"file": entry["file"], "frame": None, "rows": entry["rows"],
+                 "min_day": pd.Timestamp(entry["min_day"]), "max_day": pd.Timestamp(entry["max_day"])}
+                for entry in entries
+            ]
+        return state
+
+
+def transform_incremental(data, state_dir=STATE_DIR, years=YEARS_TO_ANALYZE):
+    """
+    Transformação a partir do estado incremental.
+
+    Args:
+        data (dict): Saída do extract_incremental (ou extract_all)
+        state_dir (str): Pasta do estado persistido
+        years (int): Janela de anos analisada
+
+    Returns:
+        pd.DataFrame: Mesmo formato do transform_data ou None se falhar
+    """
+
+    log(f"\n" + "="*60)
+    log("  INICIANDO A TRANSFORMAÇÃO (ESTADO INCREMENTAL)")
+    log("="*60)
+
+    try:
+        state = ProductAggregateState.load(state_dir, years)
+        log(f"\n Estado carregado: {state.num_partials:,} parciais produto/dia "
+            f"em {len(state.partitions)} meses")
+
+        new_lines = state.fold(data)
+        log(f"    Linhas novas somadas: {new_lines:,}")
+
+        expired = state.expire()
+        log(f"    Parciais expirados: {expired:,}")
+        log(f"    Data de corte: {state.cutoff_date()}")
+
+        products_metrics = state.to_metrics(data["products"])
+        log(f"    Produtos únicos: {len(products_metrics):,}")
+
+        products_metrics = add_derived_metrics(products_metrics)
+        products_metrics = classify_performance(products_metrics)
+        products_metrics = finalize_metrics(products_metrics)
+
+        state.save(state_dir)
+        log(f"    Estado salvo em {state_dir}")
+
+        return products_metrics
+
+    except Exception as e:
+        print(f"\n ERRO na transformação:")
+        print(f"   Tipo: {type(e).__name__}")
+        print(f"   Mensagem: {e}")
+
+        import traceback
+        print(f"\n🔍 Traceback completo:")
+        traceback.print_exc()
+
+        return None
@@ -0,0 +1,164 @@
+"""
+Backends de execução da transformação.
+
+Responsabilidade:
+- Rodar o plano do transform_data (JOIN -> filtro de data -> agregação ->
+  métricas -> ABC) em outro motor que não o pandas
+- Permitir escolher o motor a cada execução (engine do transform_data);
+  o pandas é o caminho do próprio transform_data e não passa por aqui
+
+Por que DuckDB?
+- Lê os DataFrames extraídos (ou Parquet em disco) sem copiar
+- Executa JOINs e GROUP BY vetorizados e em várias threads
+- Não materializa o DataFrame intermediário com todas as colunas
+"""
+
+from src.metrics import log
+from src.transform import YEARS_TO_ANALYZE, classify_performance, finalize_metrics
+
+
+class DuckDBBackend:
+    """
+    Executa os STEPs 2-5 e as métricas derivadas numa única query DuckDB.
+
+    A classificação ABC (STEP 6) roda no classify_performance do pandas
+    sobre a tabela já agregada (um produto por linha): o mesmo código para
+    percentis exatos ou por sketch.
+
+    Equivalências com o pandas:
+    - QtySold volta como BIGINT (SUM de inteiros no DuckDB é HUGEINT)
+    - GrossMargin é NULL quando ListPrice <= 0 ou o produto não existe
+    - Resultado ordenado por ProductID, como a saída do groupby
+    """
+
+    def __init__(self, threads=None):
+        """
+        Args:
+            threads (int): Threads do DuckDB; None = todos os núcleos
+        """
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError(
+                "Backend 'duckdb' requer o pacote duckdb (pip install duckdb)"
+            ) from e
+
+        self._duckdb = duckdb
+        self.threads = threads
+
+    def build_query(self, years=YEARS_TO_ANALYZE):
+        return f"""
+        WITH sales AS (
+            SELECT
+                d.SalesOrderID,
+                d.ProductID,
+                d.OrderQty,
+                d.UnitPrice,
+                d.LineTotal,
+                h.OrderDate
+            FROM sales_detail d
+            INNER JOIN sales_header h
+                ON h.SalesOrderID = d.SalesOrderID
+        ),
+        cutoff AS (
+            SELECT MAX(OrderDate) - INTERVAL {int(years)} YEAR AS CutoffDate
+            FROM sales
+        ),
+        aggregated AS (
+            SELECT
+                s.ProductID,
+                SUM(s.LineTotal) AS TotalSales,
+                CAST(SUM(s.OrderQty) AS BIGINT) AS QtySold,
+                AVG(s.UnitPrice) AS AvgUnitPrice,
+                MAX(s.OrderDate) AS LastSaleDate,
+                COUNT(s.SalesOrderID) AS NumOrders
+            FROM sales s, cutoff c
+            WHERE s.OrderDate >= c.CutoffDate
+            GROUP BY s.ProductID
+        ),
+        metrics AS (
+            -- Atributos do produto só depois de agregar: 1 linha por produto
+            SELECT
+                a.ProductID,
+                a.TotalSales,
+                a.QtySold,
+                a.AvgUnitPrice,
+                a.LastSaleDate,
+                p.ProductName,
+                p.ListPrice,
+                p.StandardCost,
+                a.NumOrders,
+                ROUND(a.TotalSales / a.NumOrders, 2) AS AvgTicket,
+                CASE
+                    WHEN p.ListPrice > 0
+                    THEN (p.ListPrice - p.StandardCost) / p.ListPrice * 100
+                END AS GrossMargin,
+                a.QtySold / a.NumOrders AS AvgQtyPerOrder
+            FROM aggregated a
+            LEFT JOIN products p
+                ON p.ProductID = a.ProductID
+        )
+        SELECT *
+        FROM metrics
+        ORDER BY ProductID
+        """
+
+    def _register(self, con, name, source):
+        """
+        Expõe uma fonte ao DuckDB sem copiar os dados.
+
+        Args:
+            source: DataFrame (lido direto da memória) ou caminho de Parquet
+        """
+        if isinstance(source, str):
+            path = source.replace("'", "''")
+            con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{path}')")
+        else:
+            con.register(name, source)
+
+    def transform(self, data, quantiles="exact"):
+        """
+        Args:
+            data (dict): Saída do extract_all
+            quantiles (str): "exact" ou "kll" (ver classify_performance)
+        """
+        log(f"\n STEPs 2-5: executando plano no DuckDB...")
+
+        con = self._duckdb.connect()
+        try:
+            if self.threads:
+                con.execute(f"SET threads TO {int(self.threads)}")
+
+            for name in ("sales_detail", "sales_header", "products"):
+                self._register(con, name, data[name])
+
+            products_metrics = con.execute(self.build_query()).df()
+        finally:
+            con.close()
+
+        log(f"    Produtos únicos: {len(products_metrics):,}")
+
+        products_metrics = classify_performance(products_metrics, quantiles)
+        return finalize_metrics(products_metrics)
+
+
+# Motores além do pandas: nome -> construtor do backend
+BACKENDS = {
+    "duckdb": DuckDBBackend,
+}
+
+
+def get_backend(name, **options):
+    """
+    Cria o backend pelo nome.
+
+    Args:
+        name (str): Um dos BACKENDS (ex.: "duckdb")
+        **options: Repassados ao construtor (ex.: threads)
+
+    Returns:
+        Objeto com transform(data, quantiles) que devolve as métricas
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {name}. Use \"pandas\" ou um de {sorted(BACKENDS)}")
+    return BACKENDS[name](**options)
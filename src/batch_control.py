@@ -0,0 +1,196 @@
+"""
+Controle adaptativo do tamanho de lote da carga (load_data).
+
+Responsabilidade:
+- Medir a latência e as linhas/s de cada lote enviado
+- Aumentar o lote enquanto a vazão cresce e reduzir quando ela cai
+- Recuar rápido (pela metade) em picos de latência ou esperas por lock
+- Guardar os tamanhos escolhidos e a vazão para o relatório da execução
+
+Como funciona (AIMD, como o controle de congestionamento do TCP):
+- Partida lenta: dobra o lote a cada lote enquanto as linhas/s melhoram;
+  num link com latência alta, lotes pequenos deixam o round trip ocioso
+- Depois do primeiro recuo ou da vazão estabilizar, cresce de step em step
+- Recuo multiplicativo: latência acima de max_latency, acima de
+  spike_factor vezes a esperada para o tamanho do lote, ou esperas por lock
+  na sessão reduzem o lote pela metade
+
+Uso:
+    controller = AdaptiveBatchController()
+    load_data(df, batch_size=controller)      # ou batch_size="auto"
+    controller.report()
+"""
+
+from src.metrics import get_metrics
+
+
+DEFAULT_INITIAL_SIZE = 1000
+DEFAULT_MIN_SIZE = 100
+DEFAULT_MAX_SIZE = 50_000
+
+# Segundos máximos de um lote: acima disso o lote segura locks e o log
+# de transação por tempo demais
+DEFAULT_MAX_LATENCY = 5.0
+
+# Lote X vezes mais lento que o esperado para o seu tamanho = pico
+DEFAULT_SPIKE_FACTOR = 3.0
+
+# Variação de linhas/s tratada como ruído
+THROUGHPUT_TOLERANCE = 0.05
+
+# Tempo de espera por lock da própria sessão (SQL Server 2016+), acumulado
+LOCK_WAIT_QUERY = """
+    SELECT COALESCE(SUM(wait_time_ms), 0)
+    FROM sys.dm_exec_session_wait_stats
+    WHERE session_id = @@SPID AND wait_type LIKE 'LCK_M_%'
+"""
+
+
+class AdaptiveBatchController:
+    """
+    Escolhe o tamanho do próximo lote a partir das medidas dos anteriores.
+    """
+
+    def __init__(self, initial_size=DEFAULT_INITIAL_SIZE, min_size=DEFAULT_MIN_SIZE,
+                 max_size=DEFAULT_MAX_SIZE, max_latency=DEFAULT_MAX_LATENCY,
+                 spike_factor=DEFAULT_SPIKE_FACTOR, step=None):
+        """
+        Args:
+            initial_size (int): Tamanho do primeiro lote
+            min_size, max_size (int): Limites do tamanho do lote
+            max_latency (float): Segundos máximos de um lote antes de recuar
+            spike_factor (float): Lote quantas vezes mais lento que o esperado
+                conta como pico de latência
+            step (int): Crescimento por lote depois da partida lenta
+                (padrão: metade do initial_size)
+        """
+        if not 0 < min_size <= initial_size <= max_size:
+            raise ValueError("precisa de 0 < min_size <= initial_size <= max_size")
+
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self.spike_factor = spike_factor
+        self.step = step or max(1, initial_size // 2)
+
+        self.slow_start = True
+        self.history = []
+        self._last_seconds = None
+        self._last_rate = None
+        self._last_size = None
+        self._lock_probe = True
+        self._last_lock_ms = None
+
+    def _clamp(self, size):
+        return int(min(self.max_size, max(self.min_size, size)))
+
+    # ---------------- medidas ----------------
+
+    def read_lock_wait_ms(self, cursor):
+        """
+        Espera por lock acumulada da sessão desde a última leitura, em ms.
+
+        Returns:
+            float | None: None se o banco não expõe a DMV (ex.: SQLite ou
+                sem permissão); a leitura é desligada no primeiro erro
+        """
+        if not self._lock_probe:
+            return None
+        try:
+            cursor.execute(LOCK_WAIT_QUERY)
+            total = float(cursor.fetchone()[0])
+            get_metrics().count("db_round_trips")
+        except Exception:
+            self._lock_probe = False
+            return None
+
+        previous, self._last_lock_ms = self._last_lock_ms, total
+        return 0.0 if previous is None else max(0.0, total - previous)
+
+    def record(self, rows, seconds, lock_wait_ms=None):
+        """
+        Registra um lote enviado e ajusta o tamanho do próximo.
+
+        Args:
+            rows (int): Linhas do lote
+            seconds (float): Tempo do executemany (+ commit, se houve)
+            lock_wait_ms (float): Espera por lock durante o lote (None = sem medida)
+
+        Returns:
+            int: Tamanho do próximo lote
+        """
+        seconds = max(seconds, 1e-9)
+        rate = rows / seconds
+        # Latência esperada: a do último lote normal, proporcional ao tamanho.
+        # Com round trip fixo, lotes maiores saem abaixo disso, nunca acima
+        expected = None if self._last_seconds is None else self._last_seconds * rows / self._last_size
+
+        if lock_wait_ms:
+            action = "recuo: lock"
+        elif seconds > self.max_latency:
+            action = "recuo: latência"
+        elif expected is not None and seconds > self.spike_factor * expected:
+            action = "recuo: pico"
+        elif self._last_rate is not None and rate < self._last_rate * (1 - THROUGHPUT_TOLERANCE):
+            # Lote maior rendeu menos: volta ao tamanho anterior.
+            # Mesmo tamanho rendeu menos: o servidor mudou, espera a próxima medida
+            action = "volta" if rows > self._last_size else "mantém"
+        elif self.slow_start and (self._last_rate is None
+                                  or rate >= self._last_rate * (1 + THROUGHPUT_TOLERANCE)):
+            action = "dobra"
+        else:
+            # Vazão estável: sai da partida lenta e cresce devagar
+            action = "cresce"
+
+        self.history.append({
+            "batch": len(self.history) + 1,
+            "size": rows,
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(rate, 1),
+            "lock_wait_ms": lock_wait_ms,
+            "action": action,
+        })
+
+        if action.startswith("recuo"):
+            self.slow_start = False
+            self.size = self._clamp(self.size // 2)
+        elif action == "volta":
+            self.slow_start = False
+            self.size = self._clamp(self._last_size)
+        elif action == "mantém":
+            pass
+        elif action == "dobra":
+            self.size = self._clamp(self.size * 2)
+        else:
+            self.slow_start = False
+            self.size = self._clamp(self.size + self.step)
+
+        # Picos não viram referência: senão o próximo pico parece normal
+        if not action.startswith("recuo"):
+            self._last_seconds = seconds
+            self._last_rate = rate
+            self._last_size = rows
+
+        return self.size
+
+    # ---------------- relatório ----------------
+
+    def report(self):
+        """Tamanhos escolhidos e vazão obtida (vai para o relatório da execução)."""
+        if not self.history:
+            return {"batches": 0}
+
+        rows = sum(entry["size"] for entry in self.history)
+        seconds = sum(entry["seconds"] for entry in self.history)
+        best = max(self.history, key=lambda entry: entry["rows_per_second"])
+        return {
+            "batches": len(self.history),
+            "sizes": [entry["size"] for entry in self.history],
+            "final_size": self.size,
+            "best_size": best["size"],
+            "best_rows_per_second": best["rows_per_second"],
+            "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+            "backoffs": sum(entry["action"].startswith("recuo") for entry in self.history),
+            "lock_waits": sum(1 for entry in self.history if entry["lock_wait_ms"]),
+        }
@@ -0,0 +1,249 @@
+"""
+Cache local das extrações em disco (Arrow IPC / Feather).
+
+Responsabilidade:
+- Guardar o resultado de cada query para não reextrair do SQL Server
+  ao iterar no transform ou rodar de novo depois de uma falha na carga
+- Expirar entradas por TTL e limitar o tamanho total (LRU)
+- Contar acertos e falhas do cache
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+from src.connection_pool import get_pool_target
+from src.metrics import log
+
+
+# ============================================================
+# CONFIGURAÇÃO DO CACHE
+# ============================================================
+
+CACHE_DIR = ".etl_cache"
+CACHE_TTL = 24 * 3600                # segundos até uma entrada expirar
+CACHE_MAX_BYTES = 2 * 1024 ** 3      # 2 GB
+INDEX_FILE = "index.json"
+
+
+def _connection_target():
+    """
+    Identifica o banco de origem para a chave: servidor e banco que o
+    pool ativo responde (SELECT @@SERVERNAME, DB_NAME()).
+
+    Por que perguntar ao banco?
+    - O get_connection_string_info() do config.db_config é um resumo fixo
+      para debug, e o nome da fábrica não muda quando o db_config passa a
+      apontar para outro servidor: o cache serviria o banco antigo
+    - Duas fábricas diferentes (lambdas, fan-out) para o mesmo banco
+      compartilham as entradas
+    """
+    return get_pool_target()
+
+
+class ExtractCache:
+    """
+    Cache de DataFrames indexado por hash da query + banco de origem.
+
+    Por que Feather (Arrow IPC)?
+    - Leitura sem parse: os buffers do arquivo viram colunas direto
+    - Preserva dtypes (datetime, category, string) entre execuções
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        """
+        Args:
+            cache_dir (str): Pasta dos arquivos de cache
+            ttl (float): Segundos de validade de cada entrada (None = sem TTL)
+            max_bytes (int): Tamanho máximo do cache antes de despejar (LRU)
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._read_index()
+
+    # ---------------- índice ----------------
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.feather")
+
+    def _read_index(self):
+        path = self._index_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            # Índice corrompido: começa do zero, os arquivos órfãos são sobrescritos
+            return {}
+        # Descarta entradas cujo arquivo sumiu
+        return {k: v for k, v in index.items() if os.path.exists(self._data_path(k))}
+
+    def _write_index(self):
+        path = self._index_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _remove(self, key):
+        entry = self._index.pop(key, None)
+        try:
+            os.remove(self._data_path(key))
+        except FileNotFoundError:
+            pass
+        return entry
+
+    # ---------------- API ----------------
+
+    @staticmethod
+    def make_key(query, params=None, target=None):
+        """
+        Gera a chave de cache.
+
+        Args:
+            query (str): Texto da query
+            params (tuple): Parâmetros da query (faixas, datas)
+            target (str): Banco de origem; padrão = o do pool ativo
+
+        Returns:
+            str | None: None se o banco de origem não puder ser identificado
+                (a extração então não usa o cache)
+        """
+        if target is None:
+            target = _connection_target()
+        if target is None:
+            return None
+        # Normaliza espaços para a indentação da query não mudar a chave
+        normalized = " ".join(query.split())
+        raw = f"{target}\n{normalized}\n{params!r}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Retorna o DataFrame em cache ou None (miss ou expirado)."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            now = time.time()
+            if self.ttl is not None and now - entry["created_at"] > self.ttl:
+                self._remove(key)
+                self._write_index()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            try:
+                data = pd.read_feather(self._data_path(key))
+            except (OSError, ValueError) as e:
+                print(f" Cache corrompido para {entry['table']}: {e}")
+                self._remove(key)
+                self._write_index()
+                self.stats["misses"] += 1
+                return None
+
+            entry["last_access"] = now
+            self._write_index()
+            self.stats["hits"] += 1
+            return data
+
+    def put(self, key, df, table_name="tabela"):
+        """Grava o DataFrame no cache e despeja entradas antigas se preciso."""
+        path = self._data_path(key)
+        tmp_path = path + ".tmp"
+        # Feather exige índice padrão
+        df.reset_index(drop=True).to_feather(tmp_path)
+
+        with self._lock:
+            os.replace(tmp_path, path)
+            now = time.time()
+            self._index[key] = {
+                "table": table_name,
+                "created_at": now,
+                "last_access": now,
+                "size": os.path.getsize(path),
+            }
+            self._evict()
+            self._write_index()
+
+    def _evict(self):
+        """Remove as entradas menos usadas até caber em max_bytes (com o lock)."""
+        total = sum(entry["size"] for entry in self._index.values())
+        by_last_access = sorted(self._index.items(), key=lambda item: item[1]["last_access"])
+        for key, entry in by_last_access:
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= entry["size"]
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key=None, table_name=None):
+        """
+        Remove entradas do cache.
+
+        Args:
+            key (str): Remove só essa chave
+            table_name (str): Remove todas as entradas dessa tabela
+            Sem argumentos: limpa o cache inteiro
+
+        Returns:
+            int: Número de entradas removidas
+        """
+        with self._lock:
+            if key is not None:
+                keys = [key] if key in self._index else []
+            elif table_name is not None:
+                keys = [k for k, v in self._index.items() if v["table"] == table_name]
+            else:
+                keys = list(self._index)
+
+            for k in keys:
+                self._remove(k)
+            self._write_index()
+            return len(keys)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._index)
+            stats["bytes"] = sum(entry["size"] for entry in self._index.values())
+        return stats
+
+    def print_stats(self):
+        stats = self.get_stats()
+        log(f"\n CACHE DE EXTRAÇÃO:")
+        log(f"   Acertos: {stats['hits']:,}")
+        log(f"   Falhas: {stats['misses']:,} ({stats['expired']:,} expiradas)")
+        log(f"   Despejos (LRU): {stats['evictions']:,}")
+        log(f"   Entradas: {stats['entries']:,} ({stats['bytes']/1024**2:.2f} MB)")
+
+
+# ============================================================
+# CACHE PADRÃO DO ETL
+# ============================================================
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Retorna o cache padrão, criando-o no primeiro uso."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractCache()
+        return _cache
@@ -0,0 +1,298 @@
+"""
+Checkpoints de uma execução do ETL.
+
+Responsabilidade:
+- Guardar a saída de cada estágio (DataFrames extraídos, métricas
+  transformadas) em Feather, numa pasta por run ID
+- Registrar o último lote da carga que já recebeu commit
+- Numa nova execução, reaproveitar os estágios concluídos e retomar a
+  carga do lote seguinte, sem reextrair nem recalcular nada
+
+Por que Feather (Arrow IPC)?
+- Gravação e leitura sem parse, preservando os dtypes (como o src.cache)
+- Um arquivo por DataFrame: um estágio interrompido no meio não deixa
+  um snapshot pela metade marcado como concluído (o manifesto só é
+  atualizado depois de todos os arquivos gravados)
+
+Layout:
+    .etl_checkpoints/<run_id>/manifest.json
+    .etl_checkpoints/<run_id>/<estágio>__<nome>.feather
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+from src.metrics import get_metrics, log
+
+
+CHECKPOINT_DIR = ".etl_checkpoints"
+MANIFEST_FILE = "manifest.json"
+
+# Estágios com snapshot, na ordem do ETL
+SNAPSHOT_STAGES = ("extract", "transform")
+
+# Execuções concluídas mantidas na pasta (as mais recentes)
+KEEP_COMPLETED_RUNS = 5
+
+
+class RunCheckpoint:
+    """
+    Estado salvo de uma execução.
+
+    Uso:
+        checkpoint = RunCheckpoint.resume_or_start()
+
+        data = checkpoint.load_frames("extract")
+        if data is None:
+            data = extract_all()
+            checkpoint.save_frames("extract", data)
+        ...
+        load_data(transformed, checkpoint=checkpoint)
+        checkpoint.finish()
+    """
+
+    def __init__(self, run_id=None, checkpoint_dir=CHECKPOINT_DIR):
+        """
+        Args:
+            run_id (str): Identificador da execução; padrão = run_id das
+                métricas atuais (mesmo nome do relatório em .etl_reports)
+            checkpoint_dir (str): Pasta raiz dos checkpoints
+        """
+        self.run_id = run_id or get_metrics().run_id
+        self.checkpoint_dir = checkpoint_dir
+        self.run_dir = os.path.join(checkpoint_dir, self.run_id)
+        self.manifest = {
+            "run_id": self.run_id,
+            "status": "running",
+            "created_at": datetime.now().isoformat(),
+            "stages": {},
+            "load": None,
+        }
+
+    # ---------------- abrir / retomar ----------------
+
+    @classmethod
+    def open(cls, run_id, checkpoint_dir=CHECKPOINT_DIR):
+        """Abre o checkpoint salvo de run_id (FileNotFoundError se não existir)."""
+        checkpoint = cls(run_id, checkpoint_dir)
+        with open(checkpoint._manifest_path(), encoding="utf-8") as f:
+            checkpoint.manifest = json.load(f)
+        return checkpoint
+
+    @classmethod
+    def latest_unfinished(cls, checkpoint_dir=CHECKPOINT_DIR):
+        """Execução mais recente que não terminou, ou None."""
+        if not os.path.isdir(checkpoint_dir):
+            return None
+
+        for run_id in sorted(os.listdir(checkpoint_dir), reverse=True):
+            try:
+                checkpoint = cls.open(run_id, checkpoint_dir)
+            except (OSError, ValueError):
+                continue
+            if checkpoint.manifest["status"] != "complete":
+                return checkpoint
+        return None
+
+    @classmethod
+    def resume_or_start(cls, run_id=None, checkpoint_dir=CHECKPOINT_DIR, resume=True):
+        """
+        Retoma a execução informada (ou a última que não terminou) ou
+        começa uma nova.
+
+        Args:
+            run_id (str): Execução a retomar; None = a última não concluída
+            checkpoint_dir (str): Pasta raiz dos checkpoints
+            resume (bool): Se False, sempre começa uma execução nova
+        """
+        checkpoint = None
+        if resume:
+            if run_id is not None:
+                try:
+                    checkpoint = cls.open(run_id, checkpoint_dir)
+                except FileNotFoundError:
+                    checkpoint = None
+            else:
+                checkpoint = cls.latest_unfinished(checkpoint_dir)
+
+        if checkpoint is not None:
+            done = [stage for stage in SNAPSHOT_STAGES if checkpoint.is_complete(stage)]
+            log(f"\n Retomando execução {checkpoint.run_id} (estágios concluídos: {done or 'nenhum'})")
+            get_metrics().set_info(resumed_run_id=checkpoint.run_id)
+            return checkpoint
+
+        checkpoint = cls(run_id, checkpoint_dir)
+        checkpoint._write_manifest()
+        log(f"\n Checkpoint da execução {checkpoint.run_id} em {checkpoint.run_dir}")
+        return checkpoint
+
+    # ---------------- manifesto ----------------
+
+    def _manifest_path(self):
+        return os.path.join(self.run_dir, MANIFEST_FILE)
+
+    def _frame_path(self, stage, name):
+        return os.path.join(self.run_dir, f"{stage}__{name}.feather")
+
+    def _write_manifest(self):
+        os.makedirs(self.run_dir, exist_ok=True)
+        path = self._manifest_path()
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, default=str)
+        os.replace(path + ".tmp", path)
+
+    # ---------------- snapshots ----------------
+
+    def is_complete(self, stage):
+        return stage in self.manifest["stages"]
+
+    def save_frames(self, stage, frames):
+        """
+        Grava a saída de um estágio e o marca como concluído.
+
+        Args:
+            stage (str): "extract" ou "transform"
+            frames (dict | pd.DataFrame): nome -> DataFrame (ou um DataFrame só)
+        """
+        if isinstance(frames, pd.DataFrame):
+            frames = {"data": frames}
+
+        with get_metrics().stage("checkpoint", f"gravar {stage}") as record:
+            os.makedirs(self.run_dir, exist_ok=True)
+            rows = {}
+            for name, df in frames.items():
+                path = self._frame_path(stage, name)
+                # Feather exige índice padrão; o índice não carrega informação aqui
+                df.reset_index(drop=True).to_feather(path + ".tmp")
+                os.replace(path + ".tmp", path)
+                rows[name] = len(df)
+
+            self.manifest["stages"][stage] = {
+                "frames": rows,
+                "saved_at": datetime.now().isoformat(),
+            }
+            self._write_manifest()
+            record["rows_out"] = sum(rows.values())
+
+        log(f" Checkpoint '{stage}' salvo ({', '.join(f'{k}: {v:,}' for k, v in rows.items())})")
+
+    def load_frames(self, stage):
+        """
+        Lê a saída salva de um estágio.
+
+        Returns:
+            dict | pd.DataFrame: Mesmo formato passado ao save_frames, ou
+                None se o estágio não foi concluído nesta execução
+        """
+        entry = self.manifest["stages"].get(stage)
+        if entry is None:
+            return None
+
+        try:
+            with get_metrics().stage("checkpoint", f"ler {stage}") as record:
+                frames = {
+                    name: pd.read_feather(self._frame_path(stage, name))
+                    for name in entry["frames"]
+                }
+                record["rows_out"] = sum(len(df) for df in frames.values())
+        except (OSError, ValueError) as e:
+            print(f" Checkpoint '{stage}' ilegível, o estágio será refeito: {e}")
+            self.manifest["stages"].pop(stage)
+            self._write_manifest()
+            return None
+
+        log(f" Checkpoint '{stage}' reaproveitado")
+        if list(frames) == ["data"]:
+            return frames["data"]
+        return frames
+
+    # ---------------- progresso da carga ----------------
+
+    def load_progress(self, table_name, total_rows):
+        """
+        Carga já iniciada nesta execução para a mesma tabela e o mesmo
+        número de linhas.
+
+        Returns:
+            dict | None: {"committed_rows", "batches", "processed_at"}
+        """
+        progress = self.manifest.get("load")
+        if not progress:
+            return None
+        if progress["table"] != table_name or progress["total_rows"] != total_rows:
+            log(f" Checkpoint da carga é de outra tabela/tamanho: ignorado")
+            return None
+        return progress
+
+    def start_load(self, table_name, total_rows, processed_at):
+        self.manifest["load"] = {
+            "table": table_name,
+            "total_rows": total_rows,
+            "processed_at": processed_at.isoformat(),
+            "committed_rows": 0,
+            "batches": 0,
+            "complete": False,
+        }
+        self._write_manifest()
+
+    def record_commit(self, committed_rows, batches):
+        """Registra as linhas que já receberam commit (chamado após cada commit)."""
+        self.manifest["load"]["committed_rows"] = committed_rows
+        self.manifest["load"]["batches"] = batches
+        self._write_manifest()
+
+    def finish_load(self):
+        self.manifest["load"]["complete"] = True
+        self._write_manifest()
+
+    # ---------------- fim ----------------
+
+    def finish(self, keep_snapshots=False, keep_runs=KEEP_COMPLETED_RUNS):
+        """
+        Marca a execução como concluída.
+
+        Args:
+            keep_snapshots (bool): Se False, apaga os Feather (fica só o manifesto)
+            keep_runs (int): Execuções concluídas mantidas na pasta
+        """
+        self.manifest["status"] = "complete"
+        self.manifest["finished_at"] = datetime.now().isoformat()
+        self._write_manifest()
+
+        if not keep_snapshots:
+            for stage, entry in self.manifest["stages"].items():
+                for name in entry["frames"]:
+                    try:
+                        os.remove(self._frame_path(stage, name))
+                    except FileNotFoundError:
+                        pass
+
+        prune_checkpoints(self.checkpoint_dir, keep_runs)
+
+
+def prune_checkpoints(checkpoint_dir=CHECKPOINT_DIR, keep=KEEP_COMPLETED_RUNS):
+    """
+    Apaga as execuções concluídas mais antigas, mantendo as keep mais
+    recentes. Execuções não concluídas nunca são apagadas.
+
+    Returns:
+        int: Execuções apagadas
+    """
+    if not os.path.isdir(checkpoint_dir):
+        return 0
+
+    completed = []
+    for run_id in sorted(os.listdir(checkpoint_dir), reverse=True):
+        try:
+            checkpoint = RunCheckpoint.open(run_id, checkpoint_dir)
+        except (OSError, ValueError):
+            continue
+        if checkpoint.manifest["status"] == "complete":
+            completed.append(checkpoint.run_dir)
+
+    for run_dir in completed[keep:]:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return len(completed[keep:])
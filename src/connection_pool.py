@@ -0,0 +1,393 @@
+"""
+Pool de conexões com o SQL Server.
+
+Responsabilidade:
+- Reaproveitar conexões abertas em vez de fazer login a cada extração/carga
+- Limitar o número de conexões simultâneas (min/max)
+- Descartar conexões ociosas ou quebradas
+- Expor contadores para saber quanto o pool está ajudando
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config.db_config import get_connection
+from src.metrics import get_metrics, log
+
+
+# ============================================================
+# CONFIGURAÇÃO DO POOL
+# ============================================================
+
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 5
+POOL_IDLE_TIMEOUT = 300      # segundos até fechar uma conexão ociosa
+POOL_CHECKOUT_TIMEOUT = 30   # segundos esperando uma conexão livre
+HEALTH_CHECK_QUERY = "SELECT 1"
+
+# Servidor e banco de verdade da conexão (chave do cache de extrações)
+SERVER_IDENTITY_QUERY = "SELECT @@SERVERNAME, DB_NAME()"
+
+
+def factory_target(factory):
+    """
+    Banco que a fábrica declara abrir (atributo `target`), ou None.
+
+    Ex.: SQLiteConnectionFactory e as fábricas do src.fanout. Funções
+    (get_connection, lambdas) não declaram nada: o nome da função não diz
+    para onde ela conecta.
+    """
+    target = getattr(factory, "target", None)
+    return None if target is None else str(target)
+
+
+class ConnectionPool:
+    """
+    Pool thread-safe de conexões.
+
+    Uso:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            ...
+    """
+
+    def __init__(
+        self,
+        factory=get_connection,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        idle_timeout=POOL_IDLE_TIMEOUT,
+        checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+    ):
+        """
+        Args:
+            factory (callable): Função que abre uma conexão nova (ou None se falhar)
+            min_size (int): Conexões mantidas abertas mesmo ociosas
+            max_size (int): Limite de conexões abertas ao mesmo tempo
+            idle_timeout (float): Segundos até fechar uma conexão ociosa
+            checkout_timeout (float): Segundos esperando uma conexão livre
+        """
+        if min_size > max_size:
+            raise ValueError("min_size não pode ser maior que max_size")
+
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()     # (conexão, instante em que voltou ao pool)
+        self._open = 0           # conexões abertas (ociosas + emprestadas)
+        self._borrowed = {}      # id(conexão) -> conexão emprestada por este pool
+        self._closed = False     # depois do close_all, as que voltam são fechadas
+        self._target = None      # servidor/banco, perguntado uma vez (ver target)
+        self._target_lock = threading.Lock()
+
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "created": 0,
+            "closed": 0,
+            "health_check_failures": 0,
+        }
+
+        for _ in range(min_size):
+            conn = self._create()
+            if conn is None:
+                break
+            self._idle.append((conn, time.monotonic()))
+            self._open += 1
+
+    def _create(self):
+        conn = self._factory()
+        if conn:
+            with self._cond:
+                self.stats["created"] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self.stats["closed"] += 1
+
+    def _evict_idle(self):
+        """Fecha conexões ociosas há mais de idle_timeout (chamar com o lock)."""
+        now = time.monotonic()
+        # As mais antigas ficam à esquerda da fila
+        while self._idle and self._open > self.min_size:
+            conn, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._open -= 1
+            self._close(conn)
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(HEALTH_CHECK_QUERY)
+            cursor.fetchone()
+            cursor.close()
+            get_metrics().count("db_round_trips")
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """
+        Empresta uma conexão do pool.
+
+        Returns:
+            Conexão ativa ou None se não conseguir abrir/esperar uma
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    self._evict_idle()
+
+                    if self._idle:
+                        # LIFO: a conexão usada por último é a mais "quente"
+                        conn, _ = self._idle.pop()
+                        break
+
+                    if self._open < self.max_size:
+                        # Reserva a vaga antes de abrir fora do lock
+                        self._open += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        log(f" Pool esgotado: nenhuma conexão livre em {self.checkout_timeout}s", level=0)
+                        return None
+
+                    if not waited:
+                        self.stats["waits"] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                conn = self._create()
+                if conn is None:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    return None
+            elif not self._is_healthy(conn):
+                with self._cond:
+                    self.stats["health_check_failures"] += 1
+                    self._open -= 1
+                    self._close(conn)
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self.stats["checkouts"] += 1
+                self._borrowed[id(conn)] = conn
+            return conn
+
+    def release(self, conn, broken=False):
+        """
+        Devolve uma conexão ao pool.
+
+        Args:
+            conn: Conexão emprestada por acquire()
+            broken (bool): Se True, fecha a conexão em vez de reaproveitar
+
+        Raises:
+            ValueError: Se a conexão não foi emprestada por este pool (ou já
+                foi devolvida): aceitar bagunçaria a contagem de abertas
+        """
+        if conn is None:
+            return
+
+        with self._cond:
+            if self._borrowed.get(id(conn)) is not conn:
+                raise ValueError("conexão não foi emprestada por este pool")
+            del self._borrowed[id(conn)]
+
+        if not broken:
+            # Garante que nenhuma transação aberta vaze para o próximo uso
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+
+        with self._cond:
+            if broken or self._closed:
+                self._open -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager que empresta e devolve uma conexão."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, broken=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        """Fecha as conexões ociosas (as emprestadas fecham ao voltar)."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._open -= 1
+                self._close(conn)
+
+    @property
+    def target(self):
+        """
+        Servidor e banco das conexões deste pool, ex.: "mssql:SRV01/AdventureWorks2022".
+
+        Pergunta ao próprio banco (SERVER_IDENTITY_QUERY) na primeira vez e
+        guarda a resposta. Se o banco não responde à query (ex.: SQLite),
+        usa o que a fábrica declara (factory_target).
+
+        Returns:
+            str | None: None se não der para identificar o banco
+        """
+        with self._target_lock:
+            if self._target is not None:
+                return self._target
+
+            conn = self.acquire()
+            if conn is None:
+                # Sem conexão agora: não guarda, a próxima chamada tenta de novo
+                return factory_target(self._factory)
+
+            try:
+                cursor = conn.cursor()
+                cursor.execute(SERVER_IDENTITY_QUERY)
+                server, database = cursor.fetchone()
+                cursor.close()
+                get_metrics().count("db_round_trips")
+                self._target = f"mssql:{server}/{database}"
+            except Exception:
+                self._target = factory_target(self._factory)
+            finally:
+                self.release(conn)
+            return self._target
+
+    def get_stats(self):
+        """Retorna os contadores do pool e o estado atual."""
+        with self._cond:
+            stats = dict(self.stats)
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+        return stats
+
+
+# ============================================================
+# POOL PADRÃO DO ETL
+# ============================================================
+
+# Por que um pool global criado sob demanda?
+# - extract, load e validate compartilham as mesmas conexões
+# - Importar o módulo não abre conexão nenhuma
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Pool que emprestou cada conexão do borrow_connection(): um configure_pool
+# ou reset_pool no meio do empréstimo não muda para onde ela volta
+_lenders = {}
+
+
+def get_pool():
+    """Retorna o pool padrão, criando-o no primeiro uso."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure_pool(**kwargs):
+    """
+    Substitui o pool padrão por um novo com outros parâmetros.
+
+    Aceita os mesmos argumentos de ConnectionPool (factory, min_size, ...).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(**kwargs)
+        return _pool
+
+
+def reset_pool():
+    """
+    Fecha o pool padrão; o próximo uso volta a criar um com o get_connection
+    do config.db_config (ex.: depois de um configure_pool temporário).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+
+
+def get_pool_target():
+    """Servidor e banco do pool padrão (ver ConnectionPool.target), ou None."""
+    return get_pool().target
+
+
+def borrow_connection():
+    """Empresta uma conexão do pool padrão (ou None se falhar)."""
+    pool = get_pool()
+    conn = pool.acquire()
+    if conn is not None:
+        with _pool_lock:
+            _lenders[id(conn)] = pool
+    return conn
+
+
+def return_connection(conn, broken=False):
+    """
+    Devolve uma conexão obtida com borrow_connection() ao pool que a
+    emprestou, mesmo que o pool padrão tenha sido trocado depois.
+
+    Raises:
+        ValueError: Se a conexão não veio do borrow_connection()
+    """
+    if conn is None:
+        return
+    with _pool_lock:
+        pool = _lenders.pop(id(conn), None)
+    if pool is None:
+        raise ValueError("conexão não foi emprestada por borrow_connection()")
+    pool.release(conn, broken=broken)
+
+
+def pooled_connection():
+    """Context manager sobre o pool padrão."""
+    return get_pool().connection()
+
+
+def print_pool_stats():
+    """Mostra os contadores do pool padrão."""
+    stats = get_pool().get_stats()
+    log(f"\n POOL DE CONEXÕES:")
+    log(f"   Empréstimos: {stats['checkouts']:,}")
+    log(f"   Esperas: {stats['waits']:,}")
+    log(f"   Conexões criadas: {stats['created']:,}")
+    log(f"   Conexões fechadas: {stats['closed']:,}")
+    log(f"   Falhas no health check: {stats['health_check_failures']:,}")
+    log(f"   Abertas agora: {stats['open']} ({stats['idle']} ociosas)")
@@ -0,0 +1,207 @@
+"""
+Dimensão de produtos indexada por ProductID.
+
+Responsabilidade:
+- Guardar Production.Product como arrays por coluna, endereçados
+  diretamente pelo ProductID (posição = índice[ProductID])
+- Resolver os atributos (nome, preço, custo) depois da agregação,
+  para algumas centenas de produtos em vez de milhões de linhas
+- Manter a dimensão em memória entre execuções do mesmo processo,
+  recarregando só quando MAX(ModifiedDate) ou COUNT(*) da tabela mudam
+
+Por que não pd.merge?
+- O merge do STEP 3 monta uma hash table e copia as colunas do produto
+  em cada linha de venda; o STEP 5 depois só pega o 'first' de cada uma
+- Aqui o lookup é uma indexação de array: O(1) por produto, sem cópia
+  das linhas de venda
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+from src.metrics import get_metrics, log
+
+
+# Atributos do produto usados nas métricas (além do ProductID)
+PRODUCT_ATTRIBUTES = ['ProductName', 'ListPrice', 'StandardCost']
+
+# Versão da tabela de origem: muda quando algum produto é inserido,
+# alterado (ModifiedDate) ou apagado (COUNT)
+QUERY_PRODUCT_VERSION = """
+    SELECT MAX(ModifiedDate), COUNT(*)
+    FROM Production.Product
+"""
+
+# Acima disso o índice direto (um int32 por ProductID possível) ficaria
+# grande demais; usa busca binária nos IDs ordenados
+MAX_DIRECT_INDEX = 10_000_000
+
+
+class ProductDimension:
+    """
+    Produtos em arrays colunares, endereçados por ProductID.
+
+    Uso:
+        dimension = ProductDimension.from_frame(products)
+        attributes = dimension.lookup(products_metrics['ProductID'])
+    """
+
+    def __init__(self, product_ids, columns, version=None):
+        """
+        Args:
+            product_ids (np.ndarray): ProductIDs únicos
+            columns (dict): atributo -> array (mesma ordem de product_ids)
+            version (tuple): Versão da origem (MAX(ModifiedDate), COUNT)
+        """
+        self.product_ids = np.asarray(product_ids, dtype='int64')
+        self.columns = columns
+        self.version = version
+
+        # Índice direto: _positions[ProductID] = linha (-1 = não existe)
+        self._positions = None
+        if len(self.product_ids) and self.product_ids.min() >= 0 \
+                and self.product_ids.max() < MAX_DIRECT_INDEX:
+            self._positions = np.full(self.product_ids.max() + 1, -1, dtype='int32')
+            self._positions[self.product_ids] = np.arange(len(self.product_ids), dtype='int32')
+        else:
+            order = np.argsort(self.product_ids)
+            self._sorted_ids = self.product_ids[order]
+            self._sorted_positions = order
+
+    @classmethod
+    def from_frame(cls, products, attributes=PRODUCT_ATTRIBUTES, version=None):
+        """
+        Monta a dimensão a partir da Production.Product extraída.
+
+        Se houver ProductID repetido, vale a primeira linha (como o 'first'
+        do groupby no caminho antigo).
+        """
+        products = products.drop_duplicates('ProductID')
+        columns = {col: products[col].array for col in attributes}
+        return cls(products['ProductID'].to_numpy(), columns, version)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def positions(self, product_ids):
+        """Linha de cada ProductID na dimensão (-1 = sem cadastro)."""
+        ids = np.asarray(product_ids, dtype='int64')
+
+        if self._positions is not None:
+            in_range = (ids >= 0) & (ids < len(self._positions))
+            result = np.full(len(ids), -1, dtype='int64')
+            result[in_range] = self._positions[ids[in_range]]
+            return result
+
+        # Dimensão vazia: nenhum produto tem cadastro
+        if not len(self._sorted_ids):
+            return np.full(len(ids), -1, dtype='int64')
+
+        found = np.searchsorted(self._sorted_ids, ids)
+        found = np.minimum(found, len(self._sorted_ids) - 1)
+        hit = self._sorted_ids[found] == ids
+        return np.where(hit, self._sorted_positions[found], -1)
+
+    def contains(self, product_ids):
+        """Máscara booleana: ProductID tem cadastro?"""
+        return self.positions(product_ids) >= 0
+
+    def lookup(self, product_ids, attributes=None):
+        """
+        Atributos dos produtos informados.
+
+        Args:
+            product_ids (array-like): ProductIDs a resolver
+            attributes (list): Atributos a trazer (padrão: todos)
+
+        Returns:
+            pd.DataFrame: Um registro por ProductID pedido, na mesma ordem;
+                NaN/None para produtos sem cadastro (como o LEFT JOIN)
+        """
+        positions = self.positions(product_ids)
+        attributes = attributes or list(self.columns)
+        return pd.DataFrame({
+            col: take(self.columns[col], positions, allow_fill=True)
+            for col in attributes
+        })
+
+
+# ============================================================
+# DIMENSÃO EM CACHE NO PROCESSO
+# ============================================================
+
+# Por que cache no módulo?
+# - Em processos longos (pipeline agendado, notebook) a tabela de produtos
+#   quase nunca muda entre execuções
+# - Conferir a versão custa uma query de uma linha; reextrair custa a tabela
+
+_cached = None
+_cache_lock = threading.Lock()
+
+
+def _read_version():
+    """(MAX(ModifiedDate), COUNT(*)) de Production.Product ou None se falhar."""
+    from src.connection_pool import borrow_connection, return_connection
+
+    conn = borrow_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(QUERY_PRODUCT_VERSION)
+        max_modified, count = cursor.fetchone()
+        get_metrics().count("db_round_trips")
+        cursor.close()
+        return_connection(conn)
+        return (str(max_modified), int(count))
+    except Exception as e:
+        print(f"\n Erro ao ler a versão de Production.Product")
+        print(f" {e}")
+        return_connection(conn, broken=True)
+        return None
+
+
+def get_product_dimension(refresh=False):
+    """
+    Dimensão de produtos atual, reaproveitando a da execução anterior
+    quando Production.Product não mudou.
+
+    Args:
+        refresh (bool): Se True, reextrai mesmo sem mudança de versão
+
+    Returns:
+        ProductDimension: Dimensão pronta ou None se a extração falhar
+    """
+    # Import tardio: src.extract abre o pool de conexões
+    from src.extract import SCHEMAS, extract_data
+    from src.lineage import build_query
+
+    global _cached
+    with _cache_lock:
+        version = _read_version()
+
+        if not refresh and _cached is not None and version is not None \
+                and version == _cached.version:
+            log(f"\n Dimensão de produtos reaproveitada ({len(_cached):,} produtos)")
+            get_metrics().count("dimension_cache_hits")
+            return _cached
+
+        query = build_query("products", ['ProductID'] + PRODUCT_ATTRIBUTES)
+        products = extract_data(query, "Production.Product", schema=SCHEMAS["products"])
+        if products is None:
+            return None
+
+        _cached = ProductDimension.from_frame(products, version=version)
+        get_metrics().count("dimension_cache_misses")
+        log(f" Dimensão de produtos carregada ({len(_cached):,} produtos)")
+        return _cached
+
+
+def invalidate_product_dimension():
+    """Descarta a dimensão em cache (a próxima chamada reextrai)."""
+    global _cached
+    with _cache_lock:
+        _cached = None
@@ -7,8 +7,15 @@ Responsabilidade:
 - Retornar DataFrames do Pandas
 """
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 import pandas as pd
-from config.db_config import get_connection
+from src.cache import get_cache
+from src.connection_pool import borrow_connection, return_connection
+from src.interchange import write_stage
+from src.metrics import get_metrics, is_verbose, log
 
 
 # ============================================================
@@ -64,62 +71,487 @@ QUERY_PRODUCTS = """
         Production.Product
 """
 
-def extract_data(query, table_name = "tabela"):
-    print(f"\n{'='*60}")
-    print(f"EXTRAINDO: {table_name}")
-    print(f"\n{'=' * 60}")
+# Tamanho padrão de cada chunk no modo streaming.
+# Por que 50 mil? Com as colunas acima, um chunk fica na casa de poucos MB,
+# então a memória do worker não depende mais do tamanho da tabela.
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Número máximo de conexões simultâneas no modo paralelo.
+# Uma conexão por worker: pyodbc não permite duas queries ativas
+# na mesma conexão, então o pool de threads é o limite de conexões.
+# Deve ficar abaixo de POOL_MAX_SIZE para os workers não esperarem o pool.
+DEFAULT_MAX_WORKERS = 3
+
+# Fontes do extract_all: chave do dicionário -> (query, tabela de origem)
+SOURCES = {
+    "sales_detail": (QUERY_SALES_DETAIL, "Sales.SalesOrderDetail"),
+    "sales_header": (QUERY_SALES_HEADER, "Sales.SalesOrderHeader"),
+    "products": (QUERY_PRODUCTS, "Production.Product"),
+}
+
+# Tabelas que podem ser divididas em faixas de SalesOrderID
+SPLITTABLE_SOURCES = ("sales_detail", "sales_header")
+
+
+class ExtractionError(Exception):
+    """Extração em modo streaming que não conseguiu começar (ex.: sem conexão)."""
+
+# ============================================================
+# SCHEMA DE DTYPES POR QUERY
+# ============================================================
+
+# Por que definir dtypes na extração?
+# - O pandas usa int64/object/float64 para tudo por padrão
+# - As chaves do AdventureWorks cabem em int32 e OrderQty em int16
+# - Color e Size têm poucos valores distintos: category guarda só códigos
+# - Os dtypes menores seguem pelos pd.merge do transform
+#
+# Colunas de dinheiro continuam float64: float32 perderia centavos nas somas.
+# Colunas anuláveis usam os inteiros nullable do pandas (Int16, Int32).
+# "string" só é convertida com arrow_strings=True (string[pyarrow]).
+
+SCHEMA_SALES_DETAIL = {
+    "SalesOrderID": "int32",
+    "SalesOrderDetailID": "int32",
+    "ProductID": "int32",
+    "OrderQty": "int16",
+}
+
+SCHEMA_SALES_HEADER = {
+    "SalesOrderID": "int32",
+    "OrderDate": "datetime64[ns]",
+    "DueDate": "datetime64[ns]",
+    "ShipDate": "datetime64[ns]",
+    "Status": "int8",
+    "CustomerID": "int32",
+    "TerritoryID": "Int16",
+}
+
+SCHEMA_PRODUCTS = {
+    "ProductID": "int32",
+    "ProductName": "string",
+    "ProductNumber": "string",
+    "Color": "category",
+    "Size": "category",
+    "ProductSubcategoryID": "Int16",
+}
+
+SCHEMAS = {
+    "sales_detail": SCHEMA_SALES_DETAIL,
+    "sales_header": SCHEMA_SALES_HEADER,
+    "products": SCHEMA_PRODUCTS,
+}
+
+def apply_schema(df, schema, arrow_strings=False):
+    """
+    Converte as colunas do DataFrame para os dtypes do schema.
+
+    Colunas ausentes são ignoradas. Se uma conversão falhar (ex.: NULL
+    inesperado numa coluna int32), a coluna fica como veio do banco.
+
+    Args:
+        df (pd.DataFrame): Dados extraídos
+        schema (dict): coluna -> dtype
+        arrow_strings (bool): Converte colunas "string" para string[pyarrow]
+
+    Returns:
+        pd.DataFrame: Mesmo DataFrame com os dtypes aplicados
+    """
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+
+        if dtype == "string":
+            if not arrow_strings:
+                continue
+            dtype = "string[pyarrow]"
+
+        try:
+            if dtype.startswith("datetime64"):
+                # to_datetime também resolve datas que chegam como texto
+                df[col] = pd.to_datetime(df[col]).astype(dtype)
+            else:
+                df[col] = df[col].astype(dtype)
+        except (TypeError, ValueError) as e:
+            log(f"   Aviso: coluna {col} mantida como {df[col].dtype} ({e})", level=0)
+
+    return df
 
-    conn = get_connection()
+def extract_data(query, table_name = "tabela", chunksize=None, params=None,
+                 schema=None, arrow_strings=False):
+    """
+    Extrai o resultado de uma query do SQL Server.
+
+    Args:
+        query (str): Query SQL a executar
+        table_name (str): Nome da tabela (usado apenas nos logs)
+        chunksize (int): Se informado, retorna um iterador de DataFrames
+            com até `chunksize` linhas cada, em vez do DataFrame completo
+        params (tuple): Parâmetros para os placeholders `?` da query
+        schema (dict): Dtypes a aplicar (ver SCHEMAS); None = dtypes do pandas
+        arrow_strings (bool): Usa string[pyarrow] nas colunas "string" do schema
+
+    Returns:
+        pd.DataFrame | Iterator[pd.DataFrame]: Dados extraídos ou None se falhar.
+            No modo streaming a falha vira ExtractionError ao consumir o
+            iterador (não dá para devolver None depois de criado o gerador)
+    """
+    if chunksize:
+        return _extract_chunks(query, table_name, chunksize, params, schema, arrow_strings)
+
+    log(f"\n{'='*60}")
+    log(f"EXTRAINDO: {table_name}")
+    log(f"\n{'=' * 60}")
+
+    metrics = get_metrics()
+    timer = metrics.start_stage("extract", table_name)
+
+    conn = borrow_connection()
     if not conn:
-        print(f"Extração falhou ao conectar. Extração {table_name} abortada")
+        log(f"Extração falhou ao conectar. Extração {table_name} abortada", level=0)
+        timer.finish(error="sem conexão")
         return None
 
     try:
-        print(f"Excultando Query...")
-        data = pd.read_sql(query, conn)
+        log(f"Excultando Query...")
+        data = pd.read_sql(query, conn, params=params)
+        metrics.count("db_round_trips")
 
         num_rows = len(data)
         num_cols = len(data.columns)
 
-        print("Parabens Extração concluida")
-        print(f"Linhas: {num_rows:,}")
-        print(f"Colunas: {num_cols}")
-        print(f"Memoria {data.memory_usage(deep=True).sum()/1024**2:.2f} MB")
+        log("Parabens Extração concluida")
+        log(f"Linhas: {num_rows:,}")
+        log(f"Colunas: {num_cols}")
+
+        # memory_usage(deep=True) percorre todas as strings: só no modo diagnóstico
+        diagnostics = is_verbose(2)
+        if diagnostics:
+            memory_before = data.memory_usage(deep=True).sum() / 1024**2
 
-        print(f"\n Prévia das linhas que estamos vendo")
-        print(data.head(5))
+        if schema:
+            data = apply_schema(data, schema, arrow_strings)
 
-        conn.close()
-        print(f"Conexão fechada")
+        if diagnostics:
+            memory_after = data.memory_usage(deep=True).sum() / 1024**2
+            log(f"Memoria {memory_before:.2f} MB -> {memory_after:.2f} MB (após schema)", level=2)
+
+            log(f"\n Prévia das linhas que estamos vendo", level=2)
+            log(data.head(5), level=2)
+
+        return_connection(conn)
+        log(f"Conexão devolvida ao pool")
+
+        timer.finish(
+            rows_out=num_rows,
+            bytes=int(data.memory_usage(deep=False).sum())
+        )
 
         return  data
     except Exception as e:
         print(f"\n Erro ao extrair dados da tabela {table_name}")
         print(f" {e}")
         if conn:
-            conn.close()
+            return_connection(conn, broken=True)
             print(f"Conexão encerrada após o erro")
+        timer.finish(error=str(e))
         return None
 
-def extract_sales_detail():
-    return extract_data(QUERY_SALES_DETAIL, "Sales.SalesOrderDetail")
+def _extract_chunks(query, table_name, chunksize, params=None, schema=None,
+                    arrow_strings=False):
+    """
+    Gera a extração em chunks lidos do cursor com fetchmany.
+
+    O cursor padrão do pyodbc no SQL Server é forward-only: as linhas ficam
+    no servidor e só atravessam a rede quando o fetchmany pede. Assim só um
+    chunk por vez fica em memória.
+
+    Raises:
+        ExtractionError: Sem conexão com o banco. Terminar sem chunks faria
+            um servidor fora do ar parecer uma tabela vazia
+    """
+    log(f"\n{'='*60}")
+    log(f"EXTRAINDO (streaming): {table_name}")
+    log(f"\n{'=' * 60}")
 
-def extract_sales_header():
-    return extract_data(QUERY_SALES_HEADER, "Sales.SalesOrderHeader")
+    metrics = get_metrics()
+    # O tempo inclui o tempo em que o consumidor segura cada chunk
+    timer = metrics.start_stage("extract", table_name, streaming=True)
 
-def extract_products():
-    return extract_data(QUERY_PRODUCTS, "Production.Production")
+    conn = borrow_connection()
+    if not conn:
+        log(f"Extração falhou ao conectar. Extração {table_name} abortada", level=0)
+        timer.finish(error="sem conexão")
+        raise ExtractionError(f"sem conexão para extrair {table_name}")
+
+    cursor = None
+    failed = False
+    num_chunks = 0
+    num_rows = 0
+    num_bytes = 0
+    try:
+        log(f"Excultando Query...")
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        metrics.count("db_round_trips")
+        columns = [col[0] for col in cursor.description]
+
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            metrics.count("db_round_trips")
+            if not rows:
+                break
+
+            chunk = pd.DataFrame.from_records(
+                [tuple(row) for row in rows],
+                columns=columns,
+                coerce_float=True
+            )
+            if schema:
+                chunk = apply_schema(chunk, schema, arrow_strings)
+            num_chunks += 1
+            num_rows += len(chunk)
+            num_bytes += int(chunk.memory_usage(deep=False).sum())
+            log(f"   Chunk {num_chunks}: {len(chunk):,} linhas (total {num_rows:,})")
+
+            yield chunk
+
+        log("Parabens Extração concluida")
+        log(f"Chunks: {num_chunks}")
+        log(f"Linhas: {num_rows:,}")
+    except Exception as e:
+        # Aqui não dá para retornar None: quem consome já recebeu parte dos dados.
+        print(f"\n Erro ao extrair dados da tabela {table_name}")
+        print(f" {e}")
+        failed = True
+        raise
+    finally:
+        # Também roda quando o consumidor abandona o gerador no meio
+        if cursor:
+            cursor.close()
+        return_connection(conn, broken=failed)
+        log(f"Conexão devolvida ao pool")
+        timer.finish(rows_out=num_rows, bytes=num_bytes, chunks=num_chunks, failed=failed)
 
-def extract_all():
-    print("\n" + "="*60)
-    print("Iniciando uma extração de todas as tabelas: ")
+def extract_sales_detail(chunksize=None, arrow_strings=False):
+    return extract_data(QUERY_SALES_DETAIL, "Sales.SalesOrderDetail", chunksize,
+                        schema=SCHEMA_SALES_DETAIL, arrow_strings=arrow_strings)
 
-    sales_detail = extract_sales_detail()
-    sales_header = extract_sales_header()
-    products = extract_products()
+def extract_sales_header(chunksize=None, arrow_strings=False):
+    return extract_data(QUERY_SALES_HEADER, "Sales.SalesOrderHeader", chunksize,
+                        schema=SCHEMA_SALES_HEADER, arrow_strings=arrow_strings)
+
+def extract_products(chunksize=None, arrow_strings=False):
+    return extract_data(QUERY_PRODUCTS, "Production.Product", chunksize,
+                        schema=SCHEMA_PRODUCTS, arrow_strings=arrow_strings)
+
+def _add_predicate(query, predicate):
+    """Acrescenta um filtro à query, com WHERE ou AND conforme o caso."""
+    keyword = "AND" if "WHERE" in query.upper() else "WHERE"
+    return f"{query.rstrip()}\n    {keyword} {predicate}\n"
+
+def _get_key_range(table_name, key="SalesOrderID"):
+    """Retorna (mínimo, máximo) da chave na tabela ou None se falhar."""
+    conn = borrow_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table_name}")
+        low, high = cursor.fetchone()
+        get_metrics().count("db_round_trips")
+        cursor.close()
+        return_connection(conn)
+        return low, high
+    except Exception as e:
+        print(f"\n Erro ao ler faixa de {key} em {table_name}")
+        print(f" {e}")
+        return_connection(conn, broken=True)
+        return None
+
+def _split_key_range(low, high, parts):
+    """Divide [low, high] em até `parts` faixas inclusivas de tamanho parecido."""
+    step = max(1, -(-(high - low + 1) // parts))
+    return [
+        (start, min(start + step - 1, high))
+        for start in range(low, high + 1, step)
+    ]
+
+def _source_query(name, queries=None):
+    """(query, params) da fonte: a de `queries` se houver, senão a de SOURCES."""
+    if queries and name in queries:
+        return queries[name]
+    return SOURCES[name][0], None
+
+def _build_tasks(split_ranges, key="SalesOrderID", queries=None):
+    """
+    Monta a lista de extrações (nome, query, rótulo, params).
+
+    Tabelas em SPLITTABLE_SOURCES viram uma tarefa por faixa de `key`
+    quando split_ranges > 1; as demais são uma tarefa só.
+    """
+    tasks = []
+    for name, (_, table_name) in SOURCES.items():
+        query, params = _source_query(name, queries)
+        key_range = None
+        if split_ranges > 1 and name in SPLITTABLE_SOURCES:
+            key_range = _get_key_range(table_name, key)
+
+        if not key_range or key_range[0] is None:
+            tasks.append((name, query, table_name, params))
+            continue
+
+        ranged_query = _add_predicate(query, f"{key} BETWEEN ? AND ?")
+        for start, end in _split_key_range(*key_range, split_ranges):
+            label = f"{table_name} [{key} {start}-{end}]"
+            tasks.append((name, ranged_query, label, tuple(params or ()) + (start, end)))
+
+    return tasks
+
+def _extract_cached(query, label, params=None, cache=None, table_name=None,
+                    schema=None, arrow_strings=False):
+    """
+    Chama extract_data passando antes pelo cache em disco (se houver).
+
+    Args:
+        label (str): Rótulo para os logs (pode incluir a faixa de chave)
+        cache (ExtractCache): Cache a usar; None = sempre vai ao banco
+        table_name (str): Tabela de origem, usada para invalidar por tabela
+        schema (dict): Dtypes aplicados antes de gravar no cache
+    """
+    if cache is None:
+        return extract_data(query, label, params=params, schema=schema,
+                            arrow_strings=arrow_strings)
+
+    # O schema muda o conteúdo gravado, então entra na chave
+    key = cache.make_key(f"{query}\n-- schema: {schema!r} arrow={arrow_strings}", params)
+    if key is None:
+        # Banco de origem desconhecido: uma entrada gravada não saberia de onde veio
+        log(f"\n CACHE: banco de origem não identificado, {label} vai direto ao banco")
+        return extract_data(query, label, params=params, schema=schema,
+                            arrow_strings=arrow_strings)
+
+    data = cache.get(key)
+    if data is not None:
+        log(f"\n CACHE: {label} ({len(data):,} linhas)")
+        return data
+
+    data = extract_data(query, label, params=params, schema=schema,
+                        arrow_strings=arrow_strings)
+    if data is not None:
+        cache.put(key, data, table_name or label)
+    return data
+
+def _run_task(task, cache=None, arrow_strings=False):
+    name, query, label, params = task
+    start = time.perf_counter()
+    data = _extract_cached(query, label, params, cache, SOURCES[name][1],
+                           SCHEMAS[name], arrow_strings)
+    return name, data, time.perf_counter() - start
+
+def _extract_parallel(max_workers, split_ranges, cache=None, arrow_strings=False,
+                      queries=None):
+    """
+    Executa as extrações num pool de threads limitado.
+
+    Returns:
+        tuple: (dict nome -> DataFrame ou None, dict nome -> segundos)
+    """
+    tasks = _build_tasks(split_ranges, queries=queries)
+    log(f"Modo paralelo: {len(tasks)} tarefas em até {max_workers} conexões")
+
+    parts = {name: [] for name in SOURCES}
+    timings = {name: 0.0 for name in SOURCES}
+
+    # executor.map mantém a ordem das tarefas, então as faixas
+    # de cada tabela são concatenadas na ordem da chave.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, data, elapsed in executor.map(partial(_run_task, cache=cache, arrow_strings=arrow_strings), tasks):
+            parts[name].append(data)
+            # Faixas rodam em paralelo: o tempo da tabela é o da faixa mais lenta
+            timings[name] = max(timings[name], elapsed)
+
+    results = {}
+    for name, frames in parts.items():
+        if any(frame is None for frame in frames):
+            results[name] = None
+        elif len(frames) == 1:
+            results[name] = frames[0]
+        else:
+            # Faixas vazias (ex.: fora do filtro de data) vêm com dtype object
+            # e contaminariam o concat: só entram se todas forem vazias
+            frames = [frame for frame in frames if len(frame)] or frames[:1]
+            results[name] = pd.concat(frames, ignore_index=True)
+
+    return results, timings
+
+def extract_all(parallel=False, max_workers=DEFAULT_MAX_WORKERS, split_ranges=0,
+                use_cache=False, cache=None, arrow_strings=False,
+                prune=False, cutoff_years=None, interchange_dir=None):
+    """
+    Extrai todas as tabelas usadas pelo ETL.
+
+    Args:
+        parallel (bool): Se True, extrai as tabelas ao mesmo tempo,
+            cada worker com sua própria conexão
+        max_workers (int): Número máximo de conexões simultâneas
+        split_ranges (int): No modo paralelo, divide Sales.SalesOrderDetail
+            e Sales.SalesOrderHeader em N faixas de SalesOrderID
+        use_cache (bool): Se True, usa o cache local de extrações (src.cache)
+        cache (ExtractCache): Cache específico; implica use_cache=True
+        arrow_strings (bool): Usa string[pyarrow] em ProductName/ProductNumber
+        prune (bool): Se True, busca só as colunas que o transform declara
+            em STEP_COLUMNS (ver src.lineage)
+        cutoff_years (int): Com prune, filtra header e detalhe no banco
+            pela janela de anos do STEP 4
+        interchange_dir (str): Se informado, grava as tabelas em Arrow IPC
+            nessa pasta (ver src.interchange); transform_data e load_data
+            aceitam a pasta no lugar dos DataFrames, em outro processo
+
+    Returns:
+        dict: {"sales_detail", "sales_header", "products"} ou None se falhar.
+            O tempo de cada extração fica em df.attrs["extract_seconds"].
+    """
+    log("\n" + "="*60)
+    log("Iniciando uma extração de todas as tabelas: ")
+
+    if use_cache and cache is None:
+        cache = get_cache()
+
+    wall_start = time.perf_counter()
+
+    queries = None
+    if prune:
+        # Import tardio: src.lineage importa este módulo
+        from src.lineage import build_queries
+        log("Projeção pela linhagem de colunas:")
+        queries = build_queries(cutoff_years)
+
+    if parallel:
+        results, timings = _extract_parallel(max_workers, split_ranges, cache, arrow_strings,
+                                             queries)
+    else:
+        results, timings = {}, {}
+        for name, (_, table_name) in SOURCES.items():
+            query, params = _source_query(name, queries)
+            start = time.perf_counter()
+            results[name] = _extract_cached(query, table_name, params, cache=cache,
+                                            table_name=table_name, schema=SCHEMAS[name],
+                                            arrow_strings=arrow_strings)
+            timings[name] = time.perf_counter() - start
+
+    wall_time = time.perf_counter() - wall_start
+
+    sales_detail = results["sales_detail"]
+    sales_header = results["sales_header"]
+    products = results["products"]
 
     if sales_detail is None or sales_header is None or products is None:
-        print("Algumas extraxões falharam processo abortado")
+        log("Algumas extraxões falharam processo abortado", level=0)
         return None
 
     data = {
@@ -127,8 +559,21 @@ def extract_all():
         "sales_header": sales_header,
         "products": products
     }
-    print("\n" + "=" * 60)
-    print("Todas as extrações concluidas com sucesso")
-    print("\n" + "=" * 60)
+    for name, df in data.items():
+        df.attrs["extract_seconds"] = timings[name]
+
+    log("\n" + "=" * 60)
+    log("Todas as extrações concluidas com sucesso")
+    log("Tempo por tabela:")
+    for name, elapsed in timings.items():
+        log(f"   - {name}: {elapsed:.2f}s")
+    log(f"Tempo total: {wall_time:.2f}s")
+
+    if cache is not None:
+        cache.print_stats()
+
+    if interchange_dir is not None:
+        write_stage(data, "extract", interchange_dir)
+    log("\n" + "=" * 60)
 
     return data
\ No newline at end of file
@@ -0,0 +1,379 @@
+"""
+ETL sobre vários bancos AdventureWorks (um por região) de uma vez.
+
+Responsabilidade:
+- Extrair e pré-agregar cada origem em paralelo, num pool de processos
+  com um limite de origens simultâneas e de conexões por origem
+- Isolar as falhas: uma origem fora do ar não derruba as outras
+- Somar os parciais por produto/dia de todas as origens e fazer uma
+  única classificação ABC (global) e uma única carga
+
+Fluxo:
+
+    [origem 1: extract + parciais] --\\
+    [origem 2: extract + parciais] ---+--> [soma dos parciais] --> [classificação] --> [load]
+    [origem N: extract + parciais] --/
+
+Por que processos e não threads?
+- O pool de conexões (src.connection_pool) é global no processo: cada
+  origem precisa do seu, apontando para o seu banco
+- A pré-agregação de cada origem é CPU (pandas) e roda em paralelo de verdade
+
+Por que "spawn" e não fork?
+- Com fork o filho herdaria o pool do processo principal com as conexões
+  ODBC abertas; configurar o pool da origem fecharia essas conexões, que
+  continuam sendo do pai. Com spawn o filho começa sem pool nenhum
+
+Por que parciais por produto/dia?
+- A janela de YEARS_TO_ANALYZE anos é contada da data mais recente de
+  todas as origens, que só se conhece depois de juntar tudo
+- Os parciais (ProductAggregateState) permitem aplicar o corte global
+  depois da soma, sem mandar as linhas de venda ao processo principal
+
+As origens compartilham o catálogo Production.Product (mesmos ProductID);
+se um produto vier de mais de uma origem, vale o cadastro da primeira.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from src.aggregate_state import ProductAggregateState
+from src.load import load_data
+from src.metrics import get_metrics, get_verbosity, log, set_verbosity, start_run
+from src.transform import (
+    YEARS_TO_ANALYZE,
+    add_derived_metrics,
+    classify_performance,
+    finalize_metrics,
+)
+
+
+# Origens extraídas ao mesmo tempo (processos do pool)
+DEFAULT_MAX_SOURCES = 4
+
+# Conexões simultâneas em cada origem (pool e extração paralela)
+DEFAULT_CONNECTIONS_PER_SOURCE = 2
+
+# Padrões de uma origem SQL Server: os mesmos do get_connection() do
+# config.db_config
+DEFAULT_DRIVER = "ODBC Driver 18 for SQL Server"
+DEFAULT_SERVER = "localhost"
+DEFAULT_DATABASE = "AdventureWorks2022"
+
+
+class FanoutError(Exception):
+    """Falha ao processar uma origem."""
+
+
+def _odbc_value(value):
+    """Valor de uma chave ODBC; entre chaves se tiver ';', '{' ou '}'."""
+    value = str(value)
+    if any(char in value for char in ";{}") or value != value.strip():
+        return "{" + value.replace("}", "}}") + "}"
+    return value
+
+
+class SqlServerConnectionFactory:
+    """
+    Abre conexões pyodbc com uma origem SQL Server, no formato de
+    get_connection().
+
+    O get_connection() do config.db_config não recebe argumentos (a string
+    de conexão é fixa): esta classe monta a string de cada origem. É uma
+    classe (e não uma função interna) para poder ser enviada aos processos
+    do fanout.
+    """
+
+    def __init__(self, server=DEFAULT_SERVER, database=DEFAULT_DATABASE,
+                 driver=DEFAULT_DRIVER, username=None, password=None, **options):
+        """
+        Args:
+            server (str): Servidor (ex.: "sql-eu" ou "sql-eu,1433")
+            database (str): Banco da origem
+            driver (str): Driver ODBC
+            username (str): Login SQL; sem ele usa Trusted_Connection
+            password (str): Senha do login SQL
+            **options: Outras chaves da string de conexão (ex.: Encrypt="yes")
+        """
+        self.server = server
+        self.database = database
+        self.driver = driver
+        self.username = username
+        self.password = password
+        self.options = {"TrustServerCertificate": "yes", **options}
+
+    @property
+    def target(self):
+        """Banco das conexões (ver connection_pool.factory_target)."""
+        return f"mssql:{self.server}/{self.database}"
+
+    def connection_string(self):
+        """String ODBC da origem (com a senha: não logar)."""
+        parts = {"DRIVER": self.driver, "SERVER": self.server, "DATABASE": self.database}
+        if self.username:
+            parts["UID"] = self.username
+            parts["PWD"] = self.password or ""
+        else:
+            parts["Trusted_Connection"] = "yes"
+        parts.update(self.options)
+        # DRIVER sempre entre chaves, como no config.db_config
+        return ";".join(
+            f"{key}={{{value}}}" if key == "DRIVER" else f"{key}={_odbc_value(value)}"
+            for key, value in parts.items()
+        ) + ";"
+
+    def __call__(self):
+        import pyodbc
+
+        try:
+            conn = pyodbc.connect(self.connection_string())
+            log(f"✅ Conexão com SQL Server estabelecida! ({self.target})", level=2)
+            return conn
+        except pyodbc.Error as e:
+            print(f"❌ Erro ao conectar com SQL Server ({self.target}):")
+            print(f"   Detalhes: {e}")
+            return None
+        except Exception as e:
+            print(f"❌ Erro inesperado ({self.target}):")
+            print(f"   {e}")
+            return None
+
+    def __repr__(self):
+        # Sem a senha: o repr aparece em logs e no relatório
+        login = f", username={self.username!r}" if self.username else ""
+        return (f"SqlServerConnectionFactory(server={self.server!r}, "
+                f"database={self.database!r}{login})")
+
+
+def db_config_factory(**overrides):
+    """
+    Fábrica de conexões para uma origem SQL Server, partindo dos padrões
+    do config.db_config.
+
+    Ex.: db_config_factory(server="sql-eu", database="AdventureWorks_EU")
+
+    Args:
+        **overrides: Argumentos do SqlServerConnectionFactory (server,
+            database, driver, username, password ou outras chaves ODBC)
+
+    Returns:
+        SqlServerConnectionFactory: Chamável sem argumentos que abre uma conexão
+    """
+    return SqlServerConnectionFactory(**overrides)
+
+
+def _process_source(name, factory, years, connections, run_id=None, verbosity=None):
+    """
+    Extrai uma origem e devolve os parciais por produto/dia (roda num
+    processo do pool).
+
+    Args:
+        run_id (str): Execução do processo principal (o filho começa do zero)
+        verbosity (int): Nível de log do processo principal
+
+    Returns:
+        dict: name, partials, products, rows, seconds e tempo por estágio
+    """
+    # Import tardio: o processo filho abre o seu próprio pool
+    from src.connection_pool import configure_pool
+    from src.extract import extract_all
+
+    if verbosity is not None:
+        set_verbosity(verbosity)
+    metrics = start_run(f"{run_id or get_metrics().run_id}_{name}")
+    start = time.perf_counter()
+    pool = configure_pool(factory=factory, max_size=connections)
+    try:
+        # O corte calculado com a data máxima da origem é anterior ou igual
+        # ao corte global: a extração podada nunca perde linhas da janela
+        data = extract_all(parallel=connections > 1, max_workers=connections,
+                           prune=True, cutoff_years=years)
+        if data is None:
+            raise FanoutError(f"extração da origem {name} falhou")
+
+        with metrics.stage("transform", "parciais da origem") as record:
+            header = data["sales_header"][["SalesOrderID", "OrderDate"]]
+            lines = pd.merge(data["sales_detail"], header, on="SalesOrderID", how="inner")
+            partials = ProductAggregateState.partial_aggregate(lines)
+            record["rows_in"] = len(lines)
+            record["rows_out"] = len(partials)
+    finally:
+        pool.close_all()
+
+    return {
+        "name": name,
+        "partials": partials,
+        "products": data["products"],
+        "rows": len(lines),
+        "seconds": time.perf_counter() - start,
+        "stages": metrics.summary(),
+    }
+
+
+class FanoutRunner:
+    """
+    Executa o ETL sobre várias origens e carrega um resultado só.
+
+    Uso:
+        runner = FanoutRunner({
+            "us": db_config_factory(database="AdventureWorks_US"),
+            "eu": db_config_factory(database="AdventureWorks_EU"),
+        })
+        products_metrics = runner.run()
+        runner.print_sources()
+    """
+
+    def __init__(self, targets, max_sources=DEFAULT_MAX_SOURCES,
+                 connections_per_source=DEFAULT_CONNECTIONS_PER_SOURCE,
+                 years=YEARS_TO_ANALYZE, load=True, load_options=None,
+                 allow_partial=True):
+        """
+        Args:
+            targets (dict): nome da origem -> fábrica de conexões (chamável sem
+                argumentos que pode ser enviado a outro processo por pickle,
+                ex.: db_config_factory ou SQLiteConnectionFactory)
+            max_sources (int): Origens processadas ao mesmo tempo
+            connections_per_source (int): Conexões simultâneas em cada origem
+            years (int): Janela de anos analisada (contada da data mais recente global)
+            load (bool): Se False, para depois da classificação
+            load_options (dict): Argumentos extras do load_data (strategy, batch_size...)
+            allow_partial (bool): Se True, segue com as origens que deram certo;
+                se False, qualquer falha aborta antes da carga
+        """
+        if not targets:
+            raise ValueError("targets precisa de ao menos uma origem")
+        if max_sources < 1 or connections_per_source < 1:
+            raise ValueError("max_sources e connections_per_source devem ser >= 1")
+
+        self.targets = dict(targets)
+        self.max_sources = max_sources
+        self.connections_per_source = connections_per_source
+        self.years = years
+        self.load = load
+        self.load_options = load_options or {}
+        self.allow_partial = allow_partial
+
+        # nome -> {"status": "ok" | "failed", "seconds", "rows", "error"...}
+        self.sources = {}
+
+    def _collect(self, futures):
+        """Espera cada origem; uma exceção vira status "failed" daquela origem."""
+        results = []
+        for name, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                self.sources[name] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                print(f"\n ERRO na origem {name}:")
+                print(f"   Tipo: {type(e).__name__}")
+                print(f"   Mensagem: {e}")
+                continue
+
+            self.sources[name] = {
+                "status": "ok",
+                "seconds": round(result["seconds"], 3),
+                "rows": result["rows"],
+                "partials": len(result["partials"]),
+                "stages": result["stages"],
+            }
+            results.append(result)
+        return results
+
+    def run(self):
+        """
+        Executa todas as origens, classifica e carrega.
+
+        Returns:
+            pd.DataFrame: Métricas por produto de todas as origens, ou None se
+                nenhuma origem der certo (ou alguma falhar com allow_partial=False)
+        """
+        log(f"\n{'='*60}")
+        log(f" INICIANDO ETL EM {len(self.targets)} ORIGENS")
+        log(f"{'='*60}")
+        log(f"   Até {self.max_sources} origens ao mesmo tempo, "
+            f"{self.connections_per_source} conexões por origem")
+
+        metrics = get_metrics()
+        wall_start = time.perf_counter()
+
+        with metrics.stage("fanout", "extração e parciais das origens") as record:
+            workers = min(self.max_sources, len(self.targets))
+            # spawn: o filho não herda o pool (nem as conexões) deste processo
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = {
+                    name: executor.submit(_process_source, name, factory,
+                                          self.years, self.connections_per_source,
+                                          metrics.run_id, get_verbosity())
+                    for name, factory in self.targets.items()
+                }
+                results = self._collect(futures)
+            record["rows_out"] = sum(result["rows"] for result in results)
+
+        failed = [name for name, source in self.sources.items() if source["status"] == "failed"]
+        metrics.set_info(fanout_sources=self.sources)
+
+        if not results or (failed and not self.allow_partial):
+            print(f"\n ETL abortado: origens com falha {failed}")
+            return None
+        if failed:
+            log(f"\n Atenção: seguindo sem as origens {failed}", level=0)
+
+        # Classificação: uma só, sobre a soma de todas as origens
+        with metrics.stage("transform", "fanout: classificação"):
+            state = ProductAggregateState(self.years)
+            for result in results:
+                state.fold_partials(result["partials"])
+            state.expire()
+
+            products = pd.concat([result["products"] for result in results], ignore_index=True)
+            products_metrics = state.to_metrics(products)
+            products_metrics = add_derived_metrics(products_metrics)
+            products_metrics = classify_performance(products_metrics)
+            products_metrics = finalize_metrics(products_metrics)
+
+        if self.load and not load_data(products_metrics, **self.load_options):
+            print(f"\n ETL abortado: carga falhou")
+            return None
+
+        log(f"\n{'='*60}")
+        log(f" ETL EM {len(results)} ORIGENS CONCLUÍDO em {time.perf_counter() - wall_start:.2f}s")
+        log(f"{'='*60}")
+
+        return products_metrics
+
+    def print_sources(self):
+        log(f"\n ORIGENS:")
+        log(f"   {'origem':<16} {'status':<8} {'tempo':>8} {'linhas':>12}")
+        for name, source in self.sources.items():
+            if source["status"] == "ok":
+                log(f"   {name:<16} {'ok':<8} {source['seconds']:>7.2f}s {source['rows']:>12,}")
+            else:
+                log(f"   {name:<16} {'falhou':<8} {source['error']}")
+
+
+def run_fanout(targets, max_sources=DEFAULT_MAX_SOURCES,
+               connections_per_source=DEFAULT_CONNECTIONS_PER_SOURCE,
+               years=YEARS_TO_ANALYZE, load=True, allow_partial=True, **load_options):
+    """
+    Atalho: executa o FanoutRunner e mostra o resultado de cada origem.
+
+    Args:
+        targets (dict): nome da origem -> fábrica de conexões
+        max_sources (int): Origens processadas ao mesmo tempo
+        connections_per_source (int): Conexões simultâneas em cada origem
+        years (int): Janela de anos analisada
+        load (bool): Se False, para depois da classificação
+        allow_partial (bool): Se True, segue sem as origens que falharem
+        **load_options: Repassados ao load_data (strategy, batch_size...)
+
+    Returns:
+        pd.DataFrame: Métricas por produto ou None se falhar
+    """
+    runner = FanoutRunner(targets, max_sources, connections_per_source, years,
+                          load, load_options, allow_partial)
+    result = runner.run()
+    runner.print_sources()
+    return result
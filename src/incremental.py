@@ -0,0 +1,231 @@
+"""
+Extração incremental baseada em marca d'água (high-water mark).
+
+Responsabilidade:
+- Guardar, por tabela de origem, o maior ModifiedDate/SalesOrderID já lido
+- Buscar no banco só as linhas depois da marca
+- Mesclar o delta no snapshot da execução anterior
+
+Limitação: linhas apagadas na origem não aparecem no delta.
+Use full_refresh=True de tempos em tempos para reconstruir o snapshot.
+"""
+
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+from src.connection_pool import borrow_connection, return_connection
+from src.extract import SCHEMAS, SOURCES, _add_predicate, extract_data, extract_products
+from src.metrics import get_metrics, log
+
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+STATE_DIR = ".etl_state"
+WATERMARK_FILE = "watermarks.json"
+
+# Tabelas com extração incremental: chave primária de cada uma.
+# A chave decide qual versão da linha fica no merge (a mais nova).
+INCREMENTAL_SOURCES = {
+    "sales_detail": "SalesOrderDetailID",
+    "sales_header": "SalesOrderID",
+}
+
+# Modos de marca d'água:
+# - "modified_date": pega inserções e alterações (ModifiedDate > marca)
+# - "order_id": pega só pedidos novos (SalesOrderID > marca), mais barato
+#   porque usa o índice clusterizado
+WATERMARK_MODES = ("modified_date", "order_id")
+
+
+def _watermark_path(state_dir):
+    return os.path.join(state_dir, WATERMARK_FILE)
+
+
+def _snapshot_path(state_dir, name):
+    return os.path.join(state_dir, f"snapshot_{name}.parquet")
+
+
+def load_watermarks(state_dir=STATE_DIR):
+    """
+    Lê as marcas d'água salvas (dicionário vazio na primeira execução).
+
+    Arquivo corrompido também vira dicionário vazio: sem marca, cada tabela
+    é extraída inteira e a marca é regravada no fim.
+    """
+    path = _watermark_path(state_dir)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            watermarks = json.load(f)
+    except (OSError, ValueError) as e:
+        log(f"\n Marcas d'água ilegíveis em {path} ({e}): extração completa", level=0)
+        return {}
+    if not isinstance(watermarks, dict):
+        log(f"\n Marcas d'água ilegíveis em {path}: extração completa", level=0)
+        return {}
+    return watermarks
+
+
+def _save_watermarks(watermarks, state_dir):
+    # Escreve num temporário e troca: um crash no meio não corrompe o arquivo
+    path = _watermark_path(state_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(watermarks, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def _save_snapshot(df, path):
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _read_current_marks(table_name):
+    """
+    Lê no banco o ModifiedDate e o SalesOrderID máximos da tabela.
+
+    A marca é lida ANTES do delta e usada como limite superior, então
+    linhas gravadas durante a extração ficam para a próxima execução.
+    """
+    conn = borrow_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MAX(ModifiedDate), MAX(SalesOrderID) FROM {table_name}")
+        modified_date, order_id = cursor.fetchone()
+        get_metrics().count("db_round_trips")
+        cursor.close()
+        return_connection(conn)
+        return {"ModifiedDate": modified_date, "SalesOrderID": order_id}
+    except Exception as e:
+        print(f"\n Erro ao ler marca d'água de {table_name}")
+        print(f" {e}")
+        return_connection(conn, broken=True)
+        return None
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def extract_incremental_table(name, mode="modified_date", state_dir=STATE_DIR,
+                              full_refresh=False):
+    """
+    Extrai uma tabela de forma incremental e atualiza o snapshot local.
+
+    Args:
+        name (str): Chave em INCREMENTAL_SOURCES ("sales_detail" ou "sales_header")
+        mode (str): "modified_date" ou "order_id" (ver WATERMARK_MODES)
+        state_dir (str): Pasta onde ficam marcas d'água e snapshots
+        full_refresh (bool): Se True, ignora a marca e relê a tabela inteira
+
+    Returns:
+        pd.DataFrame: Snapshot atualizado ou None se falhar
+    """
+    if mode not in WATERMARK_MODES:
+        raise ValueError(f"Modo inválido: {mode}. Use um de {WATERMARK_MODES}")
+
+    query, table_name = SOURCES[name]
+    key = INCREMENTAL_SOURCES[name]
+    snapshot_path = _snapshot_path(state_dir, name)
+
+    os.makedirs(state_dir, exist_ok=True)
+    watermarks = load_watermarks(state_dir)
+    previous = watermarks.get(name)
+
+    current = _read_current_marks(table_name)
+    if current is None:
+        return None
+
+    has_snapshot = os.path.exists(snapshot_path)
+    if full_refresh or previous is None or not has_snapshot:
+        log(f"\n Sem marca d'água para {table_name}: extração completa")
+        data = extract_data(query, table_name, schema=SCHEMAS[name])
+        if data is None:
+            return None
+    else:
+        snapshot = pd.read_parquet(snapshot_path)
+
+        if mode == "modified_date":
+            column = "ModifiedDate"
+            low = _as_datetime(previous[column])
+            high = current[column]
+        else:
+            column = "SalesOrderID"
+            low = previous[column]
+            high = current[column]
+
+        if high is None or str(high) == str(previous[column]):
+            log(f"\n {table_name}: nenhuma alteração desde {previous[column]}")
+            return snapshot
+
+        log(f"\n {table_name}: buscando {column} > {previous[column]}")
+        delta_query = _add_predicate(query, f"{column} > ? AND {column} <= ?")
+        delta = extract_data(delta_query, f"{table_name} (delta)", params=(low, high),
+                             schema=SCHEMAS[name])
+        if delta is None:
+            return None
+
+        # Versões novas substituem as antigas com a mesma chave
+        kept = snapshot[~snapshot[key].isin(delta[key])]
+        data = pd.concat([kept, delta], ignore_index=True)
+        data = data.sort_values(key, ignore_index=True)
+
+        log(f"   Delta: {len(delta):,} linhas")
+        log(f"   Atualizadas: {len(snapshot) - len(kept):,} linhas")
+        log(f"   Snapshot: {len(snapshot):,} -> {len(data):,} linhas")
+
+    # Snapshot primeiro, marca depois: se cair no meio, a próxima
+    # execução relê o mesmo delta em vez de perder linhas
+    _save_snapshot(data, snapshot_path)
+    watermarks[name] = {
+        "ModifiedDate": current["ModifiedDate"],
+        "SalesOrderID": current["SalesOrderID"],
+        "updated_at": datetime.now().isoformat(),
+    }
+    _save_watermarks(watermarks, state_dir)
+
+    return data
+
+
+def extract_incremental(mode="modified_date", state_dir=STATE_DIR, full_refresh=False):
+    """
+    Equivalente incremental do extract_all.
+
+    Sales.SalesOrderDetail e Sales.SalesOrderHeader vêm do snapshot + delta;
+    Production.Product é pequena e continua sendo lida inteira.
+
+    Returns:
+        dict: {"sales_detail", "sales_header", "products"} ou None se falhar
+    """
+    log("\n" + "=" * 60)
+    log("Iniciando extração incremental: ")
+
+    data = {}
+    for name in INCREMENTAL_SOURCES:
+        data[name] = extract_incremental_table(name, mode, state_dir, full_refresh)
+    data["products"] = extract_products()
+
+    if any(df is None for df in data.values()):
+        log("Algumas extraxões falharam processo abortado", level=0)
+        return None
+
+    log("\n" + "=" * 60)
+    log("Extração incremental concluida com sucesso")
+    log("\n" + "=" * 60)
+
+    return {
+        "sales_detail": data["sales_detail"],
+        "sales_header": data["sales_header"],
+        "products": data["products"],
+    }
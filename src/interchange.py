@@ -0,0 +1,192 @@
+"""
+Troca de dados entre estágios do ETL por arquivos Arrow IPC.
+
+Responsabilidade:
+- Gravar a saída de um estágio (extract, transform) como arquivos Arrow
+  IPC sem compressão, um por DataFrame, numa pasta por execução
+- Abrir esses arquivos por memory map em outro processo (ou outra máquina,
+  com a pasta num storage compartilhado), sem pickle nem cópia dos buffers
+- Conferir o schema na abertura: colunas faltando ou com tipo incompatível
+  falham antes do estágio começar, com a tabela e a coluna na mensagem
+
+Por que Arrow IPC sem compressão?
+- O arquivo já tem o layout de memória das colunas: o memory map entrega
+  os buffers direto, e o sistema operacional só lê as páginas usadas
+- Colunas numéricas sem nulos viram arrays do pandas apontando para o
+  próprio mapeamento (zero cópia); strings e datas são convertidas
+- Compressão (LZ4/ZSTD) obrigaria a descompactar tudo na leitura
+
+Layout:
+    .etl_interchange/<run_id>/<estágio>/<nome>.arrow
+"""
+
+import os
+
+import pyarrow as pa
+from src.metrics import get_metrics, log
+
+
+INTERCHANGE_DIR = ".etl_interchange"
+FILE_SUFFIX = ".arrow"
+
+# Metadados gravados no schema de cada arquivo
+STAGE_METADATA_KEY = b"etl.stage"
+TABLE_METADATA_KEY = b"etl.table"
+
+# Família de tipo esperada das colunas conferidas na abertura.
+# Dinheiro é "numeric": o pyodbc entrega money como Decimal.
+COLUMN_TYPES = {
+    "SalesOrderID": "integer",
+    "SalesOrderDetailID": "integer",
+    "ProductID": "integer",
+    "OrderQty": "integer",
+    "QtySold": "integer",
+    "NumOrders": "integer",
+    "UnitPrice": "numeric",
+    "LineTotal": "numeric",
+    "ListPrice": "numeric",
+    "StandardCost": "numeric",
+    "TotalSales": "numeric",
+    "AvgUnitPrice": "numeric",
+    "AvgTicket": "numeric",
+    "GrossMargin": "numeric",
+    "AvgQtyPerOrder": "numeric",
+    "OrderDate": "timestamp",
+    "LastSaleDate": "timestamp",
+    "ProductName": "string",
+    "Performance": "string",
+}
+
+
+class InterchangeSchemaError(ValueError):
+    """Arquivo de um estágio sem as colunas ou tipos esperados."""
+
+
+def _is_string(arrow_type):
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) \
+        or pa.types.is_string_view(arrow_type)
+
+
+_TYPE_CHECKS = {
+    "integer": pa.types.is_integer,
+    "numeric": lambda t: pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t),
+    "timestamp": lambda t: pa.types.is_timestamp(t) or pa.types.is_date(t),
+    "string": _is_string,
+}
+
+
+def default_stage_dir(stage, run_id=None):
+    """Pasta de um estágio da execução atual (ou de run_id)."""
+    return os.path.join(INTERCHANGE_DIR, run_id or get_metrics().run_id, stage)
+
+
+def validate_schema(schema, columns, table=""):
+    """
+    Confere se o schema Arrow tem as colunas pedidas, com tipos compatíveis.
+
+    Args:
+        schema (pa.Schema): Schema do arquivo
+        columns (list): Colunas obrigatórias (tipo conferido se estiver em COLUMN_TYPES)
+        table (str): Nome da tabela, para a mensagem de erro
+
+    Raises:
+        InterchangeSchemaError: Coluna faltando ou de tipo incompatível
+    """
+    missing = [col for col in columns if col not in schema.names]
+    if missing:
+        raise InterchangeSchemaError(f"{table}: colunas ausentes {missing}")
+
+    for col in columns:
+        family = COLUMN_TYPES.get(col)
+        arrow_type = schema.field(col).type
+        if family and not _TYPE_CHECKS[family](arrow_type):
+            raise InterchangeSchemaError(
+                f"{table}: coluna {col} é {arrow_type}, esperado tipo {family}"
+            )
+
+
+def write_stage(frames, stage, stage_dir=None):
+    """
+    Grava a saída de um estágio.
+
+    Args:
+        frames (dict | pd.DataFrame): nome -> DataFrame (um DataFrame só
+            é gravado como "metrics")
+        stage (str): Nome do estágio ("extract", "transform")
+        stage_dir (str): Pasta de destino; padrão .etl_interchange/<run_id>/<estágio>
+
+    Returns:
+        str: Pasta gravada (é o que os próximos estágios recebem)
+    """
+    if not isinstance(frames, dict):
+        frames = {"metrics": frames}
+    stage_dir = stage_dir or default_stage_dir(stage)
+    os.makedirs(stage_dir, exist_ok=True)
+
+    with get_metrics().stage("interchange", f"gravar {stage}") as record:
+        total_bytes = 0
+        for name, df in frames.items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = {**(table.schema.metadata or {}),
+                        STAGE_METADATA_KEY: stage.encode(), TABLE_METADATA_KEY: name.encode()}
+            table = table.replace_schema_metadata(metadata)
+
+            path = os.path.join(stage_dir, name + FILE_SUFFIX)
+            with pa.OSFile(path + ".tmp", "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(path + ".tmp", path)
+            total_bytes += os.path.getsize(path)
+
+        record["rows_out"] = sum(len(df) for df in frames.values())
+        record["bytes"] = total_bytes
+
+    log(f" Estágio '{stage}' gravado em {stage_dir} ({total_bytes / 1024 ** 2:,.1f} MB)")
+    return stage_dir
+
+
+def open_stage(stage_dir, expected=None):
+    """
+    Abre por memory map os arquivos gravados por write_stage.
+
+    Args:
+        stage_dir (str): Pasta do estágio
+        expected (dict): nome -> colunas obrigatórias (ver validate_schema);
+            tabelas do expected que não existirem na pasta também são erro
+
+    Returns:
+        dict: nome -> pd.DataFrame
+
+    Raises:
+        InterchangeSchemaError: Tabela ou coluna faltando, tipo incompatível
+    """
+    names = sorted(
+        entry[:-len(FILE_SUFFIX)] for entry in os.listdir(stage_dir)
+        if entry.endswith(FILE_SUFFIX)
+    )
+    expected = expected or {}
+    missing = [name for name in expected if name not in names]
+    if missing:
+        raise InterchangeSchemaError(f"{stage_dir}: tabelas ausentes {missing}")
+
+    frames = {}
+    with get_metrics().stage("interchange", f"abrir {os.path.basename(stage_dir)}") as record:
+        for name in names:
+            source = pa.memory_map(os.path.join(stage_dir, name + FILE_SUFFIX), "r")
+            reader = pa.ipc.open_file(source)
+            validate_schema(reader.schema, expected.get(name, []), name)
+
+            # read_all() só cria referências aos buffers do mapeamento;
+            # split_blocks evita juntar colunas num bloco 2D (que copiaria)
+            frames[name] = reader.read_all().to_pandas(split_blocks=True)
+        record["rows_out"] = sum(len(df) for df in frames.values())
+
+    log(f" Estágio aberto de {stage_dir}: {', '.join(f'{k} ({len(v):,})' for k, v in frames.items())}")
+    return frames
+
+
+def is_stage_path(value):
+    """True se value é o caminho de uma pasta de estágio (e não DataFrames)."""
+    return isinstance(value, (str, os.PathLike))
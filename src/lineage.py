@@ -0,0 +1,187 @@
+"""
+Linhagem de colunas: do que o transform usa até o SELECT da extração.
+
+Responsabilidade:
+- Juntar as colunas que cada STEP declara em STEP_COLUMNS (src.transform)
+- Montar os SELECTs do extract só com essas colunas (projeção)
+- Opcionalmente empurrar o filtro de data do STEP 4 para o WHERE
+
+Por que?
+- As queries completas trazem DueDate, ShipDate, TaxAmt, Color, Size...
+  que nenhum STEP lê, mas que cruzam a rede, são decodificadas e passam
+  pelos dois pd.merge
+- Uma métrica nova só precisa declarar a coluna no STEP; a query muda sozinha
+
+As expressões SQL de cada coluna (ex.: "Name AS ProductName") vêm das
+próprias queries do extract, que continuam sendo a única definição.
+"""
+
+import re
+
+import pandas as pd
+from src.connection_pool import borrow_connection, return_connection
+from src.extract import SOURCES, _add_predicate
+from src.metrics import get_metrics, log
+from src.transform import STEP_COLUMNS, YEARS_TO_ANALYZE
+
+
+# Predicados do filtro de data por fonte (placeholder = data de corte).
+# O detalhe não tem OrderDate: filtra pelos pedidos dentro da janela.
+CUTOFF_PREDICATES = {
+    "sales_header": "OrderDate >= ?",
+    "sales_detail": (
+        "SalesOrderID IN (SELECT SalesOrderID FROM Sales.SalesOrderHeader "
+        "WHERE OrderDate >= ?)"
+    ),
+}
+
+# Mesma regra do STEP 4: a data máxima é a das vendas com linhas de detalhe
+QUERY_MAX_ORDER_DATE = """
+    SELECT MAX(h.OrderDate)
+    FROM Sales.SalesOrderHeader h
+    WHERE EXISTS (
+        SELECT 1 FROM Sales.SalesOrderDetail d
+        WHERE d.SalesOrderID = h.SalesOrderID
+    )
+"""
+
+_SELECT_LIST = re.compile(r"SELECT\s+(.*?)\s+FROM\s+(\S+)", re.IGNORECASE | re.DOTALL)
+_ALIAS = re.compile(r"^(.*?)\s+AS\s+(\w+)$", re.IGNORECASE | re.DOTALL)
+
+
+def parse_select_list(query):
+    """
+    Lê a lista de colunas de uma query simples (SELECT ... FROM tabela).
+
+    Returns:
+        tuple: (dict coluna de saída -> expressão SQL, tabela do FROM)
+    """
+    match = _SELECT_LIST.search(query)
+    if not match:
+        raise ValueError("Query sem SELECT ... FROM reconhecível")
+
+    columns = {}
+    for item in match.group(1).split(","):
+        expression = " ".join(item.split())
+        alias = _ALIAS.match(expression)
+        name = alias.group(2) if alias else expression.split(".")[-1]
+        columns[name] = expression
+    return columns, match.group(2)
+
+
+def required_columns(steps=STEP_COLUMNS, extra=None):
+    """
+    Colunas que cada fonte precisa entregar.
+
+    Args:
+        steps (dict): STEP -> {fonte: [colunas]} (padrão: STEP_COLUMNS)
+        extra (dict): {fonte: [colunas]} pedidas por outros consumidores
+            (ex.: SalesOrderDetailID para o estado incremental)
+
+    Returns:
+        dict: fonte -> lista de colunas, na ordem da query original
+    """
+    needed = {name: set() for name in SOURCES}
+    for declaration in list(steps.values()) + [extra or {}]:
+        for source, columns in declaration.items():
+            if source not in needed:
+                raise KeyError(f"Fonte desconhecida na declaração de colunas: {source}")
+            needed[source].update(columns)
+
+    result = {}
+    for name, (query, _) in SOURCES.items():
+        available, _ = parse_select_list(query)
+        missing = needed[name] - set(available)
+        if missing:
+            raise KeyError(f"Colunas {sorted(missing)} não existem na query de {name}")
+        result[name] = [col for col in available if col in needed[name]]
+    return result
+
+
+def build_query(name, columns):
+    """
+    Monta a query da fonte só com as colunas pedidas.
+
+    Args:
+        name (str): Fonte do extract_all ("sales_detail", ...)
+        columns (list): Colunas de saída (nomes depois do AS)
+    """
+    available, table = parse_select_list(SOURCES[name][0])
+    select_list = ",\n        ".join(available[col] for col in columns)
+    return f"""
+    SELECT
+        {select_list}
+    FROM
+        {table}
+"""
+
+
+def get_cutoff_date(years=YEARS_TO_ANALYZE):
+    """
+    Data de corte do STEP 4 calculada no banco (uma linha só).
+
+    Returns:
+        pd.Timestamp: MAX(OrderDate) - years, ou None se falhar/sem vendas
+    """
+    conn = borrow_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(QUERY_MAX_ORDER_DATE)
+        max_date = cursor.fetchone()[0]
+        get_metrics().count("db_round_trips")
+        cursor.close()
+        return_connection(conn)
+    except Exception as e:
+        print(f"\n Erro ao ler a data máxima das vendas")
+        print(f" {e}")
+        return_connection(conn, broken=True)
+        return None
+
+    if max_date is None:
+        return None
+    # Mesmo cálculo do transform (pd.DateOffset), não DATEADD do SQL
+    return pd.Timestamp(max_date) - pd.DateOffset(years=years)
+
+
+def build_queries(cutoff_years=None, steps=STEP_COLUMNS, extra=None):
+    """
+    Queries podadas de todas as fontes, no formato aceito por extract_all.
+
+    Args:
+        cutoff_years (int): Se informado, filtra header e detalhe pela
+            janela de anos do STEP 4 (o filtro no transform vira no-op)
+        steps (dict): Declaração de colunas por STEP
+        extra (dict): Colunas adicionais por fonte
+
+    Returns:
+        dict: fonte -> (query, params)
+    """
+    columns = required_columns(steps, extra)
+
+    cutoff = None
+    if cutoff_years is not None:
+        cutoff = get_cutoff_date(cutoff_years)
+        if cutoff is None:
+            log(" Data de corte indisponível: extraindo sem filtro de data", level=0)
+
+    queries = {}
+    for name, (query, _) in SOURCES.items():
+        available, _ = parse_select_list(query)
+        pruned = build_query(name, columns[name])
+        params = None
+        if cutoff is not None and name in CUTOFF_PREDICATES:
+            pruned = _add_predicate(pruned, CUTOFF_PREDICATES[name])
+            params = (cutoff.to_pydatetime(),)
+        queries[name] = (pruned, params)
+
+        dropped = [col for col in available if col not in columns[name]]
+        log(f"   {name}: {len(columns[name])}/{len(available)} colunas"
+            + (f" (sem {', '.join(dropped)})" if dropped else ""))
+
+    if cutoff is not None:
+        log(f"   Filtro de data empurrado para o banco: OrderDate >= {cutoff}")
+
+    return queries
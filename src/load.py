@@ -1,108 +1,670 @@
+import time
+import numpy as np
 import pandas as pd 
 from datetime import datetime
-from config.db_config import get_connection
+from src.batch_control import AdaptiveBatchController
+from src.connection_pool import borrow_connection, return_connection
+from src.interchange import is_stage_path, open_stage
+from src.metrics import get_metrics, log
 
 
-def load_data(df, table_name="Analytics.ProductSalesMetrics", truncate=True):
+# Colunas da tabela analítica, na ordem do INSERT
+INSERT_COLUMNS = [
+    'ProductID', 'TotalSales', 'QtySold', 'AvgUnitPrice',
+    'LastSaleDate', 'ProductName', 'ListPrice', 'StandardCost',
+    'NumOrders', 'AvgTicket', 'GrossMargin', 'AvgQtyPerOrder',
+    'Performance', 'ProcessedAt'
+]
+
+# Colunas que o transform entrega (ProcessedAt é preenchida na carga)
+METRIC_COLUMNS = [col for col in INSERT_COLUMNS if col != 'ProcessedAt']
+
+# Colunas que o banco espera como inteiro (no DataFrame podem vir como float)
+INTEGER_COLUMNS = ['QtySold', 'NumOrders']
+
+# Colunas da tabela longa de janelas/períodos (ver src.rollups)
+ROLLUP_INSERT_COLUMNS = [
+    'RollupType', 'RollupKey', 'PeriodStart', 'PeriodEnd',
+    'ProductID', 'TotalSales', 'QtySold', 'AvgUnitPrice',
+    'LastSaleDate', 'NumOrders', 'Performance', 'ProcessedAt'
+]
+
+# Tabela da carga de janelas/períodos no SQL Server, criada pelo
+# load_rollups quando não existe (mesmas colunas do ROLLUP_INSERT_COLUMNS;
+# no SQLite do src.synthetic ela já nasce com o banco)
+ROLLUP_TABLE_DDL = """
+    IF OBJECT_ID(N'{table_name}', N'U') IS NULL
+    CREATE TABLE {table_name} (
+        RollupType VARCHAR(10) NOT NULL,
+        RollupKey VARCHAR(20) NOT NULL,
+        PeriodStart DATETIME2 NOT NULL,
+        PeriodEnd DATETIME2 NOT NULL,
+        ProductID INT NOT NULL,
+        TotalSales DECIMAL(38, 6),
+        QtySold BIGINT,
+        AvgUnitPrice DECIMAL(19, 4),
+        LastSaleDate DATETIME2,
+        NumOrders INT,
+        Performance VARCHAR(10),
+        ProcessedAt DATETIME2,
+        PRIMARY KEY (RollupKey, PeriodStart, ProductID)
+    )
+"""
+
+# Linhas enviadas por executemany
+DEFAULT_BATCH_SIZE = 1000
+
+# Estratégias de carga aceitas por load_data
+LOAD_STRATEGIES = ("insert", "merge", "swap")
+
+# Sufixos das tabelas auxiliares do modo swap
+SHADOW_SUFFIX = "_shadow"
+PREVIOUS_SUFFIX = "_previous"
+
+# O que a sombra do swap não consegue reproduzir: com isso na tabela
+# principal a troca de nomes perderia ou quebraria algo, então é recusada
+QUERY_SWAP_BLOCKERS = """
+    SELECT N'índice ' + i.name + N' (' + i.type_desc + N')'
+    FROM sys.indexes AS i
+    WHERE i.object_id = OBJECT_ID(?) AND i.type NOT IN (0, 1, 2)
+    UNION ALL
+    SELECT N'referenciada pela FK ' + fk.name
+    FROM sys.foreign_keys AS fk
+    WHERE fk.referenced_object_id = OBJECT_ID(?)
+    UNION ALL
+    SELECT N'FK ' + fk.name
+    FROM sys.foreign_keys AS fk
+    WHERE fk.parent_object_id = OBJECT_ID(?)
+    UNION ALL
+    SELECT N'trigger ' + tr.name
+    FROM sys.triggers AS tr
+    WHERE tr.parent_id = OBJECT_ID(?)
+"""
+
+# Colunas comparadas pelo hash do modo merge (ProcessedAt muda a cada
+# execução e não indica mudança nas métricas)
+HASH_COLUMNS = [col for col in INSERT_COLUMNS if col not in ('ProductID', 'ProcessedAt')]
+DATE_COLUMNS = ['LastSaleDate']
+TEXT_COLUMNS = ['ProductName', 'Performance']
+
+
+def _build_insert_query(table_name, insert_columns=INSERT_COLUMNS):
+    columns = ", ".join(insert_columns)
+    placeholders = ", ".join("?" for _ in insert_columns)
+    return f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+
+
+def _to_parameter_rows(df, insert_columns=INSERT_COLUMNS):
+    """
+    Converte o DataFrame em lista de tuplas para o executemany.
+
+    Por que converter coluna a coluna e não linha a linha?
+    - Uma conversão vetorizada por coluna em vez de 14 por linha
+    - O pyodbc não aceita tipos numpy, então tudo vira objeto Python aqui
+    - NaN/NaT viram None (NULL no banco), como já era feito com GrossMargin
+    """
+    columns = []
+    for col in insert_columns:
+        values = df[col]
+        if col in INTEGER_COLUMNS:
+            values = values.astype('int64')
+
+        if pd.api.types.is_datetime64_any_dtype(values):
+            array = np.array(values.dt.to_pydatetime(), dtype=object)
+        else:
+            array = values.astype(object).to_numpy(copy=True)
+
+        array[values.isna().to_numpy()] = None
+        columns.append(array)
+
+    return list(zip(*columns))
+
+
+def _insert_batches(conn, cursor, insert_query, rows, batch_size, commit_every,
+                    on_commit=None, first_batch=1):
+    """
+    Envia as linhas em lotes de executemany, com commit a cada commit_every.
+
+    Args:
+        batch_size (int | AdaptiveBatchController): Tamanho fixo do lote ou
+            controlador que escolhe o tamanho de cada lote pelas medidas
+        on_commit (callable): Chamado com (linhas inseridas, lotes enviados)
+            depois de cada commit (ex.: RunCheckpoint.record_commit)
+        first_batch (int): Número do primeiro lote (ao retomar uma carga)
+
+    Returns:
+        int: Linhas inseridas
+    """
+    metrics = get_metrics()
+    
+    # fast_executemany envia o lote inteiro num único pacote de parâmetros
+    # em vez de um round trip por linha (só existe no cursor do pyodbc)
+    if hasattr(cursor, 'fast_executemany'):
+        cursor.fast_executemany = True
+    
+    controller = batch_size if isinstance(batch_size, AdaptiveBatchController) else None
+    
+    rows_inserted = 0
+    pending_commit = 0
+    batch_number = first_batch
+    
+    while rows_inserted < len(rows):
+        size = controller.size if controller else batch_size
+        batch = rows[rows_inserted:rows_inserted + size]
+        timer = metrics.start_stage("load", f"lote {batch_number}", rows_in=len(batch))
+        start = time.perf_counter()
+        
+        cursor.executemany(insert_query, batch)
+        metrics.count("db_round_trips")
+        rows_inserted += len(batch)
+        pending_commit += len(batch)
+        
+        committed = False
+        if commit_every and pending_commit >= commit_every:
+            conn.commit()
+            metrics.count("db_round_trips")
+            pending_commit = 0
+            committed = True
+            if on_commit:
+                on_commit(rows_inserted, batch_number - first_batch + 1)
+        
+        if controller:
+            # A leitura de lock fica fora do tempo medido do lote
+            seconds = time.perf_counter() - start
+            controller.record(len(batch), seconds, controller.read_lock_wait_ms(cursor))
+        
+        timer.finish(rows_out=len(batch), committed=committed, batch_size=len(batch))
+        batch_number += 1
+        
+        progress = rows_inserted / len(rows) * 100
+        log(f"    Progresso: {progress:.1f}% ({rows_inserted:,}/{len(rows):,})")
+    
+    return rows_inserted
+
+
+def _row_hash_expression(alias):
+    """
+    HASHBYTES das colunas de métrica de uma linha (sem ProductID e ProcessedAt).
+
+    Por que converter tudo para texto antes do hash?
+    - float passa por CONVERT estilo 3 (17 dígitos): o estilo padrão
+      arredonda para 6 dígitos e esconderia mudanças pequenas
+    - COALESCE marca NULL explicitamente; CONCAT_WS pularia a coluna
+    """
+    parts = []
+    for col in HASH_COLUMNS:
+        ref = f"{alias}.{col}"
+        if col in DATE_COLUMNS:
+            text = f"CONVERT(varchar(33), {ref}, 126)"
+        elif col in TEXT_COLUMNS:
+            text = f"CAST({ref} AS nvarchar(400))"
+        else:
+            text = f"CONVERT(varchar(30), CAST({ref} AS float), 3)"
+        parts.append(f"COALESCE({text}, N'<NULL>')")
+    separator = ",\n            "
+    return f"HASHBYTES('SHA2_256', CONCAT_WS(N'|',\n            {separator.join(parts)}))"
+
+
+def _build_merge_query(table_name, staging_table):
+    """
+    MERGE único da tabela de staging na tabela de destino.
+
+    - Mesmo ProductID e hash diferente -> UPDATE
+    - Só no staging -> INSERT
+    - Só no destino (produto saiu da janela) -> DELETE
+    Linhas iguais não são tocadas: nem log, nem lock de escrita.
+    """
+    update_set = ",\n            ".join(
+        f"t.{col} = s.{col}" for col in INSERT_COLUMNS if col != 'ProductID'
+    )
+    columns = ", ".join(INSERT_COLUMNS)
+    values = ", ".join(f"s.{col}" for col in INSERT_COLUMNS)
+    return f"""
+    MERGE {table_name} WITH (HOLDLOCK) AS t
+    USING {staging_table} AS s
+        ON t.ProductID = s.ProductID
+    WHEN MATCHED AND {_row_hash_expression('t')} <> {_row_hash_expression('s')} THEN
+        UPDATE SET
+            {update_set}
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT ({columns})
+        VALUES ({values})
+    WHEN NOT MATCHED BY SOURCE THEN
+        DELETE
+    OUTPUT $action;
+    """
+
+
+def _merge_load(conn, cursor, table_name, rows, batch_size):
+    """
+    Carga diferencial: staging temporário + um único MERGE.
+
+    Returns:
+        dict: Linhas inseridas, atualizadas, removidas e inalteradas
+    """
+    metrics = get_metrics()
+    staging_table = f"#{table_name.split('.')[-1]}_staging"
+    
+    # Tabela temporária com as mesmas colunas e tipos do destino (lidos da
+    # própria tabela: o MERGE só precisa das colunas).
+    # O DROP antes protege contra uma sobra na conexão reaproveitada do pool.
+    with metrics.stage("load", "staging"):
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        cursor.execute(f"SELECT TOP 0 * INTO {staging_table} FROM {table_name}")
+        metrics.count("db_round_trips", 2)
+    
+    log(f"\n Carregando staging {staging_table}...")
+    # A temporária é só desta sessão: sem commits intermediários
+    _insert_batches(conn, cursor, _build_insert_query(staging_table), rows,
+                    batch_size, commit_every=0)
+    
+    log(f"\n Aplicando MERGE em {table_name}...")
+    with metrics.stage("load", "MERGE", rows_in=len(rows)) as record:
+        cursor.execute(_build_merge_query(table_name, staging_table))
+        actions = [row[0] for row in cursor.fetchall()]
+        # DROP antes do commit: o rollback do pool desfaria um DROP posterior
+        cursor.execute(f"DROP TABLE {staging_table}")
+        conn.commit()
+        metrics.count("db_round_trips", 3)
+        
+        changes = {
+            'inserted': actions.count('INSERT'),
+            'updated': actions.count('UPDATE'),
+            'deleted': actions.count('DELETE'),
+        }
+        changes['unchanged'] = len(rows) - changes['inserted'] - changes['updated']
+        record.update(changes)
+    
+    return changes
+
+
+def _copy_constraints_statement(source_table, target_table):
+    """
+    Repete em target_table os DEFAULT e CHECK de source_table, lidos do catálogo.
+
+    Por que constraints sem nome?
+    - Nome de constraint é único no schema: a sombra não pode repetir o
+      da tabela principal, e depois de um sp_rename o nome antigo fica
+      com a tabela renomeada. O SQL Server gera um nome único para cada uma
+    """
+    return f"""
+    DECLARE @sql nvarchar(max) = N'';
+    SELECT @sql += N'ALTER TABLE {target_table} ADD DEFAULT ' + dc.definition
+        + N' FOR ' + QUOTENAME(c.name) + N';'
+    FROM sys.default_constraints AS dc
+    JOIN sys.columns AS c
+        ON c.object_id = dc.parent_object_id AND c.column_id = dc.parent_column_id
+    WHERE dc.parent_object_id = OBJECT_ID(N'{source_table}');
+    SELECT @sql += N'ALTER TABLE {target_table} ADD CHECK ' + cc.definition + N';'
+    FROM sys.check_constraints AS cc
+    WHERE cc.parent_object_id = OBJECT_ID(N'{source_table}');
+    EXEC sp_executesql @sql;
+    """
+
+
+def _copy_indexes_statement(source_table, target_table):
+    """
+    Recria em target_table a PK, as UNIQUE e os índices de source_table
+    (chaves, ordem, INCLUDE e filtro), o clusterizado primeiro.
+    """
+    def column_list(included):
+        descending = "" if included else " + CASE WHEN ic.is_descending_key = 1 THEN N' DESC' ELSE N'' END"
+        return f"""(
+            SELECT STRING_AGG(CAST(QUOTENAME(c.name){descending} AS nvarchar(max)), N', ')
+                   WITHIN GROUP (ORDER BY ic.key_ordinal, ic.index_column_id)
+            FROM sys.index_columns AS ic
+            JOIN sys.columns AS c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+            WHERE ic.object_id = i.object_id AND ic.index_id = i.index_id
+              AND ic.is_included_column = {1 if included else 0}
+        )"""
+
+    return f"""
+    DECLARE @sql nvarchar(max);
+    SELECT @sql = STRING_AGG(CAST(
+        CASE
+            WHEN i.is_primary_key = 1 THEN
+                N'ALTER TABLE {target_table} ADD PRIMARY KEY ' + i.type_desc + N' (' + k.cols + N')'
+            WHEN i.is_unique_constraint = 1 THEN
+                N'ALTER TABLE {target_table} ADD UNIQUE ' + i.type_desc + N' (' + k.cols + N')'
+            ELSE
+                N'CREATE ' + CASE WHEN i.is_unique = 1 THEN N'UNIQUE ' ELSE N'' END
+                + i.type_desc + N' INDEX ' + QUOTENAME(i.name) + N' ON {target_table} (' + k.cols + N')'
+                + COALESCE(N' INCLUDE (' + inc.cols + N')', N'')
+                + COALESCE(N' WHERE ' + i.filter_definition, N'')
+        END + N';' AS nvarchar(max)), N' ') WITHIN GROUP (ORDER BY i.index_id)
+    FROM sys.indexes AS i
+    CROSS APPLY (SELECT {column_list(False)} AS cols) AS k
+    CROSS APPLY (SELECT {column_list(True)} AS cols) AS inc
+    WHERE i.object_id = OBJECT_ID(N'{source_table}') AND i.type IN (1, 2);
+    IF @sql IS NOT NULL EXEC sp_executesql @sql;
+    """
+
+
+def _copy_permissions_statement(source_table, target_table):
+    """
+    Repete em target_table os GRANT/DENY de objeto dados em source_table.
+
+    sp_rename leva as permissões junto com a tabela: sem esta cópia a
+    sombra assumiria o nome da principal sem os acessos dos leitores.
+    """
+    return f"""
+    DECLARE @sql nvarchar(max) = N'';
+    SELECT @sql += CASE p.state WHEN 'W' THEN N'GRANT' ELSE p.state_desc END
+        + N' ' + p.permission_name + N' ON OBJECT::{target_table} TO '
+        + QUOTENAME(USER_NAME(p.grantee_principal_id))
+        + CASE p.state WHEN 'W' THEN N' WITH GRANT OPTION' ELSE N'' END + N';'
+    FROM sys.database_permissions AS p
+    WHERE p.class = 1 AND p.minor_id = 0
+      AND p.major_id = OBJECT_ID(N'{source_table}');
+    EXEC sp_executesql @sql;
+    """
+
+
+def _split_table_name(table_name):
+    """'Analytics.ProductSalesMetrics' -> ('Analytics', 'ProductSalesMetrics')"""
+    schema, _, name = table_name.rpartition('.')
+    return schema or 'dbo', name
+
+
+def _rename_statements(renames):
+    """sp_rename de cada (tabela atual, novo nome) numa única transação."""
+    statements = ["SET XACT_ABORT ON;", "BEGIN TRANSACTION;"]
+    for current, new_name in renames:
+        statements.append(f"EXEC sp_rename '{current}', '{new_name}';")
+    statements.append("COMMIT TRANSACTION;")
+    return "\n".join(statements)
+
+
+def _swap_load(conn, cursor, table_name, rows, batch_size):
+    """
+    Carga numa tabela sombra + troca de nomes atômica.
+
+    Fluxo:
+    1. Confere se a tabela principal tem algo que a sombra não reproduz
+       (FKs, triggers, índices columnstore/XML/espaciais): se tiver, recusa
+    2. Cria <tabela>_shadow a partir da tabela principal (SELECT TOP 0 INTO:
+       colunas, tipos, nulidade e IDENTITY) e copia do catálogo os DEFAULT,
+       CHECK e permissões
+    3. Insere tudo com TABLOCK e um único commit: ninguém lê a sombra,
+       então o lock de tabela não bloqueia ninguém
+    4. Recria a PK, as UNIQUE e os índices da principal depois da carga
+       (mais barato que manter os índices durante os inserts)
+    5. Numa transação: destino -> <tabela>_previous, sombra -> destino
+
+    Os leitores só esperam o lock de schema dos sp_rename (milissegundos)
+    e nunca veem a tabela vazia ou pela metade.
+
+    Returns:
+        str: Nome da versão anterior guardada para rollback
+    """
+    metrics = get_metrics()
+    schema, name = _split_table_name(table_name)
+    shadow_table = f"{schema}.{name}{SHADOW_SUFFIX}"
+    previous_table = f"{schema}.{name}{PREVIOUS_SUFFIX}"
+    
+    with metrics.stage("load", "shadow"):
+        cursor.execute(QUERY_SWAP_BLOCKERS, (table_name,) * 4)
+        blockers = [row[0] for row in cursor.fetchall()]
+        if blockers:
+            raise RuntimeError(
+                f"swap recusado: {table_name} tem {', '.join(blockers)}; use strategy='merge'"
+            )
+        cursor.execute(f"DROP TABLE IF EXISTS {shadow_table}")
+        cursor.execute(f"SELECT TOP 0 * INTO {shadow_table} FROM {table_name}")
+        cursor.execute(_copy_constraints_statement(table_name, shadow_table))
+        cursor.execute(_copy_permissions_statement(table_name, shadow_table))
+        conn.commit()
+        metrics.count("db_round_trips", 6)
+    
+    log(f"\n Carregando tabela sombra {shadow_table}...")
+    insert_query = _build_insert_query(shadow_table).replace(
+        f"INSERT INTO {shadow_table}", f"INSERT INTO {shadow_table} WITH (TABLOCK)"
+    )
+    _insert_batches(conn, cursor, insert_query, rows, batch_size, commit_every=0)
+    
+    with metrics.stage("load", "índice"):
+        cursor.execute(_copy_indexes_statement(table_name, shadow_table))
+        conn.commit()
+        metrics.count("db_round_trips", 2)
+    
+    log(f"\n Trocando {shadow_table} -> {table_name}...")
+    with metrics.stage("load", "swap"):
+        # A versão guardada da execução anterior sai antes da troca
+        cursor.execute(f"DROP TABLE IF EXISTS {previous_table}")
+        cursor.execute(_rename_statements([
+            (table_name, f"{name}{PREVIOUS_SUFFIX}"),
+            (shadow_table, name),
+        ]))
+        conn.commit()
+        metrics.count("db_round_trips", 3)
+    
+    log(f" Versão anterior guardada em {previous_table}")
+    return previous_table
+
+
+def rollback_load(table_name="Analytics.ProductSalesMetrics"):
+    """
+    Desfaz a última carga "swap": a versão anterior volta a ser a tabela
+    principal e a carga desfeita fica em <tabela>_previous.
+
+    Chamar de novo refaz a carga (troca as duas de volta).
+
+    Args:
+        table_name (str): Nome completo da tabela
+    
+    Returns:
+        bool: True se sucesso, False se falhar
+    """
+    schema, name = _split_table_name(table_name)
+    previous_table = f"{schema}.{name}{PREVIOUS_SUFFIX}"
+    # Nome temporário para as duas tabelas trocarem de lugar
+    swap_table = f"{schema}.{name}{SHADOW_SUFFIX}"
+    
+    log(f"\n Rollback: {previous_table} -> {table_name}")
+    
+    conn = borrow_connection()
+    
+    if not conn:
+        log(f" Falha ao conectar. Rollback abortado.", level=0)
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {swap_table}")
+        cursor.execute(_rename_statements([
+            (table_name, f"{name}{SHADOW_SUFFIX}"),
+            (previous_table, name),
+            (swap_table, f"{name}{PREVIOUS_SUFFIX}"),
+        ]))
+        conn.commit()
+        get_metrics().count("db_round_trips", 3)
+        
+        cursor.close()
+        return_connection(conn)
+        
+        log(f" Rollback concluído")
+        return True
+        
+    except Exception as e:
+        print(f"\n ERRO no rollback:")
+        print(f"   Tipo: {type(e).__name__}")
+        print(f"   Mensagem: {e}")
+        
+        if conn:
+            conn.rollback()
+            return_connection(conn, broken=True)
+        
+        return False
+
+
+def load_data(df, table_name="Analytics.ProductSalesMetrics", truncate=True,
+              batch_size=DEFAULT_BATCH_SIZE, commit_every=None, strategy="insert",
+              checkpoint=None):
     """
     Carrega DataFrame no SQL Server.
     
+    Estratégias:
+    - "insert": (TRUNCATE opcional) + INSERT de todas as linhas
+    - "merge": carrega um staging e aplica só as diferenças com um MERGE
+      (ignora truncate e commit_every; um único commit no final)
+    - "swap": carrega uma tabela sombra e troca de nome com a principal;
+      a versão anterior fica em <tabela>_previous (ver rollback_load).
+      Também ignora truncate e commit_every: como ninguém lê a sombra,
+      pode usar lotes grandes
+    
     Args:
-        df (pd.DataFrame): DataFrame com dados transformados
+        df (pd.DataFrame | str): DataFrame com dados transformados, ou a pasta
+            gravada com write_stage(metrics, "transform") (ver src.interchange)
         table_name (str): Nome completo da tabela (schema.table)
         truncate (bool): Se True, limpa tabela antes de inserir
+        batch_size (int | str | AdaptiveBatchController): Linhas enviadas por
+            executemany. "auto" (ou um AdaptiveBatchController) ajusta o lote
+            pela latência e pelas linhas/s medidas (ver src.batch_control)
+        commit_every (int): Linhas entre commits. None = commit a cada lote;
+            0 = um único commit no final
+        strategy (str): "insert", "merge" ou "swap"
+        checkpoint (RunCheckpoint): Se informado, registra cada commit; numa
+            nova tentativa da mesma execução, a carga "insert" continua depois
+            do último lote confirmado (sem TRUNCATE) e uma carga já concluída
+            não é refeita (ver src.checkpoint)
     
     Returns:
         bool: True se sucesso, False se falhar
     """
     
-    print(f"\n{'='*60}")
-    print(f" INICIANDO CARGA DE DADOS")
-    print(f"{'='*60}")
+    if strategy not in LOAD_STRATEGIES:
+        raise ValueError(f"strategy deve ser um de {LOAD_STRATEGIES}, recebido {strategy!r}")
+    
+    if is_stage_path(df):
+        df = open_stage(df, expected={"metrics": METRIC_COLUMNS})["metrics"]
+    
+    if batch_size == "auto":
+        batch_size = AdaptiveBatchController()
+    controller = batch_size if isinstance(batch_size, AdaptiveBatchController) else None
+    
+    log(f"\n{'='*60}")
+    log(f" INICIANDO CARGA DE DADOS ({strategy.upper()})")
+    log(f"{'='*60}")
+    
+    metrics = get_metrics()
     
-    conn = get_connection()
+    conn = borrow_connection()
     
     if not conn:
-        print(f" Falha ao conectar. Carga abortada.")
+        log(f" Falha ao conectar. Carga abortada.", level=0)
         return False
     
     try:
         cursor = conn.cursor()
         
-        if truncate:
-            print(f"\n  Limpando tabela {table_name}...")
-            cursor.execute(f"TRUNCATE TABLE {table_name}")
-            conn.commit()
-            print(f" Tabela limpa")
+        progress = checkpoint.load_progress(table_name, len(df)) if checkpoint else None
+        if progress and progress["complete"]:
+            log(f"\n Carga já concluída nesta execução ({progress['committed_rows']:,} linhas)")
+            cursor.close()
+            return_connection(conn)
+            return True
         
-        print(f"\nPreparando dados para inserção...")
-        print(f"   📦 Linhas a inserir: {len(df):,}")
+        # Só o modo insert confirma lotes no meio; merge e swap são uma transação só
+        resume_from = progress["committed_rows"] if progress and strategy == "insert" else 0
+        if resume_from:
+            log(f"\n Retomando a carga depois do lote {progress['batches']} "
+                f"({resume_from:,} linhas já confirmadas)")
+            metrics.set_info(load_resumed_rows=resume_from)
         
-        df_copy = df.copy()
-        df_copy['ProcessedAt'] = datetime.now()
+        if truncate and strategy == "insert" and not resume_from:
+            log(f"\n  Limpando tabela {table_name}...")
+            with metrics.stage("load", "TRUNCATE"):
+                cursor.execute(f"TRUNCATE TABLE {table_name}")
+                conn.commit()
+                metrics.count("db_round_trips", 2)
+            log(f" Tabela limpa")
         
-        insert_query = f"""
-            INSERT INTO {table_name} (
-                ProductID, TotalSales, QtySold, AvgUnitPrice, 
-                LastSaleDate, ProductName, ListPrice, StandardCost,
-                NumOrders, AvgTicket, GrossMargin, AvgQtyPerOrder,
-                Performance, ProcessedAt
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
+        log(f"\nPreparando dados para inserção...")
+        log(f"   📦 Linhas a inserir: {len(df) - resume_from:,}")
         
-        print(f"\n Inserindo dados...")
+        # Ao retomar, as linhas restantes recebem o mesmo ProcessedAt das já carregadas
+        processed_at = datetime.fromisoformat(progress["processed_at"]) if resume_from else datetime.now()
         
-        rows_inserted = 0
-        batch_size = 100
+        df_copy = df.iloc[resume_from:].copy()
+        df_copy['ProcessedAt'] = processed_at
         
-        for i in range(0, len(df_copy), batch_size):
-            batch = df_copy.iloc[i:i+batch_size]
-            
-            for _, row in batch.iterrows():
-                cursor.execute(
-                    insert_query,
-                    row['ProductID'],
-                    row['TotalSales'],
-                    int(row['QtySold']),
-                    row['AvgUnitPrice'],
-                    row['LastSaleDate'],
-                    row['ProductName'],
-                    row['ListPrice'],
-                    row['StandardCost'],
-                    int(row['NumOrders']),
-                    row['AvgTicket'],
-                    row['GrossMargin'] if pd.notna(row['GrossMargin']) else None,
-                    row['AvgQtyPerOrder'],
-                    row['Performance'],
-                    row['ProcessedAt']
-                )
-                rows_inserted += 1
+        rows = _to_parameter_rows(df_copy)
+        
+        if commit_every is None:
+            # Com o controlador o lote muda de tamanho: commit a cada lote
+            commit_every = 1 if controller else batch_size
+        
+        on_commit = None
+        if checkpoint:
+            if not resume_from:
+                checkpoint.start_load(table_name, len(df), processed_at)
+            done_batches = progress["batches"] if resume_from else 0
             
+            def on_commit(rows_committed, batches):
+                checkpoint.record_commit(resume_from + rows_committed, done_batches + batches)
+        
+        log(f"\n Inserindo dados...")
+        
+        start = time.perf_counter()
+        
+        if strategy == "merge":
+            changes = _merge_load(conn, cursor, table_name, rows, batch_size)
+            rows_inserted = len(rows)
+        elif strategy == "swap":
+            previous_table = _swap_load(conn, cursor, table_name, rows, batch_size)
+            rows_inserted = len(rows)
+        else:
+            first_batch = progress["batches"] + 1 if resume_from else 1
+            rows_inserted = _insert_batches(conn, cursor, _build_insert_query(table_name),
+                                            rows, batch_size, commit_every,
+                                            on_commit=on_commit, first_batch=first_batch)
             conn.commit()
-            
-            progress = (i + len(batch)) / len(df_copy) * 100
-            print(f"    Progresso: {progress:.1f}% ({i + len(batch):,}/{len(df_copy):,})")
+            metrics.count("db_round_trips")
+        
+        if checkpoint:
+            checkpoint.finish_load()
+        
+        elapsed = time.perf_counter() - start
+        rows_per_second = rows_inserted / elapsed if elapsed > 0 else 0.0
+        metrics.set_info(load_rows=rows_inserted, load_rows_per_second=round(rows_per_second, 1))
+        if controller:
+            metrics.set_info(load_batching=controller.report())
         
-        print(f"\n Carga concluída!")
-        print(f"  Linhas inseridas: {rows_inserted:,}")
+        log(f"\n Carga concluída!")
+        log(f"  Linhas inseridas: {rows_inserted:,}")
+        log(f"  Tempo: {elapsed:.2f}s ({rows_per_second:,.0f} linhas/s)")
+        if controller:
+            batching = controller.report()
+            if batching["batches"]:
+                log(f"  Lote adaptativo: {batching['batches']} lotes, final {batching['final_size']:,}, "
+                    f"melhor {batching['best_size']:,} ({batching['best_rows_per_second']:,.0f} linhas/s), "
+                    f"{batching['backoffs']} recuos")
         
-        print(f"\n🔍 Validando dados carregados...")
+        if strategy == "merge":
+            metrics.set_info(load_merge=changes)
+            log(f"  MERGE: {changes['inserted']:,} inseridas, {changes['updated']:,} atualizadas, "
+                f"{changes['deleted']:,} removidas, {changes['unchanged']:,} inalteradas")
+        elif strategy == "swap":
+            metrics.set_info(load_previous_table=previous_table)
+        
+        log(f"\n🔍 Validando dados carregados...")
         cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
         count = cursor.fetchone()[0]
+        metrics.count("db_round_trips")
         
-        print(f"  Linhas na tabela: {count:,}")
+        log(f"  Linhas na tabela: {count:,}")
         
         if count == len(df):
-            print(f"Validação OK - todos os dados foram carregados!")
+            log(f"Validação OK - todos os dados foram carregados!")
         else:
-            print(f"Atenção: Esperado {len(df):,}, encontrado {count:,}")
+            log(f"Atenção: Esperado {len(df):,}, encontrado {count:,}", level=0)
         
         cursor.close()
-        conn.close()
+        return_connection(conn)
         
-        print(f"\n{'='*60}")
-        print(f"CARGA COMPLETA!")
-        print(f"{'='*60}")
+        log(f"\n{'='*60}")
+        log(f"CARGA COMPLETA!")
+        log(f"{'='*60}")
         
         return True
         
@@ -117,11 +679,110 @@ def load_data(df, table_name="Analytics.ProductSalesMetrics", truncate=True):
         
         if conn:
             conn.rollback()
-            conn.close()
+            return_connection(conn, broken=True)
         
         return False
 
 
+def _ensure_rollup_table(cursor, table_name):
+    """
+    Cria a tabela de janelas/períodos se ela ainda não existe (ver ROLLUP_TABLE_DDL).
+
+    Por que ignorar a falha?
+    - O IF OBJECT_ID é T-SQL: num banco que não o entende (ex.: SQLite)
+      a tabela vem do próprio banco. Se ela faltar de fato, o DELETE/INSERT
+      seguinte falha com o erro do banco
+    """
+    try:
+        cursor.execute(ROLLUP_TABLE_DDL.format(table_name=table_name))
+        get_metrics().count("db_round_trips")
+    except Exception as e:
+        log(f"  Tabela {table_name} não conferida ({type(e).__name__}): usando a existente", level=2)
+
+
+def load_rollups(rollups, table_name="Analytics.ProductSalesRollups",
+                 batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Carrega a tabela longa de janelas/períodos (saída do transform_data
+    com windows/grains) numa única transação.
+
+    Só as linhas dos RollupKey presentes em rollups são substituídas: carregar
+    só "month" não apaga as janelas carregadas antes. A tabela é criada
+    (ROLLUP_TABLE_DDL) se ainda não existe.
+
+    Args:
+        rollups (pd.DataFrame): Tabela longa (ver src.rollups.ROLLUP_COLUMNS)
+        table_name (str): Nome completo da tabela (schema.table)
+        batch_size (int): Linhas enviadas por executemany
+
+    Returns:
+        bool: True se sucesso, False se falhar
+    """
+
+    log(f"\n{'='*60}")
+    log(f" INICIANDO CARGA DE JANELAS/PERÍODOS")
+    log(f"{'='*60}")
+
+    metrics = get_metrics()
+
+    conn = borrow_connection()
+
+    if not conn:
+        log(f" Falha ao conectar. Carga abortada.", level=0)
+        return False
+
+    try:
+        cursor = conn.cursor()
+        _ensure_rollup_table(cursor, table_name)
+
+        keys = list(dict.fromkeys(rollups['RollupKey']))
+        log(f"\n  Substituindo {keys} em {table_name}...")
+
+        df_copy = rollups.copy()
+        df_copy['ProcessedAt'] = datetime.now()
+        rows = _to_parameter_rows(df_copy, ROLLUP_INSERT_COLUMNS)
+
+        start = time.perf_counter()
+
+        # DELETE + INSERT na mesma transação: quem lê a tabela vê a versão
+        # anterior inteira ou a nova inteira
+        if keys:
+            placeholders = ", ".join("?" for _ in keys)
+            with metrics.stage("load", "DELETE rollups"):
+                cursor.execute(f"DELETE FROM {table_name} WHERE RollupKey IN ({placeholders})", keys)
+                metrics.count("db_round_trips")
+
+        rows_inserted = _insert_batches(
+            conn, cursor, _build_insert_query(table_name, ROLLUP_INSERT_COLUMNS),
+            rows, batch_size, commit_every=0
+        )
+        conn.commit()
+        metrics.count("db_round_trips")
+
+        elapsed = time.perf_counter() - start
+        metrics.set_info(load_rollup_rows=rows_inserted)
+
+        log(f"\n Carga concluída!")
+        log(f"  Linhas inseridas: {rows_inserted:,}")
+        log(f"  Tempo: {elapsed:.2f}s")
+
+        cursor.close()
+        return_connection(conn)
+
+        return True
+
+    except Exception as e:
+        print(f"\nERRO na carga dos rollups:")
+        print(f"   Tipo: {type(e).__name__}")
+        print(f"   Mensagem: {e}")
+
+        if conn:
+            conn.rollback()
+            return_connection(conn, broken=True)
+
+        return False
+
+
 def validate_load(table_name="Analytics.ProductSalesMetrics"):
     """
     Valida os dados carregados na tabela.
@@ -133,11 +794,11 @@ def validate_load(table_name="Analytics.ProductSalesMetrics"):
         dict: Dicionário com estatísticas ou None se falhar
     """
     
-    print(f"\n{'='*60}")
-    print(f"VALIDANDO DADOS CARREGADOS")
-    print(f"{'='*60}")
+    log(f"\n{'='*60}")
+    log(f"VALIDANDO DADOS CARREGADOS")
+    log(f"{'='*60}")
     
-    conn = get_connection()
+    conn = borrow_connection()
     
     if not conn:
         return None
@@ -158,6 +819,7 @@ def validate_load(table_name="Analytics.ProductSalesMetrics"):
         """)
         
         result = cursor.fetchone()
+        get_metrics().count("db_round_trips")
         
         stats = {
             'total_rows': result[0],
@@ -169,15 +831,15 @@ def validate_load(table_name="Analytics.ProductSalesMetrics"):
             'processed_at': result[6]
         }
         
-        print(f"\n ESTATÍSTICAS DA TABELA:")
-        print(f"   Total de Produtos: {stats['total_rows']:,}")
-        print(f"    Total de Vendas: ${stats['total_sales']:,.2f}")
-        print(f"    Total Quantidade: {stats['total_qty']:,}")
-        print(f"\n Classificação:")
-        print(f"   • Classe A: {stats['class_a']:,} produtos")
-        print(f"   • Classe B: {stats['class_b']:,} produtos")
-        print(f"   • Classe C: {stats['class_c']:,} produtos")
-        print(f"\n Processado em: {stats['processed_at']}")
+        log(f"\n ESTATÍSTICAS DA TABELA:")
+        log(f"   Total de Produtos: {stats['total_rows']:,}")
+        log(f"    Total de Vendas: ${stats['total_sales']:,.2f}")
+        log(f"    Total Quantidade: {stats['total_qty']:,}")
+        log(f"\n Classificação:")
+        log(f"   • Classe A: {stats['class_a']:,} produtos")
+        log(f"   • Classe B: {stats['class_b']:,} produtos")
+        log(f"   • Classe C: {stats['class_c']:,} produtos")
+        log(f"\n Processado em: {stats['processed_at']}")
         
         cursor.execute(f"""
             SELECT TOP 5 
@@ -188,16 +850,16 @@ def validate_load(table_name="Analytics.ProductSalesMetrics"):
             ORDER BY TotalSales DESC
         """)
         
-        print(f"\n🏆 TOP 5 PRODUTOS:")
+        log(f"\n🏆 TOP 5 PRODUTOS:")
         for row in cursor.fetchall():
-            print(f"   • {row[0]}: ${row[1]:,.2f} (Classe {row[2]})")
+            log(f"   • {row[0]}: ${row[1]:,.2f} (Classe {row[2]})")
         
         cursor.close()
-        conn.close()
+        return_connection(conn)
         
-        print(f"\n{'='*60}")
-        print(f" VALIDAÇÃO COMPLETA!")
-        print(f"{'='*60}")
+        log(f"\n{'='*60}")
+        log(f" VALIDAÇÃO COMPLETA!")
+        log(f"{'='*60}")
         
         return stats
         
@@ -206,6 +868,6 @@ def validate_load(table_name="Analytics.ProductSalesMetrics"):
         print(f"   {e}")
         
         if conn:
-            conn.close()
+            return_connection(conn, broken=True)
         
         return None
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+Instrumentação do ETL: tempos, contadores e relatório da execução.
+
+Responsabilidade:
+- Medir cada etapa (extract, cada STEP do transform, cada lote do load)
+- Contar linhas de entrada/saída, bytes, memória e idas ao banco
+- Gravar tudo num relatório JSON por execução
+- Controlar o volume de log por nível de verbosidade
+
+Níveis de verbosidade:
+    0 - silencioso (só erros)
+    1 - normal (banners e progresso)
+    2 - diagnóstico (prévia dos dados, memory_usage(deep=True))
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+REPORT_DIR = ".etl_reports"
+
+VERBOSITY = 1
+
+
+def set_verbosity(level):
+    """Define o nível de log (0, 1 ou 2)."""
+    global VERBOSITY
+    VERBOSITY = level
+
+
+def get_verbosity():
+    """Nível de log atual (ex.: para repassar a um processo filho)."""
+    return VERBOSITY
+
+
+def is_verbose(level):
+    """True se mensagens do nível informado devem aparecer."""
+    return VERBOSITY >= level
+
+
+def log(*args, level=1):
+    """print() que respeita o nível de verbosidade."""
+    if VERBOSITY >= level:
+        print(*args)
+
+
+def _proc_status_kb(field):
+    """Campo em kB do /proc/self/status (Linux) ou None."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """
+    Pico de memória residente do processo em MB (None se indisponível).
+
+    É o pico desde o início do processo (ou desde o último reset_peak_rss):
+    não serve para comparar etapas que rodaram no mesmo processo.
+    """
+    peak_kb = _proc_status_kb("VmHWM")
+    if peak_kb is not None:
+        return peak_kb / 1024
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    if sys.platform == "darwin":
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+def current_rss_mb():
+    """Memória residente atual do processo em MB (None se indisponível)."""
+    rss_kb = _proc_status_kb("VmRSS")
+    return None if rss_kb is None else rss_kb / 1024
+
+
+def reset_peak_rss():
+    """
+    Zera o pico de memória do processo (Linux 4.0+, /proc/self/clear_refs).
+
+    Só faz sentido quando uma etapa roda sozinha no processo (ex.: cada
+    estágio do benchmark); com etapas simultâneas, uma zera o pico da outra.
+
+    Returns:
+        bool: True se o pico foi zerado
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageTimer:
+    """
+    Medição de uma etapa em andamento.
+
+    Uso sem indentar o código medido:
+        timer = metrics.start_stage("transform", "STEP 2")
+        ...
+        timer.finish(rows_in=..., rows_out=...)
+    """
+
+    def __init__(self, run, stage, step=None, **fields):
+        self._run = run
+        self._start = time.perf_counter()
+        self._round_trips_start = run.counters.get("db_round_trips", 0)
+        self._rss_start = current_rss_mb()
+        self.record = {"stage": stage, "step": step, **fields}
+        self.finished = False
+
+    def finish(self, **fields):
+        """Fecha a medição e registra a etapa (chamadas repetidas são ignoradas)."""
+        if self.finished:
+            return self.record
+        self.finished = True
+
+        self.record.update(fields)
+        self.record["seconds"] = round(time.perf_counter() - self._start, 6)
+        # Por que a variação e não o pico? O pico (ru_maxrss/VmHWM) é do processo
+        # inteiro: depois da etapa mais pesada, todas repetiriam o mesmo valor
+        rss = current_rss_mb()
+        self.record["rss_mb"] = rss
+        self.record["rss_delta_mb"] = (
+            None if rss is None or self._rss_start is None else round(rss - self._rss_start, 3)
+        )
+        self.record["process_peak_rss_mb"] = peak_rss_mb()
+        # Em execuções paralelas a diferença inclui as outras threads
+        self.record["db_round_trips"] = (
+            self._run.counters.get("db_round_trips", 0) - self._round_trips_start
+        )
+        self._run._add(self.record)
+        return self.record
+
+
+class RunMetrics:
+    """Métricas de uma execução do ETL."""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.started_at = datetime.now()
+        self.stages = []
+        self.counters = {}
+        self.info = {}
+        self._lock = threading.Lock()
+
+    def _add(self, record):
+        with self._lock:
+            self.stages.append(record)
+
+    def start_stage(self, stage, step=None, **fields):
+        return StageTimer(self, stage, step, **fields)
+
+    @contextmanager
+    def stage(self, stage, step=None, **fields):
+        """
+        Context manager de uma etapa; o registro pode ser completado no bloco:
+
+            with metrics.stage("load", "lote 3") as record:
+                ...
+                record["rows_out"] = 1000
+        """
+        timer = StageTimer(self, stage, step, **fields)
+        try:
+            yield timer.record
+        except Exception as e:
+            timer.finish(error=f"{type(e).__name__}: {e}")
+            raise
+        else:
+            timer.finish()
+
+    def count(self, name, n=1):
+        """Incrementa um contador da execução (ex.: db_round_trips)."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_info(self, **values):
+        """Guarda valores soltos no relatório (ex.: tamanhos de lote escolhidos)."""
+        with self._lock:
+            self.info.update(values)
+
+    def summary(self):
+        """Tempo total por estágio (extract, transform, load...)."""
+        totals = {}
+        with self._lock:
+            for record in self.stages:
+                totals[record["stage"]] = totals.get(record["stage"], 0.0) + record["seconds"]
+        return totals
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "started_at": self.started_at.isoformat(),
+                "finished_at": datetime.now().isoformat(),
+                "process_peak_rss_mb": peak_rss_mb(),
+                "counters": dict(self.counters),
+                "info": dict(self.info),
+                "stages": list(self.stages),
+            }
+
+    def write_report(self, path=None):
+        """
+        Grava o relatório JSON da execução.
+
+        Args:
+            path (str): Caminho do arquivo; padrão .etl_reports/run_<run_id>.json
+
+        Returns:
+            str: Caminho gravado
+        """
+        if path is None:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            path = os.path.join(REPORT_DIR, f"run_{self.run_id}.json")
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+        log(f"\n Relatório da execução: {path}")
+        return path
+
+    def print_summary(self):
+        log(f"\n TEMPO POR ESTÁGIO:")
+        for stage, seconds in self.summary().items():
+            log(f"   - {stage}: {seconds:.2f}s")
+        log(f"   Idas ao banco: {self.counters.get('db_round_trips', 0):,}")
+        peak = peak_rss_mb()
+        if peak is not None:
+            log(f"   Pico de memória do processo: {peak:,.0f} MB")
+
+
+# ============================================================
+# MÉTRICAS DA EXECUÇÃO ATUAL
+# ============================================================
+
+_current = RunMetrics()
+
+
+def get_metrics():
+    """Retorna as métricas da execução atual."""
+    return _current
+
+
+def start_run(run_id=None):
+    """Começa uma execução nova (zera tempos e contadores)."""
+    global _current
+    _current = RunMetrics(run_id)
+    return _current
@@ -0,0 +1,387 @@
+"""
+Armazenamento local das linhas de venda particionado por mês do pedido.
+
+Responsabilidade:
+- Guardar as linhas de venda já com OrderDate (detalhe + data do header)
+  em arquivos Parquet, uma pasta por mês (order_month=AAAA-MM)
+- Manter num manifesto o mínimo/máximo de OrderDate de cada arquivo
+- Ler uma janela (ex.: os últimos 2 anos) abrindo só os arquivos cujo
+  intervalo encosta na janela (partition pruning)
+- Acrescentar meses novos (ou linhas atrasadas de meses antigos) em
+  arquivos novos, sem reescrever os que já existem
+- Guardar linhas alteradas na origem (reextraídas pelo ModifiedDate) como
+  correção: a versão nova vai para um arquivo novo e a antiga fica marcada
+  no manifesto como substituída
+
+Por que?
+- O STEP 4 do transform_data filtra OrderDate >= corte depois de extrair
+  e juntar o histórico inteiro: a maior parte do trabalho é descartada
+- Aqui a leitura da janela custa o tamanho da janela, não o do histórico
+
+Layout:
+    .etl_store/sales/manifest.json
+    .etl_store/sales/order_month=2013-06/part-00001.parquet
+"""
+
+import json
+import os
+
+import pandas as pd
+from src.metrics import get_metrics, log
+from src.transform import YEARS_TO_ANALYZE
+
+
+STORE_DIR = os.path.join(".etl_store", "sales")
+MANIFEST_FILE = "manifest.json"
+PARTITION_PREFIX = "order_month="
+
+# Chave das linhas de venda: decide o que já está no store e a ordem de leitura
+KEY_COLUMN = "SalesOrderDetailID"
+
+
+class SalesPartitionStore:
+    """
+    Linhas de venda particionadas por mês do pedido.
+
+    Uso:
+        store = SalesPartitionStore()
+        store.append_extract(extract_all())        # ou o delta do extract_incremental
+        data = store.window_data(products, years=2)
+        products_metrics = transform_data(data)
+    """
+
+    def __init__(self, root=STORE_DIR):
+        """
+        Args:
+            root (str): Pasta do store (criada no primeiro append)
+        """
+        self.root = root
+        self.manifest = self._read_manifest()
+
+    # ---------------- manifesto ----------------
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def _read_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {"columns": None, "last_detail_id": None, "next_file": 1,
+                    "partitions": {}, "superseded": {}}
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest.setdefault("superseded", {})
+        return manifest
+
+    def _write_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._manifest_path()
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def partitions(self):
+        """mês (AAAA-MM) -> {"files": [...], "rows", "min_order_date", "max_order_date"}"""
+        return self.manifest["partitions"]
+
+    @property
+    def superseded(self):
+        """arquivo -> SalesOrderDetailIDs cuja versão nesse arquivo foi corrigida depois"""
+        return self.manifest["superseded"]
+
+    @property
+    def num_rows(self):
+        """Linhas atuais (sem as versões substituídas por correções)."""
+        stored = sum(partition["rows"] for partition in self.partitions.values())
+        return stored - sum(len(keys) for keys in self.superseded.values())
+
+    def max_order_date(self):
+        """Maior OrderDate guardada (None se vazio)."""
+        if not self.partitions:
+            return None
+        return max(pd.Timestamp(p["max_order_date"]) for p in self.partitions.values())
+
+    # ---------------- escrita ----------------
+
+    def append(self, lines):
+        """
+        Acrescenta linhas de venda (precisam ter OrderDate).
+
+        Linhas com SalesOrderDetailID já guardado e os mesmos valores são
+        ignoradas, então acrescentar o mesmo extract duas vezes não duplica
+        nada. Se algum valor mudou (linha alterada na origem e reextraída
+        pelo ModifiedDate), a linha entra como correção e a versão guardada
+        passa a ser ignorada na leitura.
+        Cada mês recebe um arquivo novo; os arquivos existentes não mudam.
+
+        Args:
+            lines (pd.DataFrame): Detalhe com OrderDate (ver append_extract)
+
+        Returns:
+            int: Linhas acrescentadas (novas + corrigidas)
+        """
+        if "OrderDate" not in lines.columns:
+            raise ValueError("as linhas precisam da coluna OrderDate")
+
+        columns = list(lines.columns)
+        if self.manifest["columns"] is None:
+            self.manifest["columns"] = columns
+        elif set(columns) != set(self.manifest["columns"]):
+            raise ValueError(
+                f"colunas diferentes das já guardadas: {sorted(set(columns) ^ set(self.manifest['columns']))}"
+            )
+        lines = lines[self.manifest["columns"]]
+
+        last_id = self.manifest["last_detail_id"]
+        replaced = {}
+        if KEY_COLUMN in lines.columns:
+            # Dentro do mesmo lote vale a última versão de cada linha
+            lines = lines.drop_duplicates(KEY_COLUMN, keep="last")
+            if last_id is not None:
+                # Acima do último ID guardado só há linhas novas; abaixo, a
+                # linha pode já existir (igual ou alterada) ou ter chegado atrasada
+                known = lines[KEY_COLUMN] <= last_id
+                if known.any():
+                    changed, replaced = self._changed_rows(lines[known])
+                    lines = pd.concat([lines[~known], changed])
+
+        if lines.empty:
+            log(f" Store: nenhuma linha nova")
+            return 0
+
+        with get_metrics().stage("store", "append") as record:
+            months = lines["OrderDate"].dt.strftime("%Y-%m")
+            for month, part in lines.groupby(months, sort=True):
+                self._write_file(month, part)
+
+            if KEY_COLUMN in lines.columns:
+                new_last = int(lines[KEY_COLUMN].max())
+                self.manifest["last_detail_id"] = new_last if last_id is None else max(last_id, new_last)
+
+            # As versões antigas só são marcadas depois das novas gravadas
+            for name, keys in replaced.items():
+                self.superseded.setdefault(name, []).extend(keys)
+
+            # O manifesto só muda depois de todos os arquivos gravados:
+            # um append interrompido deixa arquivos órfãos, nunca pela metade
+            self._write_manifest()
+            updated = sum(len(keys) for keys in replaced.values())
+            record["rows_in"] = len(lines)
+            record["rows_updated"] = updated
+            record["partitions"] = int(months.nunique())
+
+        log(f" Store: {len(lines):,} linhas em {months.nunique()} meses"
+            + (f" ({updated:,} correções)" if updated else ""))
+        return len(lines)
+
+    def _changed_rows(self, candidates):
+        """
+        Separa, entre linhas cujo ID já pode estar guardado, as que são novas
+        ou mudaram.
+
+        Só abre os arquivos cujo intervalo de SalesOrderDetailID encosta no
+        dos candidatos; desses, lê primeiro só a chave e o arquivo inteiro
+        apenas se algum candidato estiver nele.
+
+        Args:
+            candidates (pd.DataFrame): Linhas com SalesOrderDetailID <= last_detail_id
+
+        Returns:
+            tuple: (linhas novas ou alteradas, {arquivo: [IDs substituídos]})
+        """
+        keys = candidates[KEY_COLUMN]
+        low, high = int(keys.min()), int(keys.max())
+        wanted = set(keys.tolist())
+
+        stored = []
+        for month in sorted(self.partitions):
+            for entry in self.partitions[month]["files"]:
+                # Manifestos antigos não têm o intervalo de IDs: lê o arquivo
+                if entry.get("max_key", high) < low or entry.get("min_key", low) > high:
+                    continue
+                path = os.path.join(self.root, PARTITION_PREFIX + month, entry["name"])
+                file_keys = pd.read_parquet(path, columns=[KEY_COLUMN])[KEY_COLUMN]
+                dead = self.superseded.get(entry["name"], [])
+                if not (file_keys.isin(wanted) & ~file_keys.isin(dead)).any():
+                    continue
+                rows = pd.read_parquet(path)
+                rows = rows[rows[KEY_COLUMN].isin(wanted) & ~rows[KEY_COLUMN].isin(dead)]
+                stored.append(rows.assign(_file=entry["name"]))
+
+        if not stored:
+            return candidates, {}
+
+        stored = pd.concat(stored).drop_duplicates(KEY_COLUMN, keep="last").set_index(KEY_COLUMN)
+        current = stored.reindex(keys.to_numpy())
+        new_values = candidates.set_index(KEY_COLUMN)
+
+        exists = current["_file"].notna().to_numpy()
+        same = exists.copy()
+        for col in new_values.columns:
+            old, new = current[col], new_values[col]
+            same &= ((old == new) | (old.isna() & new.isna())).to_numpy()
+
+        replaced = {}
+        for name, key in zip(current["_file"][exists & ~same], keys[exists & ~same]):
+            replaced.setdefault(name, []).append(int(key))
+        return candidates[~same], replaced
+
+    def _write_file(self, month, part):
+        directory = os.path.join(self.root, PARTITION_PREFIX + month)
+        os.makedirs(directory, exist_ok=True)
+
+        name = f"part-{self.manifest['next_file']:05d}.parquet"
+        self.manifest["next_file"] += 1
+        path = os.path.join(directory, name)
+        part.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+        min_date, max_date = part["OrderDate"].min(), part["OrderDate"].max()
+        partition = self.partitions.setdefault(month, {
+            "files": [], "rows": 0,
+            "min_order_date": min_date.isoformat(), "max_order_date": max_date.isoformat(),
+        })
+        entry = {
+            "name": name, "rows": len(part),
+            "min_order_date": min_date.isoformat(), "max_order_date": max_date.isoformat(),
+        }
+        if KEY_COLUMN in part.columns:
+            entry["min_key"] = int(part[KEY_COLUMN].min())
+            entry["max_key"] = int(part[KEY_COLUMN].max())
+        partition["files"].append(entry)
+        partition["rows"] += len(part)
+        partition["min_order_date"] = min(pd.Timestamp(partition["min_order_date"]), min_date).isoformat()
+        partition["max_order_date"] = max(pd.Timestamp(partition["max_order_date"]), max_date).isoformat()
+
+    def append_extract(self, data):
+        """
+        Acrescenta a saída do extract_all / extract_incremental: junta a
+        OrderDate do header no detalhe (mesmo INNER JOIN do STEP 2).
+
+        Returns:
+            int: Linhas acrescentadas
+        """
+        header = data["sales_header"][["SalesOrderID", "OrderDate"]]
+        lines = pd.merge(data["sales_detail"], header, on="SalesOrderID", how="inner")
+        return self.append(lines)
+
+    # ---------------- leitura ----------------
+
+    def files_for(self, start=None, end=None):
+        """
+        Arquivos cujo intervalo de OrderDate encosta em [start, end].
+
+        Returns:
+            list: Caminhos dos arquivos, em ordem de mês
+        """
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+
+        paths = []
+        for month in sorted(self.partitions):
+            partition = self.partitions[month]
+            if start is not None and pd.Timestamp(partition["max_order_date"]) < start:
+                continue
+            if end is not None and pd.Timestamp(partition["min_order_date"]) > end:
+                continue
+            for entry in partition["files"]:
+                if start is not None and pd.Timestamp(entry["max_order_date"]) < start:
+                    continue
+                if end is not None and pd.Timestamp(entry["min_order_date"]) > end:
+                    continue
+                paths.append(os.path.join(self.root, PARTITION_PREFIX + month, entry["name"]))
+        return paths
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Lê as linhas com start <= OrderDate <= end, abrindo só os arquivos
+        que podem ter essas datas.
+
+        Args:
+            start, end (datetime): Limites (None = sem limite)
+            columns (list): Colunas a ler (padrão: todas)
+
+        Returns:
+            pd.DataFrame: Linhas na ordem de SalesOrderDetailID (a ordem da
+                extração), para as somas saírem iguais às do caminho completo
+        """
+        if self.manifest["columns"] is None:
+            raise ValueError(f"store vazio em {self.root}")
+
+        with get_metrics().stage("store", "leitura") as record:
+            paths = self.files_for(start, end)
+            total_files = sum(len(p["files"]) for p in self.partitions.values())
+            read_columns = columns
+            if columns is not None:
+                read_columns = list(dict.fromkeys(list(columns) + ["OrderDate"]
+                                                  + ([KEY_COLUMN] if KEY_COLUMN in self.manifest["columns"] else [])))
+
+            if paths:
+                lines = pd.concat([self._read_file(path, read_columns) for path in paths],
+                                  ignore_index=True)
+            else:
+                lines = pd.read_parquet(self._any_file(), columns=read_columns).iloc[0:0]
+
+            # Os meses das pontas podem ter linhas fora do intervalo
+            if start is not None:
+                lines = lines[lines["OrderDate"] >= pd.Timestamp(start)]
+            if end is not None:
+                lines = lines[lines["OrderDate"] <= pd.Timestamp(end)]
+
+            if KEY_COLUMN in lines.columns and not lines[KEY_COLUMN].is_monotonic_increasing:
+                lines = lines.sort_values(KEY_COLUMN, kind="stable")
+            lines = lines.reset_index(drop=True)
+            if columns is not None:
+                lines = lines[list(columns)]
+
+            record["rows_out"] = len(lines)
+            record["files_read"] = len(paths)
+            record["files_pruned"] = total_files - len(paths)
+
+        log(f" Store: {len(paths)} de {total_files} arquivos lidos, {len(lines):,} linhas")
+        return lines
+
+    def _read_file(self, path, columns):
+        """Um arquivo do store sem as linhas que correções posteriores substituíram."""
+        part = pd.read_parquet(path, columns=columns)
+        dead = self.superseded.get(os.path.basename(path))
+        if dead:
+            part = part[~part[KEY_COLUMN].isin(dead)]
+        return part
+
+    def _any_file(self):
+        month = min(self.partitions)
+        return os.path.join(self.root, PARTITION_PREFIX + month, self.partitions[month]["files"][0]["name"])
+
+    def read_window(self, years=YEARS_TO_ANALYZE, columns=None):
+        """
+        Linhas da janela do STEP 4: OrderDate >= data mais recente - years.
+        """
+        max_date = self.max_order_date()
+        if max_date is None:
+            raise ValueError(f"store vazio em {self.root}")
+        cutoff = max_date - pd.DateOffset(years=years)
+        log(f" Store: janela de {years} anos a partir de {cutoff}")
+        return self.read(start=cutoff, columns=columns)
+
+    def window_data(self, products, years=YEARS_TO_ANALYZE):
+        """
+        Entrada do transform_data com só as vendas da janela.
+
+        O STEP 4 do transform_data calcula o mesmo corte (a data mais
+        recente continua na janela) e não descarta nada.
+
+        Args:
+            products (pd.DataFrame | ProductDimension): Production.Product
+
+        Returns:
+            dict: {"sales_detail", "sales_header", "products"}
+        """
+        lines = self.read_window(years)
+        header = lines[["SalesOrderID", "OrderDate"]].drop_duplicates("SalesOrderID")
+        return {
+            "sales_detail": lines.drop(columns="OrderDate"),
+            "sales_header": header.reset_index(drop=True),
+            "products": products,
+        }
@@ -0,0 +1,413 @@
+"""
+Execução em pipeline do ETL (extract, transform e load sobrepostos).
+
+Responsabilidade:
+- Ligar os estágios por filas limitadas em vez de guardar cada resultado
+  intermediário inteiro em memória
+- Agregar cada chunk de Sales.SalesOrderDetail assim que ele chega
+  (parciais por produto/dia do ProductAggregateState), somando tudo no
+  estado uma vez só no fim da extração
+- Extrair header e produtos ao mesmo tempo que o detalhe
+- Carregar assim que a classificação final fica pronta
+- Mostrar quanto tempo cada estágio trabalhou, esperou e ficou bloqueado
+
+Fluxo:
+
+    [extract detalhe] --fila(queue_depth)--> [agregação] --\\
+    [extract header]  ------------------------^             +--> [classificação] --> [load]
+    [extract produtos] ------------------------------------/
+
+Memória: no máximo queue_depth chunks na fila + 1 em cada ponta, mais o
+estado de parciais (uma linha por produto/dia), em vez da tabela inteira.
+"""
+
+import queue
+import threading
+import time
+
+import pandas as pd
+from src.aggregate_state import ProductAggregateState
+from src.dimension import get_product_dimension
+from src.extract import DEFAULT_CHUNK_SIZE, SCHEMAS, SOURCES, _source_query, extract_data
+from src.lineage import build_queries
+from src.load import load_data
+from src.metrics import get_metrics, log
+from src.transform import (
+    YEARS_TO_ANALYZE,
+    add_derived_metrics,
+    classify_performance,
+    finalize_metrics,
+)
+
+
+# Chunks de detalhe esperando a agregação.
+# Por que 4? O extrator fica até 4 chunks à frente para absorver variações
+# de rede; acima disso só aumenta a memória.
+DEFAULT_QUEUE_DEPTH = 4
+
+# Colunas pedidas além das declaradas pelo transform:
+# o estado de agregação guarda o último SalesOrderDetailID visto
+PIPELINE_COLUMNS = {"sales_detail": ["SalesOrderDetailID"]}
+
+# Intervalo para checar se outro estágio falhou enquanto espera a fila
+POLL_SECONDS = 0.5
+
+_DONE = object()
+
+
+class PipelineError(Exception):
+    """Falha em um dos estágios do pipeline."""
+
+
+class StageStats:
+    """
+    Tempo de um estágio dividido em trabalho e espera.
+
+    - busy: processando (rede do fetchmany, pandas, INSERT)
+    - starved: esperando entrada (fila vazia ou dependência não pronta)
+    - blocked: esperando a fila de saída liberar espaço (backpressure)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+        self.finished = None
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.items = 0
+        self.rows = 0
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def wall(self):
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def utilization(self):
+        return self.busy / self.wall if self.wall > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "wall_seconds": round(self.wall, 4),
+            "busy_seconds": round(self.busy, 4),
+            "starved_seconds": round(self.starved, 4),
+            "blocked_seconds": round(self.blocked, 4),
+            "utilization": round(self.utilization, 4),
+            "items": self.items,
+            "rows": self.rows,
+        }
+
+
+class StreamingPipeline:
+    """
+    Uma execução do ETL em pipeline.
+
+    Uso:
+        pipeline = StreamingPipeline(chunksize=50_000, load_options={"strategy": "merge"})
+        result = pipeline.run()
+        pipeline.print_utilization()
+    """
+
+    def __init__(self, chunksize=DEFAULT_CHUNK_SIZE, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 years=YEARS_TO_ANALYZE, load=True, load_options=None,
+                 prune=True, push_cutoff=True):
+        """
+        Args:
+            chunksize (int): Linhas por chunk de Sales.SalesOrderDetail
+            queue_depth (int): Máximo de chunks esperando a agregação
+            years (int): Janela de anos analisada
+            load (bool): Se False, para depois da classificação
+            load_options (dict): Argumentos extras do load_data (strategy, batch_size...)
+            prune (bool): Extrai só as colunas declaradas (ver src.lineage)
+            push_cutoff (bool): Com prune, filtra a janela de datas no banco
+        """
+        self.chunksize = chunksize
+        self.queue_depth = queue_depth
+        self.years = years
+        self.load = load
+        self.load_options = load_options or {}
+        self.prune = prune
+        self.push_cutoff = push_cutoff
+        self._queries = None
+
+        self.stats = {
+            name: StageStats(name)
+            for name in ("extract_detail", "extract_header", "extract_products",
+                         "aggregate", "classify", "load")
+        }
+        self._chunks = queue.Queue(maxsize=queue_depth)
+        self._header_ready = threading.Event()
+        self._stop = threading.Event()
+        self._errors = []
+        self._results = {}
+
+    # ---------------- controle ----------------
+
+    def _fail(self, stage, error):
+        self._errors.append((stage, error))
+        self._stop.set()
+
+    def _put(self, item, stats):
+        """put() na fila de chunks que desiste se outro estágio falhou."""
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._chunks.put(item, timeout=POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stats.blocked += time.perf_counter() - start
+
+    def _get(self, stats):
+        """get() na fila de chunks; None se outro estágio falhou."""
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    return self._chunks.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    continue
+            return None
+        finally:
+            stats.starved += time.perf_counter() - start
+
+    # ---------------- estágios ----------------
+
+    def _extract_detail(self):
+        stats = self.stats["extract_detail"]
+        stats.start()
+        try:
+            query, params = _source_query("sales_detail", self._queries)
+            chunks = extract_data(query, SOURCES["sales_detail"][1], self.chunksize,
+                                  params, SCHEMAS["sales_detail"])
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                stats.busy += time.perf_counter() - start
+                if chunk is None:
+                    break
+
+                stats.items += 1
+                stats.rows += len(chunk)
+                if not self._put(chunk, stats):
+                    chunks.close()
+                    return
+            self._put(_DONE, stats)
+        except Exception as e:
+            self._fail("extract_detail", e)
+        finally:
+            stats.finish()
+
+    def _extract_dimension(self, name, source):
+        stats = self.stats[f"extract_{name}"]
+        stats.start()
+        try:
+            start = time.perf_counter()
+            if source == "products":
+                # Dimensão em cache no processo: só reextrai se a tabela mudou
+                data = get_product_dimension()
+            else:
+                query, params = _source_query(source, self._queries)
+                data = extract_data(query, SOURCES[source][1], params=params,
+                                    schema=SCHEMAS[source])
+            stats.busy += time.perf_counter() - start
+            if data is None:
+                raise PipelineError(f"extração de {name} falhou")
+            stats.items = 1
+            stats.rows = len(data)
+            self._results[name] = data
+        except Exception as e:
+            self._fail(f"extract_{name}", e)
+        finally:
+            if name == "header":
+                self._header_ready.set()
+            stats.finish()
+
+    def _aggregate(self, state):
+        stats = self.stats["aggregate"]
+        stats.start()
+        try:
+            # A agregação por dia precisa do OrderDate: espera o header,
+            # enquanto isso os chunks se acumulam na fila (até queue_depth)
+            start = time.perf_counter()
+            self._header_ready.wait()
+            stats.starved += time.perf_counter() - start
+            if self._stop.is_set():
+                return
+            header = self._results["header"][["SalesOrderID", "OrderDate"]]
+
+            # Por que guardar os parciais e somar no fim?
+            # - Cada fold_partials vira partes novas no estado e reagrupa por
+            #   produto: por chunk, o estado ficaria picado em partes pequenas
+            # - Os parciais de um chunk são bem menores que o chunk (uma linha
+            #   por produto/dia), então guardar todos custa pouco
+            partials = []
+            while True:
+                chunk = self._get(stats)
+                if chunk is None:
+                    return
+                if chunk is _DONE:
+                    break
+
+                start = time.perf_counter()
+                # Mesmo INNER JOIN do STEP 2, só com a coluna necessária
+                lines = pd.merge(chunk, header, on="SalesOrderID", how="inner")
+                partials.append(state.partial_aggregate(lines))
+                if len(chunk):
+                    last_id = int(chunk["SalesOrderDetailID"].max())
+                    if state.last_detail_id is None or last_id > state.last_detail_id:
+                        state.last_detail_id = last_id
+                stats.busy += time.perf_counter() - start
+                stats.items += 1
+                stats.rows += len(chunk)
+
+            start = time.perf_counter()
+            if partials:
+                state.fold_partials(state.combine_partials(partials))
+            stats.busy += time.perf_counter() - start
+        except Exception as e:
+            self._fail("aggregate", e)
+        finally:
+            stats.finish()
+
+    # ---------------- execução ----------------
+
+    def run(self):
+        """
+        Executa o pipeline.
+
+        Returns:
+            pd.DataFrame: Métricas por produto (mesmo formato do transform_data)
+                ou None se algum estágio falhar
+        """
+        log(f"\n{'='*60}")
+        log(f" INICIANDO ETL EM PIPELINE")
+        log(f"{'='*60}")
+        log(f"   Chunk: {self.chunksize:,} linhas | Fila: {self.queue_depth} chunks")
+
+        metrics = get_metrics()
+        wall_start = time.perf_counter()
+        state = ProductAggregateState(self.years)
+
+        if self.prune:
+            log("Projeção pela linhagem de colunas:")
+            cutoff_years = self.years if self.push_cutoff else None
+            self._queries = build_queries(cutoff_years, extra=PIPELINE_COLUMNS)
+
+        threads = [
+            threading.Thread(target=self._extract_detail, name="extract_detail"),
+            threading.Thread(target=self._extract_dimension, name="extract_header",
+                             args=("header", "sales_header")),
+            threading.Thread(target=self._extract_dimension, name="extract_products",
+                             args=("products", "products")),
+            threading.Thread(target=self._aggregate, name="aggregate", args=(state,)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            return self._abort(wall_start)
+
+        if self.stats["extract_detail"].rows == 0:
+            self._fail("extract_detail", PipelineError("nenhuma linha de venda extraída"))
+            return self._abort(wall_start)
+
+        # Classificação: precisa de todos os parciais (ranking ABC é global)
+        stats = self.stats["classify"]
+        stats.start()
+        with metrics.stage("transform", "pipeline: classificação"):
+            state.expire()
+            products_metrics = state.to_metrics(self._results["products"])
+            products_metrics = add_derived_metrics(products_metrics)
+            products_metrics = classify_performance(products_metrics)
+            products_metrics = finalize_metrics(products_metrics)
+        stats.busy = stats.wall
+        stats.items = 1
+        stats.rows = len(products_metrics)
+        stats.finish()
+
+        if self.load:
+            stats = self.stats["load"]
+            stats.start()
+            success = load_data(products_metrics, **self.load_options)
+            stats.busy = stats.wall
+            stats.items = 1
+            stats.rows = len(products_metrics)
+            stats.finish()
+            if not success:
+                self._fail("load", PipelineError("carga falhou"))
+                return self._abort(wall_start)
+
+        self.wall_seconds = time.perf_counter() - wall_start
+        metrics.set_info(pipeline=self.utilization())
+
+        log(f"\n{'='*60}")
+        log(f" PIPELINE CONCLUÍDO em {self.wall_seconds:.2f}s")
+        log(f"{'='*60}")
+
+        return products_metrics
+
+    def _abort(self, wall_start):
+        self.wall_seconds = time.perf_counter() - wall_start
+        get_metrics().set_info(pipeline=self.utilization())
+        for stage, error in self._errors:
+            print(f"\n ERRO no estágio {stage}:")
+            print(f"   Tipo: {type(error).__name__}")
+            print(f"   Mensagem: {error}")
+        return None
+
+    # ---------------- relatório ----------------
+
+    def utilization(self):
+        """Tempos de cada estágio (ver StageStats.to_dict)."""
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def print_utilization(self):
+        log(f"\n UTILIZAÇÃO POR ESTÁGIO:")
+        log(f"   {'estágio':<18} {'parede':>8} {'ocupado':>8} {'sem entrada':>12} "
+            f"{'bloqueado':>10} {'uso':>6} {'linhas':>12}")
+        for name, stats in self.stats.items():
+            if stats.started is None:
+                continue
+            log(f"   {name:<18} {stats.wall:>7.2f}s {stats.busy:>7.2f}s {stats.starved:>11.2f}s "
+                f"{stats.blocked:>9.2f}s {stats.utilization:>6.0%} {stats.rows:>12,}")
+        # Soma dos tempos ocupados maior que a parede = estágios sobrepostos
+        busy_total = sum(stats.busy for stats in self.stats.values())
+        if getattr(self, "wall_seconds", 0) > 0:
+            log(f"   Sobreposição: {busy_total / self.wall_seconds:.2f}x "
+                f"({busy_total:.2f}s de trabalho em {self.wall_seconds:.2f}s)")
+
+
+def run_pipeline(chunksize=DEFAULT_CHUNK_SIZE, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 years=YEARS_TO_ANALYZE, load=True, **load_options):
+    """
+    Atalho: executa o StreamingPipeline e mostra a utilização.
+
+    Args:
+        chunksize (int): Linhas por chunk de Sales.SalesOrderDetail
+        queue_depth (int): Máximo de chunks esperando a agregação
+        years (int): Janela de anos analisada
+        load (bool): Se False, para depois da classificação
+        **load_options: Repassados ao load_data (strategy, batch_size...)
+
+    Returns:
+        pd.DataFrame: Métricas por produto ou None se falhar
+    """
+    pipeline = StreamingPipeline(chunksize, queue_depth, years, load, load_options)
+    result = pipeline.run()
+    pipeline.print_utilization()
+    return result
@@ -0,0 +1,163 @@
+"""
+Modo pushdown da transformação.
+
+Responsabilidade:
+- Gerar uma única query com os STEPs 2 a 5 do transform_data
+  (JOINs, filtro de data e agregação por produto)
+- Executar essa query no SQL Server e trazer só uma linha por produto
+- Rodar localmente as métricas derivadas e a classificação ABC
+
+Por que?
+- O transform_data traz milhões de linhas só para reduzi-las a algumas
+  centenas; aqui o banco faz a redução e só o resultado cruza a rede.
+
+A query é T-SQL; com dialect="sqlite" ela roda também no banco SQLite do
+src.synthetic (só a data de corte muda), o que permite conferir o pushdown
+contra o transform_data sem um SQL Server.
+"""
+
+from src.extract import extract_data
+from src.metrics import log
+from src.transform import (
+    YEARS_TO_ANALYZE,
+    add_derived_metrics,
+    classify_performance,
+    finalize_metrics,
+)
+
+# Data de corte (MAX(OrderDate) menos N anos) em cada dialeto aceito
+CUTOFF_EXPRESSIONS = {
+    "mssql": "DATEADD(year, -{years}, MAX(OrderDate))",
+    "sqlite": "datetime(MAX(OrderDate), '-{years} years')",
+}
+
+# LastSaleDate com o mesmo dtype do OrderDate da extração (no SQLite a
+# data chega como texto)
+PUSHDOWN_SCHEMA = {
+    "ProductID": "int32",
+    "LastSaleDate": "datetime64[ns]",
+}
+
+
+def build_pushdown_query(years=YEARS_TO_ANALYZE, dialect="mssql"):
+    """
+    Monta a query equivalente aos STEPs 2-5 do transform_data.
+
+    Equivalências com o caminho pandas:
+    - INNER JOIN detail/header e LEFT JOIN produtos, como os pd.merge
+    - Data de corte = MAX(OrderDate) das vendas menos `years` anos
+      (DATEADD e pd.DateOffset tratam 29/02 da mesma forma)
+    - UnitPrice convertido para float antes do AVG: AVG de money
+      arredondaria para 4 casas e não bateria com o mean() do pandas
+    - MAX() nas colunas de produto faz o papel do 'first': há no máximo
+      um produto por ProductID
+    - ORDER BY ProductID reproduz a ordem do groupby
+
+    No SQLite a data de corte usa datetime(..., '-N years'), que leva 29/02
+    para 01/03 em vez de 28/02: só difere se a data máxima cair em 29/02.
+
+    Args:
+        years (int): Janela de anos analisada
+        dialect (str): "mssql" ou "sqlite" (ver CUTOFF_EXPRESSIONS)
+
+    Returns:
+        str: Query SQL
+
+    Raises:
+        ValueError: Se o dialeto não for suportado
+    """
+    if dialect not in CUTOFF_EXPRESSIONS:
+        raise ValueError(f"Dialeto desconhecido: {dialect}. Use um de {sorted(CUTOFF_EXPRESSIONS)}")
+    cutoff = CUTOFF_EXPRESSIONS[dialect].format(years=int(years))
+
+    return f"""
+    WITH sales AS (
+        SELECT
+            d.SalesOrderID,
+            d.ProductID,
+            d.OrderQty,
+            d.UnitPrice,
+            d.LineTotal,
+            h.OrderDate
+        FROM
+            Sales.SalesOrderDetail d
+            INNER JOIN Sales.SalesOrderHeader h
+                ON h.SalesOrderID = d.SalesOrderID
+    ),
+    cutoff AS (
+        SELECT {cutoff} AS CutoffDate
+        FROM sales
+    )
+    SELECT
+        s.ProductID,
+        SUM(s.LineTotal) AS TotalSales,
+        SUM(CAST(s.OrderQty AS int)) AS QtySold,
+        AVG(CAST(s.UnitPrice AS float)) AS AvgUnitPrice,
+        MAX(s.OrderDate) AS LastSaleDate,
+        MAX(p.Name) AS ProductName,
+        MAX(p.ListPrice) AS ListPrice,
+        MAX(p.StandardCost) AS StandardCost,
+        COUNT(s.SalesOrderID) AS NumOrders
+    FROM
+        sales s
+        CROSS JOIN cutoff c
+        LEFT JOIN Production.Product p
+            ON p.ProductID = s.ProductID
+    WHERE
+        s.OrderDate >= c.CutoffDate
+    GROUP BY
+        s.ProductID
+    ORDER BY
+        s.ProductID
+    """
+
+
+def transform_pushdown(years=YEARS_TO_ANALYZE, dialect="mssql"):
+    """
+    Executa a transformação com os STEPs 2-5 no servidor.
+
+    Não precisa do extract_all: a própria query lê as tabelas de origem.
+    O resultado tem as mesmas colunas e a mesma ordem do transform_data.
+
+    Args:
+        years (int): Janela de anos analisada
+        dialect (str): Dialeto do banco do pool (ver build_pushdown_query)
+
+    Returns:
+        pd.DataFrame: Métricas por produto ou None se falhar
+    """
+
+    log(f"\n" + "="*60)
+    log("  INICIANDO A TRANSFORMAÇÃO (PUSHDOWN NO SQL SERVER)")
+    log("="*60)
+
+    products_metrics = extract_data(
+        build_pushdown_query(years, dialect),
+        "Agregação por produto (pushdown)",
+        schema=PUSHDOWN_SCHEMA
+    )
+
+    if products_metrics is None:
+        log(" Falha na query de pushdown. Transformação abortada.", level=0)
+        return None
+
+    try:
+        log(f"\n STEPs 2-5 executados no servidor")
+        log(f"    Produtos únicos: {len(products_metrics):,}")
+
+        products_metrics = add_derived_metrics(products_metrics)
+        products_metrics = classify_performance(products_metrics)
+        products_metrics = finalize_metrics(products_metrics)
+
+        return products_metrics
+
+    except Exception as e:
+        print(f"\n ERRO na transformação:")
+        print(f"   Tipo: {type(e).__name__}")
+        print(f"   Mensagem: {e}")
+
+        import traceback
+        print(f"\n🔍 Traceback completo:")
+        traceback.print_exc()
+
+        return None
@@ -0,0 +1,271 @@
+"""
+Sketches de quantis para a classificação ABC (STEP 6).
+
+Responsabilidade:
+- KLLSketch: quantis aproximados com memória limitada, atualizável em
+  streaming e combinável (merge) entre chunks, partições ou execuções
+- ExactQuantiles: mesma interface guardando todos os valores; resultado
+  idêntico ao Series.quantile() do pandas (interpolação linear)
+
+Por que KLL?
+- Erro de rank garantido e configurável (k maior = erro menor)
+- O merge de dois sketches tem o mesmo erro de um sketch único
+- Memória O(k), independente de quantos valores passaram
+
+Referência do erro: Karnin, Lang e Liberty (2016); as constantes de
+rank_error() são as publicadas pelo Apache DataSketches (~99% de confiança).
+"""
+
+import math
+
+import numpy as np
+
+
+DEFAULT_K = 200
+
+# Erro de rank normalizado ~ RANK_ERROR_CONSTANT / k ** RANK_ERROR_EXPONENT
+RANK_ERROR_CONSTANT = 2.296
+RANK_ERROR_EXPONENT = 0.9723
+
+# Fator de decaimento das capacidades entre níveis
+CAPACITY_DECAY = 2 / 3
+MIN_LEVEL_CAPACITY = 2
+
+
+def k_for_error(rank_error):
+    """
+    Menor k cujo erro de rank normalizado fica abaixo de rank_error.
+
+    Ex.: 0.01 (1%) -> k = 269; 0.001 -> k = 2.863
+    """
+    if not 0 < rank_error < 1:
+        raise ValueError("rank_error deve estar entre 0 e 1")
+    return math.ceil((RANK_ERROR_CONSTANT / rank_error) ** (1 / RANK_ERROR_EXPONENT))
+
+
+class KLLSketch:
+    """
+    Sketch KLL de quantis.
+
+    Os valores ficam em níveis (compactors); um item no nível h vale 2**h
+    valores originais. Quando um nível enche, ele é ordenado e metade dos
+    itens (pares ou ímpares, sorteado) sobe para o nível de cima.
+
+    Uso:
+        sketch = KLLSketch(k=200)
+        for chunk in chunks:
+            sketch.update(chunk['TotalSales'])
+        sketch.merge(sketch_de_outra_particao)
+        p95 = sketch.quantile(0.95)
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        """
+        Args:
+            k (int): Tamanho do sketch; erro de rank ~ rank_error(k)
+            seed (int): Semente do sorteio das compactações (reprodutível)
+        """
+        if k < MIN_LEVEL_CAPACITY:
+            raise ValueError(f"k deve ser >= {MIN_LEVEL_CAPACITY}")
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._levels = [np.empty(0, dtype="float64")]
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def with_error(cls, rank_error, seed=None):
+        """Sketch dimensionado para o erro de rank pedido (ex.: 0.01)."""
+        return cls(k_for_error(rank_error), seed)
+
+    # ---------------- atualização ----------------
+
+    def update(self, values):
+        """Acrescenta valores (escalar ou array); NaN é ignorado."""
+        values = np.asarray(values, dtype="float64").ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+
+        self.n += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Soma outro sketch a este (os dois podem ter k diferentes)."""
+        if other.n == 0:
+            return self
+
+        self.k = min(self.k, other.k)
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0, dtype="float64"))
+        for h, items in enumerate(other._levels):
+            self._levels[h] = np.concatenate([self._levels[h], items])
+
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(MIN_LEVEL_CAPACITY, math.ceil(self.k * CAPACITY_DECAY ** depth))
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if items.size <= self._capacity(level):
+                level += 1
+                continue
+
+            if level + 1 == len(self._levels):
+                self._levels.append(np.empty(0, dtype="float64"))
+
+            items = np.sort(items)
+            # Nível ímpar: um item fica para a próxima compactação
+            keep = items[-1:] if items.size % 2 else items[:0]
+            pairs = items[:items.size - keep.size]
+            offset = int(self._rng.integers(2))
+
+            self._levels[level] = keep
+            self._levels[level + 1] = np.concatenate([self._levels[level + 1], pairs[offset::2]])
+            # As capacidades dependem do número de níveis: recomeça do zero
+            level = 0
+
+    # ---------------- consulta ----------------
+
+    def _weighted_items(self):
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([
+            np.full(items.size, 2 ** h, dtype="int64") for h, items in enumerate(self._levels)
+        ])
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantile(self, q):
+        """
+        Valor aproximado do quantil q (0 a 1).
+
+        O rank do valor retornado difere de q * n em no máximo
+        rank_error() * n (com ~99% de confiança).
+        """
+        if self.n == 0:
+            return math.nan
+        if not 0 <= q <= 1:
+            raise ValueError("q deve estar entre 0 e 1")
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+
+        values, weights = self._weighted_items()
+        cumulative = np.cumsum(weights)
+        position = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(values[min(position, values.size - 1)])
+
+    def quantiles(self, qs):
+        return [self.quantile(q) for q in qs]
+
+    def rank(self, value):
+        """Fração aproximada dos valores <= value."""
+        if self.n == 0:
+            return math.nan
+        values, weights = self._weighted_items()
+        return float(weights[values <= value].sum() / weights.sum())
+
+    def rank_error(self):
+        """Erro de rank normalizado garantido para o k atual."""
+        return RANK_ERROR_CONSTANT / self.k ** RANK_ERROR_EXPONENT
+
+    @property
+    def num_retained(self):
+        """Itens guardados (a memória do sketch)."""
+        return sum(items.size for items in self._levels)
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return (f"KLLSketch(k={self.k}, n={self.n:,}, retidos={self.num_retained:,}, "
+                f"erro={self.rank_error():.2%})")
+
+
+class ExactQuantiles:
+    """
+    Modo exato com a mesma interface do KLLSketch.
+
+    Guarda todos os valores; quantile() usa a interpolação linear do
+    Series.quantile(), então a classificação fica idêntica à original.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.n = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64").ravel()
+        values = values[~np.isnan(values)]
+        if values.size:
+            self._chunks.append(values)
+            self.n += values.size
+        return self
+
+    def merge(self, other):
+        self._chunks.extend(other._chunks)
+        self.n += other.n
+        return self
+
+    def _values(self):
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0] if self._chunks else np.empty(0)
+
+    def quantile(self, q):
+        if self.n == 0:
+            return math.nan
+        return float(np.quantile(self._values(), q))
+
+    def quantiles(self, qs):
+        return [self.quantile(q) for q in qs]
+
+    def rank(self, value):
+        if self.n == 0:
+            return math.nan
+        return float((self._values() <= value).mean())
+
+    def rank_error(self):
+        return 0.0
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return f"ExactQuantiles(n={self.n:,})"
+
+
+QUANTILE_METHODS = ("exact", "kll")
+
+
+def make_quantile_sketch(method="exact", k=DEFAULT_K, rank_error=None, seed=None):
+    """
+    Cria o acumulador de quantis pelo nome.
+
+    Args:
+        method (str): "exact" ou "kll"
+        k (int): Tamanho do KLL (ignorado se rank_error for informado)
+        rank_error (float): Erro de rank desejado para o KLL (ex.: 0.01)
+        seed (int): Semente do KLL
+    """
+    if method == "exact":
+        return ExactQuantiles()
+    if method == "kll":
+        if rank_error is not None:
+            return KLLSketch.with_error(rank_error, seed)
+        return KLLSketch(k, seed)
+    raise ValueError(f"method deve ser um de {QUANTILE_METHODS}, recebido {method!r}")
@@ -0,0 +1,177 @@
+"""
+Métricas por janela e por período numa única passada pelas vendas.
+
+Responsabilidade:
+- Agregar as vendas (já com OrderDate) uma vez só, por (ProductID, OrderDate)
+- Somar esses parciais para cada janela pedida (1, 2, 3 anos...) e para
+  cada granularidade (mês, trimestre, ano)
+- Devolver tudo numa tabela longa, com a classificação ABC dentro de
+  cada janela/período, pronta para o load_rollups
+
+Por que parciais?
+- Sem eles, cada variante (outra janela, tendência mensal) exige mudar
+  YEARS_TO_ANALYZE e rodar extract + JOIN + agregação de novo
+- As somas de qualquer janela ou período saem dos parciais, que têm
+  uma linha por produto/data em vez de uma por linha de venda
+
+Os parciais são por OrderDate exata (não por dia): a janela usa a mesma
+comparação OrderDate >= corte do STEP 4. No AdventureWorks OrderDate não
+tem hora, então é um parcial por produto/dia.
+"""
+
+import numpy as np
+import pandas as pd
+from src.transform import PERCENTIL_A, PERCENTIL_B
+
+
+# Granularidades aceitas -> frequência do pandas (Period)
+GRAINS = {
+    "month": "M",
+    "quarter": "Q",
+    "year": "Y",
+}
+
+# Colunas da tabela longa, na ordem da Analytics.ProductSalesRollups
+ROLLUP_COLUMNS = [
+    'RollupType', 'RollupKey', 'PeriodStart', 'PeriodEnd',
+    'ProductID', 'TotalSales', 'QtySold', 'AvgUnitPrice',
+    'LastSaleDate', 'NumOrders', 'Performance'
+]
+
+
+def validate_rollups(windows=None, grains=None):
+    """
+    Confere as janelas e granularidades pedidas.
+
+    Returns:
+        tuple: (janelas, granularidades) como listas
+    """
+    windows = list(windows or [])
+    grains = list(grains or [])
+
+    for years in windows:
+        if not isinstance(years, (int, np.integer)) or years <= 0:
+            raise ValueError(f"janela deve ser um número inteiro de anos > 0, recebido {years!r}")
+    for grain in grains:
+        if grain not in GRAINS:
+            raise ValueError(f"granularidade deve ser uma de {tuple(GRAINS)}, recebido {grain!r}")
+
+    return windows, grains
+
+
+def rollup_keys(windows=None, grains=None):
+    """RollupKey de cada janela/granularidade, na ordem da saída."""
+    return [f"{years}y" for years in windows or []] + list(grains or [])
+
+
+def period_partials(sales):
+    """
+    A passada única: agrega as linhas de venda por (ProductID, OrderDate).
+
+    Args:
+        sales (pd.DataFrame): Vendas com ProductID, OrderDate, LineTotal,
+            OrderQty, UnitPrice e SalesOrderID (saída do STEP 2)
+
+    Returns:
+        pd.DataFrame: Um parcial por produto/data com somas e contagens
+    """
+    return sales.groupby(['ProductID', 'OrderDate'], sort=False).agg(
+        LineTotal=('LineTotal', 'sum'),
+        OrderQty=('OrderQty', 'sum'),
+        UnitPriceSum=('UnitPrice', 'sum'),
+        UnitPriceCount=('UnitPrice', 'count'),
+        NumOrders=('SalesOrderID', 'count'),
+    ).reset_index()
+
+
+def _roll_up(partials, keys):
+    """Soma os parciais por keys; mesmas métricas do aggregate_by_product."""
+    grouped = partials.groupby(keys).agg(
+        TotalSales=('LineTotal', 'sum'),
+        QtySold=('OrderQty', 'sum'),
+        UnitPriceSum=('UnitPriceSum', 'sum'),
+        UnitPriceCount=('UnitPriceCount', 'sum'),
+        LastSaleDate=('OrderDate', 'max'),
+        NumOrders=('NumOrders', 'sum'),
+    ).reset_index()
+
+    grouped['AvgUnitPrice'] = grouped['UnitPriceSum'] / grouped['UnitPriceCount']
+    return grouped.drop(columns=['UnitPriceSum', 'UnitPriceCount'])
+
+
+def compute_rollups(sales, windows=None, grains=None, max_date=None):
+    """
+    Métricas por produto para cada janela e granularidade pedidas.
+
+    Args:
+        sales (pd.DataFrame): Vendas com OrderDate, sem o filtro do STEP 4
+        windows (list): Janelas em anos contados da data mais recente (ex.: [1, 2, 3])
+        grains (list): Granularidades de período: "month", "quarter", "year"
+        max_date (pd.Timestamp): Data mais recente do conjunto inteiro; informe
+            quando sales for só uma partição (padrão: a maior OrderDate de sales)
+
+    Returns:
+        pd.DataFrame: Tabela longa (ROLLUP_COLUMNS sem Performance), uma linha
+            por janela/período e produto
+    """
+    windows, grains = validate_rollups(windows, grains)
+    partials = period_partials(sales)
+
+    if max_date is None:
+        max_date = sales['OrderDate'].max()
+
+    pieces = []
+
+    for years in windows:
+        cutoff = max_date - pd.DateOffset(years=years)
+        rollup = _roll_up(partials[partials['OrderDate'] >= cutoff], ['ProductID'])
+        rollup.insert(0, 'RollupType', 'window')
+        rollup.insert(1, 'RollupKey', f"{years}y")
+        rollup.insert(2, 'PeriodStart', cutoff)
+        rollup.insert(3, 'PeriodEnd', max_date)
+        pieces.append(rollup)
+
+    for grain in grains:
+        periods = partials['OrderDate'].dt.to_period(GRAINS[grain])
+        rollup = _roll_up(partials.assign(Period=periods), ['Period', 'ProductID'])
+        period = rollup.pop('Period')
+        rollup.insert(0, 'RollupType', 'grain')
+        rollup.insert(1, 'RollupKey', grain)
+        rollup.insert(2, 'PeriodStart', period.dt.start_time)
+        rollup.insert(3, 'PeriodEnd', period.dt.end_time.dt.normalize())
+        pieces.append(rollup)
+
+    if not pieces:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS[:-1])
+
+    rollups = pd.concat(pieces, ignore_index=True)
+    rollups['QtySold'] = rollups['QtySold'].astype('int64')
+    return rollups[ROLLUP_COLUMNS[:-1]]
+
+
+def classify_rollups(rollups, keys=None):
+    """
+    Ordena a tabela longa e aplica a classificação ABC (mesmos percentis do
+    STEP 6) dentro de cada janela/período.
+
+    Args:
+        rollups (pd.DataFrame): Saída de compute_rollups (ou a concatenação
+            das saídas de várias partições)
+        keys (list): Ordem dos RollupKey na saída (ver rollup_keys)
+    """
+    keys = keys or list(dict.fromkeys(rollups['RollupKey']))
+    order = pd.Categorical(rollups['RollupKey'], categories=keys, ordered=True)
+    rollups = rollups.assign(_order=order).sort_values(
+        ['_order', 'PeriodStart', 'ProductID']
+    ).drop(columns='_order').reset_index(drop=True)
+
+    groups = rollups.groupby(['RollupKey', 'PeriodStart'], sort=False)['TotalSales']
+    p95 = groups.transform('quantile', PERCENTIL_A / 100)
+    p80 = groups.transform('quantile', PERCENTIL_B / 100)
+
+    rollups['Performance'] = np.where(
+        rollups['TotalSales'] >= p95,
+        'A',
+        np.where(rollups['TotalSales'] >= p80, 'B', 'C')
+    )
+    return rollups
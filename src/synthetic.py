@@ -0,0 +1,396 @@
+"""
+Gerador de dados sintéticos no formato do AdventureWorks.
+
+Responsabilidade:
+- Gerar Sales.SalesOrderDetail, Sales.SalesOrderHeader e Production.Product
+  com as mesmas colunas do banco real, em qualquer fator de escala
+- Gravar as tabelas num SQLite local com os mesmos schemas (Sales,
+  Production, Analytics) para o ETL rodar sem SQL Server
+- Fornecer uma fábrica de conexões compatível com get_connection()
+
+Por que SQLite?
+- Já vem com o Python e aceita ATTACH DATABASE ... AS Sales, então as
+  queries do extract (Sales.SalesOrderDetail etc.) rodam sem alteração
+- O pool (src.connection_pool) só precisa de uma função que abra conexões
+
+Limitação: o SQLite não tem TRUNCATE TABLE; use load_data(truncate=False)
+depois de clear_table().
+"""
+
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+# ============================================================
+# TAMANHOS DO ADVENTUREWORKS (FATOR DE ESCALA 1)
+# ============================================================
+
+BASE_ORDERS = 31_465
+BASE_PRODUCTS = 504
+MEAN_LINES_PER_ORDER = 3.86     # 121.317 linhas / 31.465 pedidos
+MAX_LINES_PER_ORDER = 72
+
+FIRST_ORDER_ID = 43_659
+FIRST_PRODUCT_ID = 680
+FIRST_ORDER_DATE = pd.Timestamp("2011-05-31")
+LAST_ORDER_DATE = pd.Timestamp("2014-06-30")
+
+# No AdventureWorks ~40% dos produtos são componentes com ListPrice = 0,
+# que nunca aparecem nas vendas
+COMPONENT_SHARE = 0.4
+
+COLORS = ["Black", "Silver", "Red", "White", "Blue", "Yellow", "Multi", None]
+SIZES = ["S", "M", "L", "XL", "38", "42", "44", "48", None]
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# ============================================================
+# TABELAS DO BANCO LOCAL
+# ============================================================
+
+SCHEMA_NAMES = ("Sales", "Production", "Analytics")
+
+TABLE_DDL = {
+    "Production.Product": """
+        CREATE TABLE Production.Product (
+            ProductID INTEGER PRIMARY KEY,
+            Name TEXT NOT NULL,
+            ProductNumber TEXT NOT NULL,
+            Color TEXT,
+            StandardCost REAL NOT NULL,
+            ListPrice REAL NOT NULL,
+            Size TEXT,
+            ProductSubcategoryID INTEGER,
+            ModifiedDate TEXT NOT NULL
+        )
+    """,
+    "Sales.SalesOrderHeader": """
+        CREATE TABLE Sales.SalesOrderHeader (
+            SalesOrderID INTEGER PRIMARY KEY,
+            OrderDate TEXT NOT NULL,
+            DueDate TEXT NOT NULL,
+            ShipDate TEXT,
+            Status INTEGER NOT NULL,
+            CustomerID INTEGER NOT NULL,
+            TerritoryID INTEGER,
+            SubTotal REAL NOT NULL,
+            TaxAmt REAL NOT NULL,
+            Freight REAL NOT NULL,
+            TotalDue REAL NOT NULL,
+            ModifiedDate TEXT NOT NULL
+        )
+    """,
+    "Sales.SalesOrderDetail": """
+        CREATE TABLE Sales.SalesOrderDetail (
+            SalesOrderID INTEGER NOT NULL,
+            SalesOrderDetailID INTEGER PRIMARY KEY,
+            ProductID INTEGER NOT NULL,
+            OrderQty INTEGER NOT NULL,
+            UnitPrice REAL NOT NULL,
+            UnitPriceDiscount REAL NOT NULL,
+            LineTotal REAL NOT NULL,
+            ModifiedDate TEXT NOT NULL
+        )
+    """,
+    "Analytics.ProductSalesMetrics": """
+        CREATE TABLE Analytics.ProductSalesMetrics (
+            ProductID INTEGER PRIMARY KEY,
+            TotalSales REAL,
+            QtySold INTEGER,
+            AvgUnitPrice REAL,
+            LastSaleDate TEXT,
+            ProductName TEXT,
+            ListPrice REAL,
+            StandardCost REAL,
+            NumOrders INTEGER,
+            AvgTicket REAL,
+            GrossMargin REAL,
+            AvgQtyPerOrder REAL,
+            Performance TEXT,
+            ProcessedAt TEXT
+        )
+    """,
+    "Analytics.ProductSalesRollups": """
+        CREATE TABLE Analytics.ProductSalesRollups (
+            RollupType TEXT NOT NULL,
+            RollupKey TEXT NOT NULL,
+            PeriodStart TEXT NOT NULL,
+            PeriodEnd TEXT NOT NULL,
+            ProductID INTEGER NOT NULL,
+            TotalSales REAL,
+            QtySold INTEGER,
+            AvgUnitPrice REAL,
+            LastSaleDate TEXT,
+            NumOrders INTEGER,
+            Performance TEXT,
+            ProcessedAt TEXT,
+            PRIMARY KEY (RollupKey, PeriodStart, ProductID)
+        )
+    """,
+}
+
+# Índices do AdventureWorks usados pelos JOINs e filtros do ETL
+# (no SQL Server a PK de SalesOrderDetail é (SalesOrderID, SalesOrderDetailID))
+INDEX_DDL = [
+    "CREATE INDEX Sales.IX_SalesOrderDetail_SalesOrderID ON SalesOrderDetail (SalesOrderID)",
+    "CREATE INDEX Sales.IX_SalesOrderHeader_OrderDate ON SalesOrderHeader (OrderDate)",
+]
+
+# Linhas por executemany ao popular o banco
+INSERT_CHUNK_SIZE = 100_000
+
+
+# ============================================================
+# GERAÇÃO DOS DADOS
+# ============================================================
+
+def _scaled(base, scale):
+    return max(1, int(round(base * scale)))
+
+
+def generate_products(scale=1, rng=None):
+    """
+    Gera Production.Product.
+
+    Args:
+        scale (float): Fator de escala (1 = tamanho do AdventureWorks)
+        rng (np.random.Generator): Gerador de números aleatórios
+
+    Returns:
+        pd.DataFrame: Colunas da tabela Production.Product
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n = _scaled(BASE_PRODUCTS, scale)
+    product_ids = np.arange(FIRST_PRODUCT_ID, FIRST_PRODUCT_ID + n)
+
+    is_component = rng.random(n) < COMPONENT_SHARE
+    # Preços de produtos acabados vão de poucos dólares a ~3.500 (bicicletas)
+    list_price = np.where(is_component, 0.0,
+                          np.exp(rng.uniform(np.log(2.29), np.log(3_578.27), n)).round(2))
+    standard_cost = (list_price * rng.uniform(0.4, 0.7, n)).round(4)
+
+    ids = pd.Series(product_ids).astype(str)
+    return pd.DataFrame({
+        "ProductID": product_ids,
+        "Name": "Product " + ids,
+        "ProductNumber": "SYN-" + ids.str.zfill(6),
+        "Color": rng.choice(np.array(COLORS, dtype=object), n),
+        "StandardCost": standard_cost,
+        "ListPrice": list_price,
+        "Size": rng.choice(np.array(SIZES, dtype=object), n),
+        # Componentes não têm subcategoria
+        "ProductSubcategoryID": pd.Series(rng.integers(1, 38, n), dtype="Int64").mask(is_component),
+        "ModifiedDate": pd.Timestamp("2014-02-08 10:01:36"),
+    })
+
+
+def generate_orders(products, scale=1, rng=None):
+    """
+    Gera Sales.SalesOrderHeader e Sales.SalesOrderDetail.
+
+    Só produtos com ListPrice > 0 são vendidos, com popularidade desigual
+    (poucos produtos concentram as vendas, como na curva ABC real).
+
+    Args:
+        products (pd.DataFrame): Resultado de generate_products()
+        scale (float): Fator de escala (1 = tamanho do AdventureWorks)
+        rng (np.random.Generator): Gerador de números aleatórios
+
+    Returns:
+        tuple: (sales_header, sales_detail)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    num_orders = _scaled(BASE_ORDERS, scale)
+    order_ids = np.arange(FIRST_ORDER_ID, FIRST_ORDER_ID + num_orders)
+
+    # Datas crescem com o SalesOrderID, como no banco real
+    num_days = (LAST_ORDER_DATE - FIRST_ORDER_DATE).days
+    order_days = np.sort(rng.integers(0, num_days + 1, num_orders))
+    order_dates = FIRST_ORDER_DATE + pd.to_timedelta(order_days, unit="D")
+
+    lines_per_order = np.minimum(
+        rng.geometric(1 / MEAN_LINES_PER_ORDER, num_orders), MAX_LINES_PER_ORDER
+    )
+    num_lines = int(lines_per_order.sum())
+
+    sellable = products[products["ListPrice"] > 0]
+    if sellable.empty:
+        sellable = products
+    # Popularidade tipo Zipf em ordem aleatória
+    weights = 1.0 / np.arange(1, len(sellable) + 1) ** 1.1
+    weights = rng.permutation(weights / weights.sum())
+    picked = rng.choice(len(sellable), num_lines, p=weights)
+
+    product_ids = sellable["ProductID"].to_numpy()[picked]
+    list_price = sellable["ListPrice"].to_numpy()[picked]
+
+    order_qty = np.minimum(rng.geometric(0.55, num_lines), 40)
+    # Revendedores pagam ~60% do preço de tabela em parte das linhas
+    unit_price = np.where(rng.random(num_lines) < 0.3, list_price * 0.6, list_price).round(4)
+    discount = np.where(rng.random(num_lines) < 0.03,
+                        rng.choice([0.02, 0.05, 0.1], num_lines), 0.0)
+    line_total = (unit_price * (1 - discount) * order_qty).round(6)
+
+    detail_order_ids = np.repeat(order_ids, lines_per_order)
+    detail_dates = np.repeat(order_dates.to_numpy(), lines_per_order)
+
+    sales_detail = pd.DataFrame({
+        "SalesOrderID": detail_order_ids,
+        "SalesOrderDetailID": np.arange(1, num_lines + 1),
+        "ProductID": product_ids,
+        "OrderQty": order_qty,
+        "UnitPrice": unit_price,
+        "UnitPriceDiscount": discount,
+        "LineTotal": line_total,
+        "ModifiedDate": detail_dates,
+    })
+
+    # Totais do cabeçalho batem com a soma das linhas
+    subtotal = np.bincount(np.repeat(np.arange(num_orders), lines_per_order),
+                           weights=line_total, minlength=num_orders).round(4)
+    tax = (subtotal * 0.08).round(4)
+    freight = (subtotal * 0.025).round(4)
+
+    sales_header = pd.DataFrame({
+        "SalesOrderID": order_ids,
+        "OrderDate": order_dates,
+        "DueDate": order_dates + pd.Timedelta(days=12),
+        "ShipDate": order_dates + pd.Timedelta(days=7),
+        "Status": 5,
+        "CustomerID": rng.integers(11_000, 30_119, num_orders),
+        "TerritoryID": rng.integers(1, 11, num_orders),
+        "SubTotal": subtotal,
+        "TaxAmt": tax,
+        "Freight": freight,
+        "TotalDue": subtotal + tax + freight,
+        "ModifiedDate": order_dates + pd.Timedelta(days=7),
+    })
+
+    return sales_header, sales_detail
+
+
+def generate_data(scale=1, seed=42):
+    """
+    Gera as três tabelas de origem do ETL.
+
+    A mesma combinação (scale, seed) gera sempre os mesmos dados.
+
+    Args:
+        scale (float): Fator de escala (1 = AdventureWorks, 100 = ~12 mi linhas)
+        seed (int): Semente do gerador
+
+    Returns:
+        dict: {nome da tabela no banco: DataFrame}
+    """
+    rng = np.random.default_rng(seed)
+    products = generate_products(scale, rng)
+    sales_header, sales_detail = generate_orders(products, scale, rng)
+
+    return {
+        "Production.Product": products,
+        "Sales.SalesOrderHeader": sales_header,
+        "Sales.SalesOrderDetail": sales_detail,
+    }
+
+
+# ============================================================
+# BANCO SQLITE LOCAL
+# ============================================================
+
+class SQLiteConnectionFactory:
+    """
+    Abre conexões com o banco local, no formato de get_connection().
+
+    Cada schema é um arquivo .db anexado com o nome do schema, então
+    "Sales.SalesOrderDetail" funciona igual ao SQL Server.
+
+    Uso:
+        configure_pool(factory=SQLiteConnectionFactory(".etl_bench/x1"))
+
+    É uma classe (e não uma função interna) para poder ser enviada a
+    outros processos (ex.: src.fanout).
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+
+    @property
+    def target(self):
+        """Banco das conexões (ver connection_pool.factory_target)."""
+        return f"sqlite:{self.directory}"
+
+    def __call__(self):
+        # check_same_thread=False: o pool entrega a conexão a outras threads
+        conn = sqlite3.connect(os.path.join(self.directory, "main.db"), check_same_thread=False)
+        for schema in SCHEMA_NAMES:
+            path = os.path.join(self.directory, f"{schema}.db")
+            conn.execute(f"ATTACH DATABASE '{path}' AS {schema}")
+        return conn
+
+    def __repr__(self):
+        return f"SQLiteConnectionFactory({self.directory!r})"
+
+
+def _to_rows(df):
+    """Converte o DataFrame em tuplas de tipos Python aceitos pelo sqlite3."""
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.strftime(DATE_FORMAT)
+        values = values.astype(object).where(values.notna(), None)
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def create_sqlite_database(directory, data):
+    """
+    Grava as tabelas geradas num banco SQLite local (recria do zero).
+
+    Args:
+        directory (str): Pasta do banco
+        data (dict): Resultado de generate_data()
+
+    Returns:
+        SQLiteConnectionFactory: Fábrica de conexões para o banco criado
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in ["main"] + list(SCHEMA_NAMES):
+        path = os.path.join(directory, f"{name}.db")
+        if os.path.exists(path):
+            os.remove(path)
+
+    factory = SQLiteConnectionFactory(directory)
+    conn = factory()
+    try:
+        for table_name, ddl in TABLE_DDL.items():
+            conn.execute(ddl)
+
+        for table_name, df in data.items():
+            placeholders = ", ".join("?" for _ in df.columns)
+            insert = (f"INSERT INTO {table_name} ({', '.join(df.columns)}) "
+                      f"VALUES ({placeholders})")
+            for start in range(0, len(df), INSERT_CHUNK_SIZE):
+                conn.executemany(insert, _to_rows(df.iloc[start:start + INSERT_CHUNK_SIZE]))
+
+        # Índices depois da carga: mais rápido que mantê-los a cada INSERT
+        for ddl in INDEX_DDL:
+            conn.execute(ddl)
+        conn.commit()
+    finally:
+        conn.close()
+
+    return factory
+
+
+def clear_table(factory, table_name="Analytics.ProductSalesMetrics"):
+    """DELETE no lugar do TRUNCATE TABLE, que o SQLite não tem."""
+    conn = factory()
+    try:
+        conn.execute(f"DELETE FROM {table_name}")
+        conn.commit()
+    finally:
+        conn.close()
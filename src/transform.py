@@ -1,36 +1,132 @@
+import multiprocessing
+import os
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from src.dimension import PRODUCT_ATTRIBUTES, ProductDimension
+from src.interchange import is_stage_path, open_stage
+from src.metrics import get_metrics, log
+from src.quantile_sketch import make_quantile_sketch
 
 PERCENTIL_A = 95
 PERCENTIL_B = 80
 YEARS_TO_ANALYZE = 2
 
+# Colunas de Production.Product usadas na agregação (STEP 5)
+PRODUCT_COLUMNS = ['ProductID'] + PRODUCT_ATTRIBUTES
 
-def transform_data(data):
+# Colunas que cada STEP lê de cada fonte do extract_all.
+# Por que declarar? src.lineage monta os SELECTs a partir daqui: uma métrica
+# nova que leia outra coluna só precisa aparecer no STEP correspondente.
+STEP_COLUMNS = {
+    "STEP 2: JOIN header": {
+        "sales_detail": ['SalesOrderID'],
+        "sales_header": ['SalesOrderID'],
+    },
+    "STEP 3: dimensão de produtos": {
+        "sales_detail": ['ProductID'],
+        "products": ['ProductID'],
+    },
+    "STEP 4: filtro de data": {
+        "sales_header": ['OrderDate'],
+    },
+    "STEP 5: agregação": {
+        "sales_detail": ['LineTotal', 'OrderQty', 'UnitPrice', 'SalesOrderID'],
+        "sales_header": ['OrderDate'],
+        "products": PRODUCT_COLUMNS,
+    },
+}
+
+
+def transform_data(data, workers=None, engine="pandas", quantiles="exact",
+                   windows=None, grains=None):
     """
     Transforma os dados extraídos em tabela analítica.
+
+    Args:
+        data (dict | str): Saída do extract_all. "products" também pode ser uma
+            ProductDimension já montada (ver src.dimension; só no engine "pandas").
+            Também aceita a pasta gravada pelo extract_all(interchange_dir=...),
+            aberta por memory map com o schema conferido (ver src.interchange)
+        workers (int): Se > 1, executa os STEPs 3-5 em partições por
+            ProductID num pool de processos (ver _aggregate_partitioned).
+            0 = um processo por núcleo.
+        engine (str): Motor dos STEPs 2-6: "pandas" ou "duckdb" (ver src.backends)
+        quantiles (str): Percentis do STEP 6: "exact" (Series.quantile) ou
+            "kll" (sketch aproximado, ver src.quantile_sketch)
+        windows (list): Janelas extras em anos (ex.: [1, 2, 3]) calculadas na
+            mesma passada pelas vendas (ver src.rollups). Se a extração usou
+            cutoff_years, ele precisa cobrir a maior janela
+        grains (list): Granularidades de período: "month", "quarter", "year"
+
+    Returns:
+        pd.DataFrame: Métricas por produto ou None se falhar. Com windows ou
+            grains, devolve a tupla (métricas, tabela longa de rollups)
     """
+
+    # Import tardio: src.rollups e src.lineage importam este módulo
+    from src.rollups import classify_rollups, compute_rollups, rollup_keys, validate_rollups
+
+    if is_stage_path(data):
+        from src.lineage import required_columns
+        data = open_stage(data, expected=required_columns())
+
+    windows, grains = validate_rollups(windows, grains)
+    with_rollups = bool(windows or grains)
+    if with_rollups and engine != "pandas":
+        raise ValueError("windows/grains só são suportados no engine \"pandas\"")
     
-    print(f"\n" + "="*60)
-    print("  INICIANDO A TRANSFORMAÇÃO DE DADOS")
-    print("="*60)
+    log(f"\n" + "="*60)
+    log("  INICIANDO A TRANSFORMAÇÃO DE DADOS")
+    log("="*60)
+
+    metrics = get_metrics()
 
     try:
         
-        print("\n STEP 1: Carregando DataFrames...")
+        log("\n STEP 1: Carregando DataFrames...")
 
         sales_detail = data['sales_detail']
         sales_header = data['sales_header']
         products = data['products']
 
-        print(f"    Sales Detail: {len(sales_detail):,} linhas")
-        print(f"    Sales Header: {len(sales_header):,} linhas")
-        print(f"    Products: {len(products):,} linhas")
+        log(f"    Sales Detail: {len(sales_detail):,} linhas")
+        log(f"    Sales Header: {len(sales_header):,} linhas")
+        log(f"    Products: {len(products):,} linhas")
+
+        if engine != "pandas":
+            # Import tardio: src.backends importa este módulo
+            from src.backends import get_backend
+            with metrics.stage("transform", f"STEPs 2-7 ({engine})") as record:
+                products_metrics = get_backend(engine).transform(data, quantiles)
+                record["rows_in"] = len(sales_detail)
+                record["rows_out"] = len(products_metrics)
+            return products_metrics
 
+        if workers == 0:
+            workers = os.cpu_count()
+
+        if workers and workers > 1:
+            timer = metrics.start_stage("transform", "STEPs 2-5 (particionado)",
+                                        rows_in=len(sales_detail), workers=workers)
+            products_metrics, sketch, rollups = _aggregate_partitioned(
+                sales_detail, sales_header, products, workers, quantiles,
+                windows, grains
+            )
+            timer.finish(rows_out=len(products_metrics))
+            products_metrics = add_derived_metrics(products_metrics)
+            products_metrics = classify_performance(products_metrics, sketch)
+            products_metrics = finalize_metrics(products_metrics)
+            if with_rollups:
+                rollups = classify_rollups(rollups, rollup_keys(windows, grains))
+                return products_metrics, rollups
+            return products_metrics
 
         
-        print(f"\n STEP 2: JOIN Sales Detail + Sales Header...")
+        log(f"\n STEP 2: JOIN Sales Detail + Sales Header...")
+        timer = metrics.start_stage("transform", "STEP 2: JOIN header",
+                                    rows_in=len(sales_detail))
 
         sales = pd.merge(
             sales_detail,
@@ -39,43 +135,56 @@ def transform_data(data):
             how='inner'
         )
 
-        print(f"    Resultado: {len(sales):,} linhas")
+        log(f"    Resultado: {len(sales):,} linhas")
 
         if len(sales) != len(sales_detail):
-            print(f"     Atenção: {len(sales_detail) - len(sales):,} registros órfãos")
+            log(f"     Atenção: {len(sales_detail) - len(sales):,} registros órfãos")
 
-        print(f"    Colunas após JOIN: {len(sales.columns)} colunas")
+        log(f"    Colunas após JOIN: {len(sales.columns)} colunas")
+        timer.finish(rows_out=len(sales))
 
         
-        print(f"\n STEP 3: JOIN Sales + Products...")
+        log(f"\n STEP 3: Dimensão de produtos...")
+        timer = metrics.start_stage("transform", "STEP 3: dimensão de produtos",
+                                    rows_in=len(sales))
 
-        sales = pd.merge(
-            sales,
-            products,
-            on='ProductID',
-            how='left'
-        )
-        
-        print(f"    Resultado: {len(sales):,} linhas")
-        print(f"    Colunas após segundo JOIN: {len(sales.columns)} colunas")
+        # Por que não pd.merge aqui?
+        # - Copiaria nome, preço e custo em cada linha de venda só para o
+        #   STEP 5 pegar o 'first' de cada produto
+        # - Os atributos são resolvidos depois da agregação (ver src.dimension)
+        dimension = _as_dimension(products)
+        log(f"    Produtos na dimensão: {len(dimension):,}")
         
         # Validação
-        produtos_sem_info = sales['ProductName'].isna().sum()
+        produtos_sem_info = (~dimension.contains(sales['ProductID'].to_numpy())).sum()
         if produtos_sem_info > 0:
-            print(f"     {produtos_sem_info:,} vendas de produtos sem cadastro")
+            log(f"     {produtos_sem_info:,} vendas de produtos sem cadastro")
         else:
-            print(f"    Todos os produtos têm informação!")
+            log(f"    Todos os produtos têm informação!")
+        timer.finish(rows_out=len(sales))
+
+        if with_rollups:
+            # Antes do STEP 4: as janelas maiores precisam do histórico inteiro
+            log(f"\n STEP 3b: Janelas {windows} e períodos {grains}...")
+            timer = metrics.start_stage("transform", "STEP 3b: janelas e períodos",
+                                        rows_in=len(sales))
+            rollups = compute_rollups(sales, windows, grains)
+            rollups = classify_rollups(rollups, rollup_keys(windows, grains))
+            log(f"    Resultado: {len(rollups):,} linhas (produto x janela/período)")
+            timer.finish(rows_out=len(rollups))
 
         
-        print(f"\n STEP 4: Filtrando últimos {YEARS_TO_ANALYZE} anos...")
+        log(f"\n STEP 4: Filtrando últimos {YEARS_TO_ANALYZE} anos...")
+        timer = metrics.start_stage("transform", "STEP 4: filtro de data",
+                                    rows_in=len(sales))
         
         # Data mais recente
         max_date = sales['OrderDate'].max()
-        print(f"    Data mais recente: {max_date}")
+        log(f"    Data mais recente: {max_date}")
         
         # Data de corte
         cutoff_date = max_date - pd.DateOffset(years=YEARS_TO_ANALYZE)
-        print(f"    Data de corte: {cutoff_date}")
+        log(f"    Data de corte: {cutoff_date}")
         
         # Filtrar
         linhas_antes = len(sales)
@@ -83,108 +192,28 @@ def transform_data(data):
         linhas_depois = len(sales)
         linhas_removidas = linhas_antes - linhas_depois
         
-        print(f"    Resultado: {linhas_depois:,} linhas")
-        print(f"    Removidas: {linhas_removidas:,} linhas ({linhas_removidas/linhas_antes*100:.1f}%)")
-
-        print(f"\n STEP 5: Agregando dados por produto...")
-
-        products_metrics = sales.groupby('ProductID').agg({
-            'LineTotal': 'sum',          
-            'OrderQty': 'sum',            
-            'UnitPrice': 'mean',         
-            'OrderDate': 'max',           
-            'ProductName': 'first',       
-            'ListPrice': 'first',         
-            'StandardCost': 'first',      
-            'SalesOrderID': 'count'       
-        }).reset_index()
-
-        products_metrics.columns = [
-            'ProductID',
-            'TotalSales',
-            'QtySold',           
-            'AvgUnitPrice',
-            'LastSaleDate',      
-            'ProductName',
-            'ListPrice',
-            'StandardCost',
-            'NumOrders'
-        ]
-
-        print(f"Agregação concluída!!!")
-        print(f"    Produtos únicos: {len(products_metrics):,}")
-        print(f"Redução: {len(sales):,} linhas -> {len(products_metrics):,} linhas")
-
-
-        print(f"\n STEP Calculando métricas adicionais...")
-
-        products_metrics['AvgTicket'] = (products_metrics['TotalSales'] / products_metrics['NumOrders']).round(2)
-
-        products_metrics['GrossMargin'] = np.where(
-            products_metrics['ListPrice'] > 0,
-            ((products_metrics['ListPrice'] - products_metrics['StandardCost']) / 
-             products_metrics['ListPrice'] * 100),
-            np.nan  # NaN se ListPrice = 0
-        )
+        log(f"    Resultado: {linhas_depois:,} linhas")
+        if linhas_antes:
+            log(f"    Removidas: {linhas_removidas:,} linhas ({linhas_removidas/linhas_antes*100:.1f}%)")
+        timer.finish(rows_out=linhas_depois)
 
-        products_metrics['AvgQtyPerOrder'] = (
-            products_metrics['QtySold'] / products_metrics['NumOrders']
-        )
-        
-        print(f"   ✅ Métricas calculadas:")
-        print(f"      • Ticket Médio (AvgTicket)")
-        print(f"      • Margem Bruta % (GrossMargin)")
-        print(f"      • Qtd Média por Pedido (AvgQtyPerOrder)")
+        log(f"\n STEP 5: Agregando dados por produto...")
+        timer = metrics.start_stage("transform", "STEP 5: agregação",
+                                    rows_in=len(sales))
 
-        print(f"\n STEP 6: Classificando performace dos produtos...")
-        p95 = products_metrics['TotalSales'].quantile(PERCENTIL_A / 100)
-        p80 = products_metrics['TotalSales'].quantile(PERCENTIL_B / 100)
+        products_metrics = aggregate_by_product(sales, dimension)
+        timer.finish(rows_out=len(products_metrics))
 
-        print(f" Percentil 95: ${p95:,.2f}")
-        print(f" Percentil 80: ${p80:,.2f}")     
+        log(f"Agregação concluída!!!")
+        log(f"    Produtos únicos: {len(products_metrics):,}")
+        log(f"Redução: {len(sales):,} linhas -> {len(products_metrics):,} linhas")
 
-        products_metrics['Performance'] = np.where(
-            products_metrics['TotalSales'] >= p95,  
-            'A',                                     
-            np.where(
-                products_metrics['TotalSales'] >= p80,  
-                'B',                                    
-                'C'                                     
-            )
-        )  
+        products_metrics = add_derived_metrics(products_metrics)
+        products_metrics = classify_performance(products_metrics, quantiles)
+        products_metrics = finalize_metrics(products_metrics)
 
-        print("Classificação concluida: ")
-        class_counts = products_metrics['Performance'].value_counts().sort_index()
-        for classe, count in class_counts.items():
-            percent = count / len(products_metrics) * 100
-            print(f"   • Classe {classe}: {count:,} produtos ({percent:.2f}%)")
-        
-        print(f"\nSTEP 7: Finalizando transformação...")
-
-        product_metrics = products_metrics.sort_values(
-            'TotalSales', 
-            ascending=False  # Descendente (maior primeiro)
-        ).reset_index(drop=True)
-
-        product_metrics = products_metrics.sort_values(
-            'TotalSales', 
-            ascending=False  # Descendente (maior primeiro)
-        ).reset_index(drop=True)
-        
-        print(f"   ✅ Dados ordenados por TotalSales")
-        print(f"   ✅ Valores numéricos arredondados")
-        
-        # Estatísticas finais
-        print(f"\n📈 ESTATÍSTICAS FINAIS:")
-        print(f"   💰 Total de Vendas: ${products_metrics['TotalSales'].sum():,.2f}")
-        print(f"   📦 Total Produtos Vendidos: {products_metrics['QtySold'].sum():,}")
-        print(f"   🏆 Top Produto: {products_metrics.iloc[0]['ProductName']}")
-        print(f"      └─ Vendas: ${products_metrics.iloc[0]['TotalSales']:,.2f}")
-        
-        print(f"\n{'='*60}")
-        print(f"✅ TRANSFORMAÇÃO COMPLETA!")
-        print(f"{'='*60}")
-        
+        if with_rollups:
+            return products_metrics, rollups
         return products_metrics
     
     except Exception as e:
@@ -196,4 +225,298 @@ def transform_data(data):
         print(f"\n🔍 Traceback completo:")
         traceback.print_exc()
         
-        return None
\ No newline at end of file
+        return None
+
+
+def _as_dimension(products):
+    """Aceita a Production.Product extraída ou uma ProductDimension pronta."""
+    if isinstance(products, ProductDimension):
+        return products
+    return ProductDimension.from_frame(products)
+
+
+def _aggregate_partition(inputs, cutoff_date, quantiles="exact",
+                         windows=None, grains=None, max_date=None):
+    """
+    STEPs 2-5 de uma partição (executado num processo do pool).
+
+    A partição são os produtos com ProductID % workers == index, separados
+    pelo processo principal; o JOIN com o header roda no processo da partição.
+
+    Os atributos do produto são resolvidos depois, uma vez só.
+    Cada partição devolve também o sketch de TotalSales dos seus produtos;
+    o processo principal só faz o merge dos sketches para o STEP 6.
+    Com windows/grains, devolve ainda os rollups (sem classificação) da partição.
+
+    Args:
+        inputs (tuple): (detalhe só da partição, header, dimensão)
+
+    Returns:
+        tuple: (métricas, sketch, rollups ou None, contagens do JOIN)
+    """
+    sales_detail, sales_header, dimension = inputs
+
+    # STEP 2 reduzido: só OrderDate vem do header
+    sales = pd.merge(sales_detail, sales_header, on='SalesOrderID', how='inner')
+    counts = {
+        "rows_in": len(sales_detail),
+        "rows_joined": len(sales),
+        "unknown_products": int((~dimension.contains(sales['ProductID'].to_numpy())).sum()),
+    }
+
+    rollups = None
+    if windows or grains:
+        from src.rollups import compute_rollups
+        rollups = compute_rollups(sales, windows, grains, max_date=max_date)
+
+    sales = sales[sales['OrderDate'] >= cutoff_date]
+    products_metrics = aggregate_by_product(sales)
+    sketch = make_quantile_sketch(quantiles).update(products_metrics['TotalSales'])
+    return products_metrics, sketch, rollups, counts
+
+
+def _aggregate_partitioned(sales_detail, sales_header, products, workers, quantiles="exact",
+                           windows=None, grains=None):
+    """
+    STEPs 2-5 em paralelo, particionando as vendas por hash de ProductID.
+
+    Por que particionar por ProductID?
+    - Cada produto cai inteiro numa partição, então a agregação de cada
+      partição já é final: basta concatenar, sem combinar parciais
+    - A ordem relativa das linhas se mantém dentro da partição, então
+      somas e médias saem idênticas às do caminho serial
+
+    Por que "spawn" e não fork?
+    - O ETL pode estar com threads vivas (pipeline em streaming, threads da
+      extração); o fork copia locks que essas threads seguravam e o filho
+      pode travar. Com spawn cada processo recebe só a sua partição do
+      detalhe (mais header e dimensão) por pickle
+
+    No processo principal só fica a data de corte (STEP 4), que precisa do
+    conjunto inteiro: a maior OrderDate dos pedidos que têm linhas, sem
+    montar o JOIN.
+
+    Como cada produto está numa partição só, os rollups por janela/período
+    de cada partição também já são finais; a classificação deles fica para
+    o processo principal (percentis do conjunto inteiro).
+
+    Returns:
+        tuple: (métricas por produto, sketch de TotalSales combinado,
+            rollups concatenados ou None)
+    """
+    log(f"\n STEPs 2-5 em paralelo: {workers} partições por ProductID")
+
+    header = sales_header[['SalesOrderID', 'OrderDate']]
+    dimension = _as_dimension(products)
+
+    # STEP 4 precisa da data máxima global antes de particionar
+    has_lines = header['SalesOrderID'].isin(sales_detail['SalesOrderID'])
+    max_date = header.loc[has_lines, 'OrderDate'].max()
+    cutoff_date = max_date - pd.DateOffset(years=YEARS_TO_ANALYZE)
+    log(f"    Data de corte: {cutoff_date}")
+
+    partition_args = [cutoff_date, quantiles, windows, grains, max_date]
+    if pd.isna(max_date):
+        # Nenhuma venda com pedido: a tabela vazia sai do mesmo caminho
+        log(f"    Nenhuma venda na janela")
+        results = [_aggregate_partition((sales_detail, header, dimension), *partition_args)]
+    else:
+        partition_ids = sales_detail['ProductID'] % workers
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(_aggregate_partition,
+                                (sales_detail[partition_ids == index], header, dimension),
+                                *partition_args)
+                for index in range(workers)
+            ]
+            results = [future.result() for future in futures]
+
+    rows_in = sum(counts["rows_in"] for _, _, _, counts in results)
+    rows_joined = sum(counts["rows_joined"] for _, _, _, counts in results)
+    log(f"    JOIN com header: {rows_joined:,} linhas")
+    if rows_joined != rows_in:
+        log(f"     Atenção: {rows_in - rows_joined:,} registros órfãos")
+    produtos_sem_info = sum(counts["unknown_products"] for _, _, _, counts in results)
+    if produtos_sem_info > 0:
+        log(f"     {produtos_sem_info:,} vendas de produtos sem cadastro")
+
+    sketch = make_quantile_sketch(quantiles)
+    for _, partition_sketch, _, _ in results:
+        sketch.merge(partition_sketch)
+
+    rollups = None
+    if windows or grains:
+        rollups = pd.concat([part for _, _, part, _ in results], ignore_index=True)
+
+    # Mesma ordem do groupby serial (ProductID crescente)
+    products_metrics = pd.concat([part for part, _, _, _ in results], ignore_index=True)
+    products_metrics = products_metrics.sort_values('ProductID').reset_index(drop=True)
+    products_metrics = attach_product_attributes(products_metrics, dimension)
+
+    log(f"Agregação concluída!!!")
+    log(f"    Produtos únicos: {len(products_metrics):,}")
+
+    return products_metrics, sketch, rollups
+
+
+def aggregate_by_product(sales, products=None):
+    """
+    STEP 5: agrega as linhas de venda (já filtradas) por ProductID.
+
+    Args:
+        sales (pd.DataFrame): Linhas de venda com OrderDate
+        products (pd.DataFrame | ProductDimension): Se informado, resolve
+            ProductName, ListPrice e StandardCost depois da agregação
+    """
+    products_metrics = sales.groupby('ProductID').agg({
+        'LineTotal': 'sum',          
+        'OrderQty': 'sum',            
+        'UnitPrice': 'mean',         
+        'OrderDate': 'max',           
+        'SalesOrderID': 'count'       
+    }).reset_index()
+
+    products_metrics.columns = [
+        'ProductID',
+        'TotalSales',
+        'QtySold',           
+        'AvgUnitPrice',
+        'LastSaleDate',      
+        'NumOrders'
+    ]
+
+    if products is not None:
+        products_metrics = attach_product_attributes(products_metrics, products)
+
+    return products_metrics
+
+
+def attach_product_attributes(products_metrics, products):
+    """
+    Acrescenta os atributos do produto a uma tabela já agregada por ProductID,
+    nas mesmas posições de colunas do antigo merge + 'first'.
+
+    Produtos sem cadastro ficam com NaN, como no LEFT JOIN.
+    """
+    dimension = _as_dimension(products)
+    attributes = dimension.lookup(products_metrics['ProductID'].to_numpy())
+
+    position = products_metrics.columns.get_loc('LastSaleDate') + 1
+    for offset, col in enumerate(PRODUCT_ATTRIBUTES):
+        products_metrics.insert(position + offset, col, attributes[col].array)
+
+    return products_metrics
+
+
+def add_derived_metrics(products_metrics):
+    """
+    Calcula AvgTicket, GrossMargin e AvgQtyPerOrder a partir da agregação.
+    """
+    log(f"\n STEP Calculando métricas adicionais...")
+    timer = get_metrics().start_stage("transform", "STEP 5b: métricas derivadas",
+                                      rows_in=len(products_metrics))
+
+    products_metrics['AvgTicket'] = (products_metrics['TotalSales'] / products_metrics['NumOrders']).round(2)
+
+    products_metrics['GrossMargin'] = np.where(
+        products_metrics['ListPrice'] > 0,
+        ((products_metrics['ListPrice'] - products_metrics['StandardCost']) / 
+         products_metrics['ListPrice'] * 100),
+        np.nan  # NaN se ListPrice = 0
+    )
+
+    products_metrics['AvgQtyPerOrder'] = (
+        products_metrics['QtySold'] / products_metrics['NumOrders']
+    )
+    
+    log(f"   ✅ Métricas calculadas:")
+    log(f"      • Ticket Médio (AvgTicket)")
+    log(f"      • Margem Bruta % (GrossMargin)")
+    log(f"      • Qtd Média por Pedido (AvgQtyPerOrder)")
+    timer.finish(rows_out=len(products_metrics))
+
+    return products_metrics
+
+
+def classify_performance(products_metrics, quantiles="exact"):
+    """
+    STEP 6: classificação ABC pelos percentis de TotalSales.
+
+    Args:
+        products_metrics (pd.DataFrame): Métricas por produto
+        quantiles (str | sketch): "exact" (Series.quantile), "kll", ou um
+            sketch já alimentado com os TotalSales (ex.: merge dos sketches
+            de partições ou chunks, ver src.quantile_sketch)
+    """
+    log(f"\n STEP 6: Classificando performace dos produtos...")
+    timer = get_metrics().start_stage("transform", "STEP 6: classificação ABC",
+                                      rows_in=len(products_metrics))
+    if isinstance(quantiles, str) and quantiles == "exact":
+        p95 = products_metrics['TotalSales'].quantile(PERCENTIL_A / 100)
+        p80 = products_metrics['TotalSales'].quantile(PERCENTIL_B / 100)
+    else:
+        sketch = quantiles
+        if isinstance(sketch, str):
+            sketch = make_quantile_sketch(sketch).update(products_metrics['TotalSales'])
+        p95, p80 = sketch.quantiles([PERCENTIL_A / 100, PERCENTIL_B / 100])
+        log(f" Percentis calculados por {sketch!r}")
+
+    log(f" Percentil 95: ${p95:,.2f}")
+    log(f" Percentil 80: ${p80:,.2f}")     
+
+    products_metrics['Performance'] = np.where(
+        products_metrics['TotalSales'] >= p95,  
+        'A',                                     
+        np.where(
+            products_metrics['TotalSales'] >= p80,  
+            'B',                                    
+            'C'                                     
+        )
+    )  
+
+    log("Classificação concluida: ")
+    class_counts = products_metrics['Performance'].value_counts().sort_index()
+    for classe, count in class_counts.items():
+        percent = count / len(products_metrics) * 100
+        log(f"   • Classe {classe}: {count:,} produtos ({percent:.2f}%)")
+    timer.finish(rows_out=len(products_metrics))
+
+    return products_metrics
+
+
+def finalize_metrics(products_metrics):
+    """
+    STEP 7: ordenação e estatísticas finais.
+    """
+    log(f"\nSTEP 7: Finalizando transformação...")
+    timer = get_metrics().start_stage("transform", "STEP 7: finalização",
+                                      rows_in=len(products_metrics))
+
+    product_metrics = products_metrics.sort_values(
+        'TotalSales', 
+        ascending=False  # Descendente (maior primeiro)
+    ).reset_index(drop=True)
+
+    product_metrics = products_metrics.sort_values(
+        'TotalSales', 
+        ascending=False  # Descendente (maior primeiro)
+    ).reset_index(drop=True)
+    
+    log(f"   ✅ Dados ordenados por TotalSales")
+    log(f"   ✅ Valores numéricos arredondados")
+    
+    # Estatísticas finais
+    log(f"\n📈 ESTATÍSTICAS FINAIS:")
+    log(f"   💰 Total de Vendas: ${products_metrics['TotalSales'].sum():,.2f}")
+    log(f"   📦 Total Produtos Vendidos: {products_metrics['QtySold'].sum():,}")
+    if len(products_metrics):
+        log(f"   🏆 Top Produto: {products_metrics.iloc[0]['ProductName']}")
+        log(f"      └─ Vendas: ${products_metrics.iloc[0]['TotalSales']:,.2f}")
+    
+    log(f"\n{'='*60}")
+    log(f"✅ TRANSFORMAÇÃO COMPLETA!")
+    log(f"{'='*60}")
+    timer.finish(rows_out=len(products_metrics))
+
+    return products_metrics
\ No newline at end of file
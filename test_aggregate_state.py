@@ -0,0 +1,98 @@
+"""
+Script para testar o estado incremental da agregação (src.aggregate_state).
+
+Não precisa do SQL Server.
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+from src.aggregate_state import ProductAggregateState, transform_incremental
+from src.synthetic import generate_data
+from src.transform import transform_data
+
+
+def make_extract():
+    data = generate_data(scale=0.1, seed=7)
+    return {
+        "sales_detail": data["Sales.SalesOrderDetail"],
+        "sales_header": data["Sales.SalesOrderHeader"],
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    }
+
+
+def assert_same_metrics(result, expected):
+    assert result["ProductID"].tolist() == expected["ProductID"].tolist()
+    assert result["Performance"].tolist() == expected["Performance"].tolist()
+    assert (result["QtySold"] == expected["QtySold"]).all()
+    assert (result["NumOrders"] == expected["NumOrders"]).all()
+    assert (result["LastSaleDate"] == expected["LastSaleDate"]).all()
+    for column in ("TotalSales", "AvgUnitPrice", "AvgTicket"):
+        assert (result[column] - expected[column]).abs().max() < 1e-6, column
+
+
+def test_fold_and_expire_match_transform():
+    """
+    Três execuções com deltas crescentes: depois de cada uma, o estado dá o
+    mesmo resultado do transform_data sobre tudo o que já chegou.
+    """
+    extracted = make_extract()
+    detail = extracted["sales_detail"].sort_values("SalesOrderDetailID")
+    # IDs do detalhe crescem com a data no gerador: cada delta avança a janela
+    bounds = [int(len(detail) * share) for share in (0.5, 0.8, 1.0)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for bound in bounds:
+            seen = {**extracted, "sales_detail": detail.iloc[:bound]}
+            result = transform_incremental(seen, state_dir=directory)
+            assert_same_metrics(result, transform_data(seen))
+
+    print("\n✅ Fold + expire iguais ao transform_data OK!")
+
+
+def test_save_writes_only_new_parts():
+    """O save grava só as partes novas e apaga os meses expirados."""
+    extracted = make_extract()
+    detail = extracted["sales_detail"].sort_values("SalesOrderDetailID")
+    half = len(detail) // 2
+
+    with tempfile.TemporaryDirectory() as directory:
+        state = ProductAggregateState()
+        state.fold({**extracted, "sales_detail": detail.iloc[:half]})
+        state.expire()
+        state.save(directory)
+        first_files = {
+            piece["file"]: os.path.getmtime(os.path.join(directory, piece["file"]))
+            for pieces in state.partitions.values() for piece in pieces
+        }
+        oldest_month = min(state.partitions)
+
+        state = ProductAggregateState.load(directory)
+        assert state.num_partials == sum(p["rows"] for ps in state.partitions.values() for p in ps)
+        state.fold({**extracted, "sales_detail": detail})
+        expired = state.expire()
+        state.save(directory)
+
+        assert expired > 0
+        assert oldest_month not in state.partitions
+        kept = {piece["file"] for pieces in state.partitions.values() for piece in pieces}
+        for name, mtime in first_files.items():
+            path = os.path.join(directory, name)
+            if name in kept:
+                assert os.path.getmtime(path) == mtime
+            else:
+                assert not os.path.exists(path)
+
+        # Recarregado do disco, dá o mesmo resultado
+        reloaded = ProductAggregateState.load(directory)
+        pd.testing.assert_frame_equal(reloaded.partials, state.partials)
+        pd.testing.assert_frame_equal(reloaded.totals, state.totals)
+
+    print("\n✅ Persistência incremental do estado OK!")
+
+
+if __name__ == "__main__":
+    test_fold_and_expire_match_transform()
+    test_save_writes_only_new_parts()
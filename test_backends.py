@@ -0,0 +1,129 @@
+"""
+Script para comparar os backends de transformação (pandas x DuckDB).
+
+Não precisa do SQL Server: usa dados sintéticos no formato do extract_all.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.transform import transform_data
+
+
+NUMERIC_COLUMNS = [
+    'TotalSales', 'QtySold', 'AvgUnitPrice', 'ListPrice', 'StandardCost',
+    'NumOrders', 'AvgTicket', 'GrossMargin', 'AvgQtyPerOrder'
+]
+
+
+def make_sample_data(num_orders=2_000, seed=42):
+    """
+    Gera um dict {"sales_detail", "sales_header", "products"} pequeno,
+    com produtos sem cadastro e ListPrice = 0 para cobrir os casos de NULL.
+    """
+    rng = np.random.default_rng(seed)
+
+    order_ids = np.arange(43659, 43659 + num_orders)
+    order_dates = pd.Timestamp('2011-05-31') + pd.to_timedelta(
+        rng.integers(0, 1_100, num_orders), unit='D'
+    )
+    sales_header = pd.DataFrame({
+        'SalesOrderID': order_ids,
+        'OrderDate': order_dates,
+        'CustomerID': rng.integers(11_000, 30_000, num_orders),
+    })
+
+    lines_per_order = rng.integers(1, 6, num_orders)
+    num_lines = int(lines_per_order.sum())
+    qty = rng.integers(1, 10, num_lines)
+    price = rng.uniform(2, 3_500, num_lines).round(4)
+    sales_detail = pd.DataFrame({
+        'SalesOrderID': np.repeat(order_ids, lines_per_order),
+        'SalesOrderDetailID': np.arange(1, num_lines + 1),
+        'ProductID': rng.integers(700, 1_010, num_lines),
+        'OrderQty': qty,
+        'UnitPrice': price,
+        'UnitPriceDiscount': 0.0,
+        'LineTotal': qty * price,
+    })
+
+    product_ids = np.arange(700, 1_000)
+    list_price = np.where(rng.random(len(product_ids)) < 0.2, 0.0,
+                          rng.uniform(5, 3_000, len(product_ids)).round(2))
+    products = pd.DataFrame({
+        'ProductID': product_ids,
+        'ProductName': [f'Produto {i}' for i in product_ids],
+        'StandardCost': (list_price * 0.6).round(2),
+        'ListPrice': list_price,
+    })
+
+    return {
+        'sales_detail': sales_detail,
+        'sales_header': sales_header,
+        'products': products,
+    }
+
+
+def assert_same_metrics(expected, result):
+    """Confere produtos, métricas numéricas e classificação."""
+    expected = expected.set_index('ProductID').sort_index()
+    result = result.set_index('ProductID').sort_index()
+
+    assert expected.index.equals(result.index), "Conjunto de produtos diferente"
+
+    for col in NUMERIC_COLUMNS:
+        assert np.allclose(
+            expected[col].astype(float),
+            result[col].astype(float),
+            rtol=1e-9,
+            equal_nan=True
+        ), f"Coluna {col} diferente"
+
+    for col in ['LastSaleDate', 'ProductName', 'Performance']:
+        assert expected[col].astype(str).equals(result[col].astype(str)), \
+            f"Coluna {col} diferente"
+
+
+def test_duckdb_matches_pandas():
+    """
+    O backend DuckDB deve gerar as mesmas métricas do pandas.
+    """
+    data = make_sample_data()
+
+    expected = transform_data(data)
+    result = transform_data(data, engine='duckdb')
+
+    assert expected is not None and result is not None
+    assert_same_metrics(expected, result)
+    assert expected.dtypes.equals(result.dtypes), \
+        f"Dtypes diferentes:\n{pd.concat([expected.dtypes, result.dtypes], axis=1)}"
+
+    print("\n✅ DuckDB igual ao pandas!")
+
+
+def test_duckdb_honours_quantiles():
+    """
+    Com quantiles="kll", o DuckDB classifica pelo sketch, como o pandas.
+    """
+    data = make_sample_data()
+    # Até k produtos o KLL não compacta: o resultado não depende do sorteio,
+    # mas os percentis (rank mais próximo) ainda diferem dos interpolados
+    detail = data['sales_detail']
+    data['sales_detail'] = detail[detail['ProductID'] < 880]
+
+    exact = transform_data(data, engine='duckdb')
+    expected = transform_data(data, quantiles='kll')
+    result = transform_data(data, engine='duckdb', quantiles='kll')
+
+    assert expected is not None and result is not None
+    assert_same_metrics(expected, result)
+    assert not exact.set_index('ProductID')['Performance'].sort_index().equals(
+        result.set_index('ProductID')['Performance'].sort_index()
+    ), "quantiles='kll' deveria mudar a classificação desta amostra"
+
+    print("\n✅ DuckDB com sketch igual ao pandas!")
+
+
+if __name__ == "__main__":
+    test_duckdb_matches_pandas()
+    test_duckdb_honours_quantiles()
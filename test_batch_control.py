@@ -0,0 +1,104 @@
+"""
+Script para testar o controle adaptativo do tamanho de lote.
+
+Não precisa do SQL Server: a latência do link é simulada e a carga usa
+o banco SQLite do src.synthetic.
+"""
+
+import os
+import tempfile
+
+from src.batch_control import AdaptiveBatchController
+from src.connection_pool import configure_pool, reset_pool
+from src.load import load_data
+from src.metrics import start_run
+from src.synthetic import clear_table, create_sqlite_database, generate_data
+from src.transform import transform_data
+
+
+def wan_latency(rows, round_trip=0.08, seconds_per_row=2e-5):
+    """Link lento: um round trip fixo por lote + o custo de cada linha."""
+    return round_trip + rows * seconds_per_row
+
+
+def run_batches(controller, num_batches, latency=wan_latency, lock_at=()):
+    for batch in range(1, num_batches + 1):
+        rows = controller.size
+        controller.record(rows, latency(rows), 25.0 if batch in lock_at else 0.0)
+
+
+def test_grows_on_slow_link():
+    """Com round trip alto, o lote cresce e a vazão sobe bem acima do lote fixo."""
+    controller = AdaptiveBatchController(initial_size=100, max_size=20_000, max_latency=1.0)
+    run_batches(controller, 30)
+
+    report = controller.report()
+    fixed_rate = 100 / wan_latency(100)
+    assert report["final_size"] > 10 * 100
+    assert report["best_rows_per_second"] > 5 * fixed_rate
+    # O lote nunca passa do limite de latência
+    assert all(wan_latency(size) <= 1.0 for size in report["sizes"])
+
+    print(f"\n✅ Lote cresceu de 100 para {report['final_size']:,} linhas")
+
+
+def test_backs_off_on_spikes_and_locks():
+    """Pico de latência ou espera por lock reduz o lote pela metade."""
+    controller = AdaptiveBatchController(initial_size=1000)
+    run_batches(controller, 5)
+    size = controller.size
+
+    controller.record(size, wan_latency(size) * 6, 0.0)
+    assert controller.size == size // 2
+    assert controller.history[-1]["action"] == "recuo: pico"
+
+    size = controller.size
+    controller.record(size, wan_latency(size), 40.0)
+    assert controller.size == size // 2
+    assert controller.report()["backoffs"] == 2
+    assert controller.report()["lock_waits"] == 1
+
+    # Nunca abaixo do mínimo
+    for _ in range(20):
+        controller.record(controller.size, 60.0, 0.0)
+    assert controller.size == controller.min_size
+
+    print("\n✅ Recuo em picos e locks OK!")
+
+
+def test_auto_batches_in_report():
+    """load_data(batch_size="auto") carrega tudo e põe os lotes no relatório."""
+    data = generate_data(scale=0.05, seed=7)
+    transformed = transform_data({
+        "sales_detail": data["Sales.SalesOrderDetail"],
+        "sales_header": data["Sales.SalesOrderHeader"],
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    })
+
+    with tempfile.TemporaryDirectory() as directory:
+        factory = create_sqlite_database(os.path.join(directory, "db"), data)
+        clear_table(factory)
+        configure_pool(factory=factory)
+        try:
+            metrics = start_run()
+            controller = AdaptiveBatchController(initial_size=2, min_size=1, max_size=8)
+            assert load_data(transformed, truncate=False, batch_size=controller)
+        finally:
+            reset_pool()
+
+        conn = factory()
+        count = conn.execute("SELECT COUNT(*) FROM Analytics.ProductSalesMetrics").fetchone()[0]
+        conn.close()
+
+    assert count == len(transformed)
+    batching = metrics.to_dict()["info"]["load_batching"]
+    assert sum(batching["sizes"]) == len(transformed)
+    assert batching["batches"] == len(batching["sizes"])
+
+    print("\n✅ Lote adaptativo no relatório OK!")
+
+
+if __name__ == "__main__":
+    test_grows_on_slow_link()
+    test_backs_off_on_spikes_and_locks()
+    test_auto_batches_in_report()
@@ -0,0 +1,187 @@
+"""
+Script para testar o cache local de extrações (src.cache).
+
+Não precisa do SQL Server.
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from src.cache import ExtractCache
+from src.connection_pool import SERVER_IDENTITY_QUERY, configure_pool, reset_pool
+from src.extract import extract_all
+from src.synthetic import SCHEMA_NAMES, create_sqlite_database, generate_data
+
+
+class IdentifiedCursor(sqlite3.Cursor):
+    """Cursor SQLite que responde à query de identidade como o SQL Server."""
+
+    def execute(self, sql, *args):
+        if sql == SERVER_IDENTITY_QUERY:
+            return super().execute("SELECT ?, ?", self.connection.identity)
+        return super().execute(sql, *args)
+
+
+class IdentifiedConnection(sqlite3.Connection):
+    def cursor(self, factory=IdentifiedCursor):
+        return super().cursor(factory)
+
+
+def identified_factory(directory, server, database):
+    """
+    Fábrica sem `target` (como o get_connection ou uma lambda) cujo banco
+    responde @@SERVERNAME/DB_NAME() com os valores informados.
+    """
+    def connect():
+        conn = sqlite3.connect(os.path.join(directory, "main.db"),
+                               factory=IdentifiedConnection, check_same_thread=False)
+        conn.identity = (server, database)
+        for schema in SCHEMA_NAMES:
+            conn.execute(f"ATTACH DATABASE '{os.path.join(directory, schema + '.db')}' AS {schema}")
+        return conn
+    return connect
+
+
+def make_frame(seed):
+    return pd.DataFrame({"ProductID": range(seed, seed + 200), "LineTotal": [seed * 1.5] * 200})
+
+
+def test_ttl_expiry():
+    """Entrada mais velha que o TTL é um miss e sai do índice."""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExtractCache(directory, ttl=0.05)
+        key = cache.make_key("SELECT 1", target="teste")
+        cache.put(key, make_frame(1), "Sales.SalesOrderDetail")
+        pd.testing.assert_frame_equal(cache.get(key), make_frame(1))
+
+        time.sleep(0.1)
+        assert cache.get(key) is None
+        stats = cache.get_stats()
+        assert stats["expired"] == 1
+        assert stats["entries"] == 0
+
+    print("\n✅ Expiração por TTL OK!")
+
+
+def test_lru_eviction():
+    """Passando de max_bytes, sai a entrada acessada há mais tempo."""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExtractCache(directory, ttl=None)
+        keys = [cache.make_key(f"SELECT {i}", target="teste") for i in range(3)]
+
+        cache.put(keys[0], make_frame(0))
+        size = cache.get_stats()["bytes"]
+        cache.max_bytes = 2 * size + size // 2
+
+        time.sleep(0.01)
+        cache.put(keys[1], make_frame(1))
+        time.sleep(0.01)
+        # Acessar a primeira a torna a mais recente: a segunda é que sai
+        assert cache.get(keys[0]) is not None
+        time.sleep(0.01)
+        cache.put(keys[2], make_frame(2))
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[2]) is not None
+        assert cache.get_stats()["evictions"] == 1
+
+        # O índice gravado em disco reflete o despejo
+        assert set(ExtractCache(directory, ttl=None)._index) == {keys[0], keys[2]}
+
+    print("\n✅ Despejo LRU OK!")
+
+
+def test_invalidate():
+    """invalidate por chave, por tabela e total."""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExtractCache(directory)
+        detail = [cache.make_key(f"SELECT d{i}", target="teste") for i in range(2)]
+        header = cache.make_key("SELECT h", target="teste")
+        for key in detail:
+            cache.put(key, make_frame(1), "Sales.SalesOrderDetail")
+        cache.put(header, make_frame(2), "Sales.SalesOrderHeader")
+
+        assert cache.invalidate(key=detail[0]) == 1
+        assert cache.invalidate(key=detail[0]) == 0
+        assert cache.invalidate(table_name="Sales.SalesOrderDetail") == 1
+        assert cache.get(header) is not None
+        assert cache.invalidate() == 1
+        assert cache.get_stats()["entries"] == 0
+
+    print("\n✅ Invalidação OK!")
+
+
+def test_key_follows_pool_target():
+    """Bancos diferentes no pool não compartilham entradas do cache."""
+    first = generate_data(scale=0.05, seed=7)
+    second = generate_data(scale=0.05, seed=8)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExtractCache(f"{directory}/cache")
+        results = []
+        try:
+            for name, data in (("a", first), ("b", second)):
+                configure_pool(factory=create_sqlite_database(f"{directory}/{name}", data))
+                results.append(extract_all(cache=cache))
+        finally:
+            reset_pool()
+
+        assert cache.get_stats()["hits"] == 0
+        assert len(results[0]["sales_detail"]) == len(first["Sales.SalesOrderDetail"])
+        assert len(results[1]["sales_detail"]) == len(second["Sales.SalesOrderDetail"])
+
+    print("\n✅ Chave do cache por banco OK!")
+
+
+def test_key_follows_server_and_database():
+    """
+    A chave vem do servidor/banco que a conexão responde, não da fábrica:
+    - fábricas diferentes para o mesmo banco reaproveitam o cache
+    - a mesma fábrica apontando para outro banco não reaproveita
+    - banco que não se identifica não usa o cache
+    """
+    data = generate_data(scale=0.05, seed=7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        create_sqlite_database(f"{directory}/db", data)
+        cache = ExtractCache(f"{directory}/cache")
+        try:
+            configure_pool(factory=identified_factory(f"{directory}/db", "SRV01", "AW"))
+            extract_all(cache=cache)
+            entries = cache.get_stats()["entries"]
+            assert entries > 0 and cache.get_stats()["hits"] == 0
+
+            # Outra fábrica (outro objeto, outra execução), mesmo banco: acerta
+            configure_pool(factory=identified_factory(f"{directory}/db", "SRV01", "AW"))
+            extract_all(cache=cache)
+            assert cache.get_stats()["hits"] == entries
+
+            # db_config apontado para outro banco: não serve o cache antigo
+            configure_pool(factory=identified_factory(f"{directory}/db", "SRV01", "AW_EU"))
+            extract_all(cache=cache)
+            assert cache.get_stats()["hits"] == entries
+            assert cache.get_stats()["entries"] == 2 * entries
+
+            # Sem identidade (lambda para SQLite, sem target): nada entra no cache
+            plain = create_sqlite_database(f"{directory}/plain", data)
+            configure_pool(factory=lambda: plain())
+            extract_all(cache=cache)
+            assert cache.get_stats()["entries"] == 2 * entries
+            assert cache.get_stats()["hits"] == entries
+        finally:
+            reset_pool()
+
+    print("\n✅ Chave do cache pelo servidor e banco OK!")
+
+
+if __name__ == "__main__":
+    test_ttl_expiry()
+    test_lru_eviction()
+    test_invalidate()
+    test_key_follows_pool_target()
+    test_key_follows_server_and_database()
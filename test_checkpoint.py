@@ -0,0 +1,131 @@
+"""
+Script para testar os checkpoints e a retomada da carga.
+
+Não precisa do SQL Server: usa o banco SQLite do src.synthetic.
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+from src.checkpoint import RunCheckpoint
+from src.connection_pool import configure_pool, reset_pool
+from src.load import load_data
+from src.synthetic import clear_table, create_sqlite_database, generate_data
+from src.transform import transform_data
+
+
+class FailingCursor:
+    """Cursor que falha no executemany de número fail_at."""
+
+    def __init__(self, cursor, state):
+        self._cursor = cursor
+        self._state = state
+
+    def executemany(self, query, rows):
+        self._state["calls"] += 1
+        if self._state["calls"] == self._state["fail_at"]:
+            raise RuntimeError("conexão perdida (simulada)")
+        return self._cursor.executemany(query, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class FailingConnection:
+    def __init__(self, conn, state):
+        self._conn = conn
+        self._state = state
+
+    def cursor(self):
+        return FailingCursor(self._conn.cursor(), self._state)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def make_data():
+    data = generate_data(scale=0.05, seed=7)
+    extracted = {
+        "sales_detail": data["Sales.SalesOrderDetail"],
+        "sales_header": data["Sales.SalesOrderHeader"],
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    }
+    return data, extracted
+
+
+def test_snapshots_roundtrip():
+    """Os estágios salvos voltam iguais e uma execução aberta é retomada."""
+    _, extracted = make_data()
+
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = RunCheckpoint.resume_or_start("run_a", checkpoint_dir=directory)
+        checkpoint.save_frames("extract", extracted)
+        transformed = transform_data(extracted)
+        checkpoint.save_frames("transform", transformed)
+
+        resumed = RunCheckpoint.resume_or_start(checkpoint_dir=directory)
+        assert resumed.run_id == "run_a"
+        assert resumed.is_complete("extract") and resumed.is_complete("transform")
+
+        frames = resumed.load_frames("extract")
+        for name, df in extracted.items():
+            pd.testing.assert_frame_equal(frames[name], df.reset_index(drop=True))
+        pd.testing.assert_frame_equal(resumed.load_frames("transform"), transformed)
+
+        resumed.finish()
+        assert not any(name.endswith(".feather") for name in os.listdir(resumed.run_dir))
+        assert RunCheckpoint.latest_unfinished(directory) is None
+
+    print("\n✅ Snapshots dos estágios OK!")
+
+
+def test_load_resumes_after_failure():
+    """
+    Uma carga que falha no meio continua do último lote confirmado,
+    sem duplicar nem perder linhas.
+    """
+    data, extracted = make_data()
+    transformed = transform_data(extracted)
+
+    with tempfile.TemporaryDirectory() as directory:
+        factory = create_sqlite_database(os.path.join(directory, "db"), data)
+        clear_table(factory)
+        checkpoint_dir = os.path.join(directory, "checkpoints")
+        checkpoint = RunCheckpoint.resume_or_start("run_b", checkpoint_dir=checkpoint_dir)
+
+        # 3º lote falha: os 2 primeiros (com commit) ficam no banco
+        state = {"calls": 0, "fail_at": 3}
+        configure_pool(factory=lambda: FailingConnection(factory(), state))
+        try:
+            assert not load_data(transformed, truncate=False, batch_size=4, checkpoint=checkpoint)
+        finally:
+            reset_pool()
+
+        resumed = RunCheckpoint.resume_or_start(checkpoint_dir=checkpoint_dir)
+        assert resumed.manifest["load"]["committed_rows"] == 8
+        assert resumed.manifest["load"]["batches"] == 2
+
+        configure_pool(factory=factory)
+        try:
+            assert load_data(transformed, truncate=False, batch_size=4, checkpoint=resumed)
+            # Carga concluída: uma nova tentativa não insere nada
+            assert load_data(transformed, truncate=False, batch_size=4, checkpoint=resumed)
+        finally:
+            reset_pool()
+
+        conn = factory()
+        count, processed_at = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT ProcessedAt) FROM Analytics.ProductSalesMetrics"
+        ).fetchone()
+        conn.close()
+        assert count == len(transformed)
+        assert processed_at == 1
+
+    print("\n✅ Carga retomada do último lote OK!")
+
+
+if __name__ == "__main__":
+    test_snapshots_roundtrip()
+    test_load_resumes_after_failure()
@@ -0,0 +1,219 @@
+"""
+Script para testar o pool de conexões (src.connection_pool).
+
+Não precisa de banco: a fábrica devolve conexões falsas que contam o uso.
+"""
+
+import threading
+import time
+
+from src.connection_pool import (
+    ConnectionPool,
+    borrow_connection,
+    configure_pool,
+    get_pool,
+    reset_pool,
+    return_connection,
+)
+
+
+class FakeConnection:
+    """Conexão falsa: responde ao health check enquanto healthy=True."""
+
+    def __init__(self, number):
+        self.number = number
+        self.healthy = True
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, query):
+        if not self.healthy:
+            raise ConnectionError("conexão caiu (simulado)")
+
+    def fetchone(self):
+        return (1,)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class CountingFactory:
+    """Fábrica que numera as conexões abertas."""
+
+    def __init__(self):
+        self.created = []
+
+    def __call__(self):
+        conn = FakeConnection(len(self.created) + 1)
+        self.created.append(conn)
+        return conn
+
+
+def test_lifo_reuse():
+    """A conexão devolvida por último é a próxima emprestada."""
+    factory = CountingFactory()
+    pool = ConnectionPool(factory, min_size=0, max_size=3)
+
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    assert pool.acquire() is second
+    assert pool.acquire() is first
+    assert len(factory.created) == 2
+
+    print("\n✅ Reuso LIFO OK!")
+
+
+def test_waits_for_free_connection_and_times_out():
+    """Com max_size atingido, espera uma devolução ou desiste no timeout."""
+    factory = CountingFactory()
+    pool = ConnectionPool(factory, min_size=0, max_size=1, checkout_timeout=2)
+
+    held = pool.acquire()
+    borrowed = []
+    waiter = threading.Thread(target=lambda: borrowed.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.1)
+    pool.release(held)
+    waiter.join(timeout=2)
+
+    assert borrowed == [held]
+    assert pool.get_stats()["waits"] == 1
+    assert len(factory.created) == 1
+
+    pool.checkout_timeout = 0.1
+    start = time.monotonic()
+    assert pool.acquire() is None
+    assert time.monotonic() - start >= 0.1
+
+    print("\n✅ Espera e timeout do max_size OK!")
+
+
+def test_discards_unhealthy_connection():
+    """Conexão que falha no health check é fechada e trocada por uma nova."""
+    factory = CountingFactory()
+    pool = ConnectionPool(factory, min_size=0, max_size=2)
+
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.healthy = False
+
+    replacement = pool.acquire()
+    assert replacement is not conn
+    assert conn.closed
+    stats = pool.get_stats()
+    assert stats["health_check_failures"] == 1
+    assert stats["open"] == 1
+
+    print("\n✅ Descarte no health check OK!")
+
+
+def test_evicts_idle_connections():
+    """Ociosas há mais de idle_timeout são fechadas, respeitando o min_size."""
+    factory = CountingFactory()
+    pool = ConnectionPool(factory, min_size=1, max_size=3, idle_timeout=0.05)
+
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    time.sleep(0.1)
+
+    # A mais antiga sai; a outra fica por causa do min_size
+    assert pool.acquire() is second
+    assert first.closed
+    assert pool.get_stats()["open"] == 1
+
+    print("\n✅ Despejo de ociosas OK!")
+
+
+def test_release_broken_closes():
+    """release(broken=True) fecha a conexão e libera a vaga."""
+    factory = CountingFactory()
+    pool = ConnectionPool(factory, min_size=0, max_size=1)
+
+    conn = pool.acquire()
+    pool.release(conn, broken=True)
+    assert conn.closed
+    assert pool.get_stats()["open"] == 0
+
+    assert pool.acquire() is not conn
+    assert len(factory.created) == 2
+
+    print("\n✅ Devolução de conexão quebrada OK!")
+
+
+def test_release_rejects_foreign_connection():
+    """Uma conexão de outro pool (ou já devolvida) não entra na contagem."""
+    pool = ConnectionPool(CountingFactory(), min_size=0, max_size=2)
+    other = ConnectionPool(CountingFactory(), min_size=0, max_size=2)
+
+    conn = other.acquire()
+    try:
+        pool.release(conn)
+        raise AssertionError("release aceitou conexão de outro pool")
+    except ValueError:
+        pass
+    assert pool.get_stats()["open"] == 0
+
+    other.release(conn)
+    try:
+        other.release(conn)
+        raise AssertionError("release aceitou a mesma conexão duas vezes")
+    except ValueError:
+        pass
+    assert other.get_stats()["open"] == 1
+
+    print("\n✅ Conexão de outro pool recusada OK!")
+
+
+def test_pool_swapped_mid_flight():
+    """
+    configure_pool/reset_pool entre o borrow e o return: a conexão volta
+    ao pool que a emprestou (e é fechada, porque ele foi encerrado) e o
+    pool novo não tem a contagem alterada.
+    """
+    old_factory, new_factory = CountingFactory(), CountingFactory()
+    try:
+        old_pool = configure_pool(factory=old_factory, min_size=0, max_size=2)
+        conn = borrow_connection()
+        new_pool = configure_pool(factory=new_factory, min_size=1, max_size=2)
+
+        return_connection(conn)
+        assert conn.closed
+        assert old_pool.get_stats()["open"] == 0
+        assert new_pool.get_stats()["open"] == 1
+        assert new_pool.get_stats()["idle"] == 1
+
+        # O mesmo com reset_pool
+        conn = borrow_connection()
+        assert conn in new_factory.created
+        reset_pool()
+        configure_pool(factory=CountingFactory(), min_size=0, max_size=2)
+        return_connection(conn, broken=True)
+        assert new_pool.get_stats()["open"] == 0
+        assert get_pool().get_stats()["open"] == 0
+
+        try:
+            return_connection(FakeConnection(99))
+            raise AssertionError("return_connection aceitou conexão que não foi emprestada")
+        except ValueError:
+            pass
+    finally:
+        reset_pool()
+
+    print("\n✅ Troca de pool durante o empréstimo OK!")
+
+
+if __name__ == "__main__":
+    test_lifo_reuse()
+    test_waits_for_free_connection_and_times_out()
+    test_discards_unhealthy_connection()
+    test_evicts_idle_connections()
+    test_release_broken_closes()
+    test_release_rejects_foreign_connection()
+    test_pool_swapped_mid_flight()
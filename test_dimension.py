@@ -0,0 +1,101 @@
+"""
+Script para testar a dimensão de produtos indexada por ProductID (src.dimension).
+
+Não precisa do SQL Server.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.dimension import MAX_DIRECT_INDEX, PRODUCT_ATTRIBUTES, ProductDimension
+from src.synthetic import generate_data
+from src.transform import aggregate_by_product, attach_product_attributes
+
+
+def make_products(product_ids):
+    count = len(product_ids)
+    return pd.DataFrame({
+        "ProductID": pd.Series(product_ids, dtype="int64"),
+        "ProductName": pd.Series([f"Produto {i}" for i in product_ids], dtype=object),
+        "ListPrice": np.arange(count, dtype="float64") + 10.0,
+        "StandardCost": np.arange(count, dtype="float64") + 5.0,
+    })
+
+
+def test_missing_and_out_of_range_ids():
+    """
+    IDs sem cadastro, negativos e acima do maior ID dão -1 / NaN, nos dois
+    modos de busca (índice direto e busca binária).
+    """
+    direct = ProductDimension.from_frame(make_products([707, 712, 999]))
+    assert direct._positions is not None
+
+    # IDs grandes demais para o índice direto: busca binária
+    huge = MAX_DIRECT_INDEX + 5
+    sorted_ids = ProductDimension.from_frame(make_products([999, 707, huge]))
+    assert sorted_ids._positions is None
+
+    for dimension, big_id in ((direct, 712), (sorted_ids, huge)):
+        asked = [707, 708, -3, 0, big_id, big_id + 1, 10 ** 12]
+        expected_found = [True, False, False, False, True, False, False]
+        assert dimension.contains(asked).tolist() == expected_found
+
+        attributes = dimension.lookup(asked)
+        assert len(attributes) == len(asked)
+        assert attributes["ProductName"].isna().tolist() == [not f for f in expected_found]
+        assert attributes["ListPrice"].isna().tolist() == [not f for f in expected_found]
+        assert attributes.loc[0, "ProductName"] == "Produto 707"
+        assert attributes.loc[4, "ProductName"] == f"Produto {big_id}"
+
+    empty = ProductDimension.from_frame(make_products([]))
+    assert len(empty) == 0
+    assert empty.positions([1, 2]).tolist() == [-1, -1]
+    assert empty.lookup([1])["ListPrice"].isna().all()
+
+    print("\n✅ ProductIDs sem cadastro e fora da faixa OK!")
+
+
+def test_duplicate_ids_keep_first_row():
+    products = make_products([707, 707, 712])
+    dimension = ProductDimension.from_frame(products)
+    assert len(dimension) == 2
+    assert dimension.lookup([707])["ListPrice"].tolist() == [10.0]
+
+    print("\n✅ ProductID repetido usa a primeira linha OK!")
+
+
+def test_attach_matches_merge():
+    """
+    attach_product_attributes com a dimensão dá o mesmo que o LEFT JOIN
+    com a tabela de produtos, inclusive para vendas de produtos sem cadastro.
+    """
+    data = generate_data(scale=0.05, seed=5)
+    products = data["Production.Product"].rename(columns={"Name": "ProductName"})
+    sales = pd.merge(data["Sales.SalesOrderDetail"],
+                     data["Sales.SalesOrderHeader"][["SalesOrderID", "OrderDate"]],
+                     on="SalesOrderID")
+    # Um produto vendido que saiu do cadastro
+    removed = int(sales["ProductID"].iloc[0])
+    products = products[products["ProductID"] != removed]
+
+    aggregated = aggregate_by_product(sales)
+    result = attach_product_attributes(aggregated.copy(), ProductDimension.from_frame(products))
+
+    expected = pd.merge(aggregated, products[["ProductID"] + PRODUCT_ATTRIBUTES],
+                        on="ProductID", how="left")
+    expected = expected[list(result.columns)]
+
+    assert result["ProductID"].tolist() == expected["ProductID"].tolist()
+    for col in PRODUCT_ATTRIBUTES:
+        assert result[col].isna().tolist() == expected[col].isna().tolist(), col
+        known = expected[col].notna()
+        assert result.loc[known, col].tolist() == expected.loc[known, col].tolist(), col
+    assert result.loc[result["ProductID"] == removed, "ProductName"].isna().all()
+
+    print("\n✅ Dimensão igual ao merge OK!")
+
+
+if __name__ == "__main__":
+    test_missing_and_out_of_range_ids()
+    test_duplicate_ids_keep_first_row()
+    test_attach_matches_merge()
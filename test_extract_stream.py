@@ -0,0 +1,55 @@
+"""
+Script para testar a extração em chunks (extract_data com chunksize).
+
+Não precisa do SQL Server.
+"""
+
+import tempfile
+
+import pandas as pd
+
+from src.connection_pool import configure_pool, reset_pool
+from src.extract import QUERY_SALES_DETAIL, SCHEMA_SALES_DETAIL, ExtractionError, extract_data
+from src.synthetic import create_sqlite_database, generate_data
+
+
+def test_chunks_match_full_extraction():
+    """Os chunks juntos são a mesma tabela da extração completa."""
+    data = generate_data(scale=0.05, seed=7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_pool(factory=create_sqlite_database(directory, data))
+        try:
+            full = extract_data(QUERY_SALES_DETAIL, "Sales.SalesOrderDetail",
+                                schema=SCHEMA_SALES_DETAIL)
+            chunks = list(extract_data(QUERY_SALES_DETAIL, "Sales.SalesOrderDetail", 100,
+                                       schema=SCHEMA_SALES_DETAIL))
+        finally:
+            reset_pool()
+
+    assert len(chunks) == -(-len(full) // 100)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), full)
+
+    print("\n✅ Extração em chunks OK!")
+
+
+def test_no_connection_is_an_error():
+    """Sem conexão, o gerador falha em vez de parecer uma tabela vazia."""
+    configure_pool(factory=lambda: None, checkout_timeout=0.1)
+    try:
+        chunks = extract_data(QUERY_SALES_DETAIL, "Sales.SalesOrderDetail", 100)
+        try:
+            next(chunks)
+        except ExtractionError:
+            pass
+        else:
+            raise AssertionError("esperava ExtractionError sem conexão")
+    finally:
+        reset_pool()
+
+    print("\n✅ Falha de conexão no streaming OK!")
+
+
+if __name__ == "__main__":
+    test_chunks_match_full_extraction()
+    test_no_connection_is_an_error()
@@ -0,0 +1,164 @@
+"""
+Script para testar o ETL sobre várias origens (src.fanout).
+
+Não precisa do SQL Server: cada origem é um banco SQLite do src.synthetic.
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+import types
+
+import pandas as pd
+
+from src.connection_pool import configure_pool, get_pool_target, reset_pool
+from src.extract import extract_all
+from src.fanout import db_config_factory, run_fanout
+from src.synthetic import clear_table, create_sqlite_database, generate_data
+from src.transform import transform_data
+
+
+class UnreachableSource:
+    """Fábrica de conexões de uma origem fora do ar."""
+
+    def __call__(self):
+        raise ConnectionError("servidor não encontrado (simulado)")
+
+
+def test_fanout_merges_sources():
+    """
+    Duas origens com as mesmas vendas e uma fora do ar: o resultado é o
+    do transform_data sobre as vendas das duas juntas.
+    """
+    data = generate_data(scale=0.05, seed=7)
+
+    # Vendas das duas origens juntas, com SalesOrderID sem colisão
+    offset = int(data["Sales.SalesOrderHeader"]["SalesOrderID"].max()) + 1
+    header = data["Sales.SalesOrderHeader"]
+    detail = data["Sales.SalesOrderDetail"]
+    expected = transform_data({
+        "sales_detail": pd.concat([detail, detail.assign(SalesOrderID=detail["SalesOrderID"] + offset)]),
+        "sales_header": pd.concat([header, header.assign(SalesOrderID=header["SalesOrderID"] + offset)]),
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    })
+
+    with tempfile.TemporaryDirectory() as directory:
+        targets = {
+            "us": create_sqlite_database(os.path.join(directory, "us"), data),
+            "eu": create_sqlite_database(os.path.join(directory, "eu"), data),
+            "apac": UnreachableSource(),
+        }
+        analytics = create_sqlite_database(os.path.join(directory, "analytics"), data)
+        clear_table(analytics)
+
+        configure_pool(factory=analytics)
+        try:
+            result = run_fanout(targets, max_sources=2, connections_per_source=2,
+                                truncate=False)
+            assert result is not None
+
+            conn = analytics()
+            count = conn.execute("SELECT COUNT(*) FROM Analytics.ProductSalesMetrics").fetchone()[0]
+            conn.close()
+            assert count == len(expected)
+
+            # Sem permitir origens faltando, a falha aborta antes da carga
+            assert run_fanout(targets, allow_partial=False, load=False) is None
+        finally:
+            reset_pool()
+
+    assert result["ProductID"].tolist() == expected["ProductID"].tolist()
+    assert result["Performance"].tolist() == expected["Performance"].tolist()
+    assert (result["QtySold"] == expected["QtySold"]).all()
+    assert (result["TotalSales"] - expected["TotalSales"]).abs().max() < 1e-6
+
+    print("\n✅ ETL em várias origens OK!")
+
+
+def fake_pyodbc(connect):
+    """Módulo pyodbc falso: connect() é o chamável informado."""
+    module = types.ModuleType("pyodbc")
+    module.Error = type("Error", (Exception,), {})
+    module.connect = connect
+    return module
+
+
+def test_db_config_factory_connection_string():
+    """A fábrica monta a string ODBC da origem e vai por pickle aos processos."""
+    factory = db_config_factory(server="sql-eu,1433", database="AdventureWorks_EU",
+                                username="etl", password="p;w}d", Encrypt="yes")
+
+    assert factory.connection_string() == (
+        "DRIVER={ODBC Driver 18 for SQL Server};SERVER=sql-eu,1433;"
+        "DATABASE=AdventureWorks_EU;UID=etl;PWD={p;w}}d};"
+        "TrustServerCertificate=yes;Encrypt=yes;"
+    )
+    assert "p;w" not in repr(factory)
+    assert factory.target == "mssql:sql-eu,1433/AdventureWorks_EU"
+
+    copy = pickle.loads(pickle.dumps(factory))
+    assert copy.connection_string() == factory.connection_string()
+
+    # Sem login: autenticação do Windows, como o config.db_config
+    trusted = db_config_factory(database="AdventureWorks_US")
+    assert "Trusted_Connection=yes;" in trusted.connection_string()
+    assert "UID=" not in trusted.connection_string()
+
+    print("\n✅ String de conexão da origem OK!")
+
+
+def test_db_config_factory_feeds_pool():
+    """
+    O pool configurado com db_config_factory abre as conexões pelo pyodbc com
+    a string da origem (pyodbc falso, servindo o banco SQLite).
+    """
+    data = generate_data(scale=0.02, seed=3)
+    opened = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite_factory = create_sqlite_database(os.path.join(directory, "eu"), data)
+
+        def connect(connection_string):
+            opened.append(connection_string)
+            return sqlite_factory()
+
+        previous = sys.modules.get("pyodbc")
+        sys.modules["pyodbc"] = fake_pyodbc(connect)
+        factory = db_config_factory(server="sql-eu", database="AdventureWorks_EU")
+        configure_pool(factory=factory, max_size=2)
+        try:
+            assert get_pool_target() == "mssql:sql-eu/AdventureWorks_EU"
+            extracted = extract_all()
+        finally:
+            reset_pool()
+            if previous is None:
+                sys.modules.pop("pyodbc")
+            else:
+                sys.modules["pyodbc"] = previous
+
+    assert extracted is not None
+    assert len(extracted["sales_detail"]) == len(data["Sales.SalesOrderDetail"])
+    assert opened and all("DATABASE=AdventureWorks_EU;" in conn for conn in opened)
+
+    # Falha de conexão vira None, como no get_connection()
+    def refuse(connection_string):
+        raise module.Error("login failed")
+
+    module = fake_pyodbc(refuse)
+    sys.modules["pyodbc"] = module
+    try:
+        assert db_config_factory(server="sql-eu")() is None
+    finally:
+        if previous is None:
+            sys.modules.pop("pyodbc")
+        else:
+            sys.modules["pyodbc"] = previous
+
+    print("\n✅ Pool com db_config_factory OK!")
+
+
+if __name__ == "__main__":
+    test_fanout_merges_sources()
+    test_db_config_factory_connection_string()
+    test_db_config_factory_feeds_pool()
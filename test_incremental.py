@@ -0,0 +1,222 @@
+"""
+Script para testar a extração incremental por marca d'água (src.incremental).
+
+Não precisa do SQL Server: a origem é o banco SQLite do src.synthetic,
+alterado entre as execuções com UPDATE/INSERT como faria o sistema de
+vendas.
+"""
+
+import json
+import os
+import tempfile
+
+from src.connection_pool import configure_pool, reset_pool
+from src.incremental import WATERMARK_FILE, extract_incremental, load_watermarks
+from src.metrics import get_metrics, start_run
+from src.synthetic import create_sqlite_database, generate_data
+
+# Data das alterações: depois de qualquer ModifiedDate do gerador
+CHANGED_AT = "2015-01-05 10:00:00"
+
+
+class SyntheticSource:
+    """Banco SQLite da origem + pasta de estado da extração incremental."""
+
+    def __init__(self, directory, scale=0.02, seed=3):
+        self.data = generate_data(scale=scale, seed=seed)
+        self.factory = create_sqlite_database(os.path.join(directory, "db"), self.data)
+        self.state_dir = os.path.join(directory, "state")
+
+    def execute(self, *statements):
+        conn = self.factory()
+        for sql, params in statements:
+            conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    def count(self, table):
+        conn = self.factory()
+        rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.close()
+        return rows
+
+    def update_lines(self, detail_ids, extra_qty=10):
+        """Altera linhas antigas (ModifiedDate anda junto, como no AdventureWorks)."""
+        placeholders = ", ".join("?" for _ in detail_ids)
+        self.execute((
+            f"UPDATE Sales.SalesOrderDetail SET OrderQty = OrderQty + ?, "
+            f"LineTotal = LineTotal * 2, ModifiedDate = ? "
+            f"WHERE SalesOrderDetailID IN ({placeholders})",
+            (extra_qty, CHANGED_AT, *detail_ids),
+        ))
+
+    def insert_order(self, num_lines=3):
+        """Um pedido novo com SalesOrderID e SalesOrderDetailIDs acima dos existentes."""
+        conn = self.factory()
+        order_id = conn.execute("SELECT MAX(SalesOrderID) FROM Sales.SalesOrderHeader").fetchone()[0] + 1
+        detail_id = conn.execute("SELECT MAX(SalesOrderDetailID) FROM Sales.SalesOrderDetail").fetchone()[0]
+        product_id = conn.execute("SELECT MIN(ProductID) FROM Production.Product").fetchone()[0]
+        conn.close()
+
+        statements = [(
+            "INSERT INTO Sales.SalesOrderHeader (SalesOrderID, OrderDate, DueDate, ShipDate, "
+            "Status, CustomerID, TerritoryID, SubTotal, TaxAmt, Freight, TotalDue, ModifiedDate) "
+            "VALUES (?, ?, ?, ?, 5, 1, 1, 30.0, 2.4, 0.75, 33.15, ?)",
+            (order_id, "2015-01-05 00:00:00", "2015-01-17 00:00:00", "2015-01-12 00:00:00", CHANGED_AT),
+        )]
+        new_ids = []
+        for offset in range(1, num_lines + 1):
+            new_ids.append(detail_id + offset)
+            statements.append((
+                "INSERT INTO Sales.SalesOrderDetail (SalesOrderID, SalesOrderDetailID, ProductID, "
+                "OrderQty, UnitPrice, UnitPriceDiscount, LineTotal, ModifiedDate) "
+                "VALUES (?, ?, ?, 1, 10.0, 0.0, 10.0, ?)",
+                (order_id, detail_id + offset, product_id, CHANGED_AT),
+            ))
+        self.execute(*statements)
+        return order_id, new_ids
+
+    def read_watermark_file(self):
+        with open(os.path.join(self.state_dir, WATERMARK_FILE), encoding="utf-8") as f:
+            return f.read()
+
+
+def run(source, mode="modified_date", **kwargs):
+    configure_pool(factory=source.factory)
+    try:
+        start_run()
+        return extract_incremental(mode=mode, state_dir=source.state_dir, **kwargs)
+    finally:
+        reset_pool()
+
+
+def extracted_steps():
+    """Passos de extração da última execução (ex.: "Sales.SalesOrderDetail (delta)")."""
+    return [record["step"] for record in get_metrics().stages if record["stage"] == "extract"]
+
+
+def test_first_run_and_delta():
+    """
+    1ª execução: extração completa e marcas gravadas.
+    2ª execução: só o delta (linhas novas + alteradas) entra no snapshot.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        source = SyntheticSource(directory)
+
+        first = run(source)
+        assert first is not None
+        assert len(first["sales_detail"]) == len(source.data["Sales.SalesOrderDetail"])
+        assert len(first["sales_header"]) == len(source.data["Sales.SalesOrderHeader"])
+
+        marks = load_watermarks(source.state_dir)
+        assert set(marks) == {"sales_detail", "sales_header"}
+        max_order = int(source.data["Sales.SalesOrderHeader"]["SalesOrderID"].max())
+        assert int(marks["sales_header"]["SalesOrderID"]) == max_order
+
+        detail = first["sales_detail"].set_index("SalesOrderDetailID")
+        updated_ids = [int(i) for i in detail.index[[5, 50, 500]]]
+        source.update_lines(updated_ids)
+        order_id, new_ids = source.insert_order()
+
+        second = run(source)
+        assert "Sales.SalesOrderDetail (delta)" in extracted_steps()
+        assert "Sales.SalesOrderDetail" not in extracted_steps()
+        lines = second["sales_detail"].set_index("SalesOrderDetailID")
+        assert lines.index.is_unique
+        assert len(lines) == source.count("Sales.SalesOrderDetail") == len(detail) + len(new_ids)
+        for detail_id in updated_ids:
+            assert lines.loc[detail_id, "OrderQty"] == detail.loc[detail_id, "OrderQty"] + 10
+            assert abs(lines.loc[detail_id, "LineTotal"] - 2 * detail.loc[detail_id, "LineTotal"]) < 1e-9
+        assert set(new_ids) <= set(lines.index)
+        assert order_id in set(second["sales_header"]["SalesOrderID"])
+        # Snapshot na ordem da chave, como a extração completa
+        assert second["sales_detail"]["SalesOrderDetailID"].is_monotonic_increasing
+
+        marks = load_watermarks(source.state_dir)
+        assert str(marks["sales_detail"]["ModifiedDate"]).startswith("2015-01-05")
+
+    print("\n✅ Execução completa + delta OK!")
+
+
+def test_unchanged_watermark_is_noop():
+    """Sem nada novo na origem: devolve o snapshot e não regrava as marcas."""
+    with tempfile.TemporaryDirectory() as directory:
+        source = SyntheticSource(directory)
+        first = run(source)
+        marks_file = source.read_watermark_file()
+
+        again = run(source)
+        assert not any(step.startswith("Sales.") for step in extracted_steps())
+        assert source.read_watermark_file() == marks_file
+        for name in ("sales_detail", "sales_header"):
+            assert again[name].equals(first[name].reset_index(drop=True)), name
+
+    print("\n✅ Marca inalterada sem extração OK!")
+
+
+def test_corrupt_or_missing_watermark_file():
+    """Marca ilegível ou apagada: volta para a extração completa e regrava a marca."""
+    with tempfile.TemporaryDirectory() as directory:
+        source = SyntheticSource(directory)
+        run(source)
+        source.update_lines([3])
+        watermark_path = os.path.join(source.state_dir, WATERMARK_FILE)
+
+        with open(watermark_path, "w", encoding="utf-8") as f:
+            f.write('{"sales_detail": {"ModifiedDate": ')
+        assert load_watermarks(source.state_dir) == {}
+
+        rebuilt = run(source)
+        assert rebuilt is not None
+        assert len(rebuilt["sales_detail"]) == source.count("Sales.SalesOrderDetail")
+        lines = rebuilt["sales_detail"].set_index("SalesOrderDetailID")
+        original = source.data["Sales.SalesOrderDetail"].set_index("SalesOrderDetailID")
+        assert lines.loc[3, "OrderQty"] == original.loc[3, "OrderQty"] + 10
+        assert set(json.loads(source.read_watermark_file())) == {"sales_detail", "sales_header"}
+
+        os.remove(watermark_path)
+        source.insert_order()
+        rebuilt = run(source)
+        assert len(rebuilt["sales_detail"]) == source.count("Sales.SalesOrderDetail")
+        assert os.path.exists(watermark_path)
+
+    print("\n✅ Marca corrompida ou ausente OK!")
+
+
+def test_order_id_mode():
+    """
+    Modo order_id: traz os pedidos novos; alterações em pedidos antigos
+    ficam de fora (limitação do modo, ver WATERMARK_MODES).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        source = SyntheticSource(directory)
+        first = run(source, mode="order_id")
+        detail = first["sales_detail"].set_index("SalesOrderDetailID")
+
+        old_id = int(detail.index[10])
+        source.update_lines([old_id])
+        order_id, new_ids = source.insert_order(num_lines=2)
+
+        second = run(source, mode="order_id")
+        lines = second["sales_detail"].set_index("SalesOrderDetailID")
+        assert len(lines) == len(detail) + len(new_ids)
+        assert set(new_ids) <= set(lines.index)
+        assert order_id in set(second["sales_header"]["SalesOrderID"])
+        assert lines.loc[old_id, "OrderQty"] == detail.loc[old_id, "OrderQty"]
+
+        marks = load_watermarks(source.state_dir)
+        assert int(marks["sales_detail"]["SalesOrderID"]) == order_id
+
+        # Sem pedido novo: nada a buscar
+        marks_file = source.read_watermark_file()
+        run(source, mode="order_id")
+        assert source.read_watermark_file() == marks_file
+
+    print("\n✅ Modo order_id OK!")
+
+
+if __name__ == "__main__":
+    test_first_run_and_delta()
+    test_unchanged_watermark_is_noop()
+    test_corrupt_or_missing_watermark_file()
+    test_order_id_mode()
@@ -0,0 +1,102 @@
+"""
+Script para testar a troca de dados entre estágios por Arrow IPC.
+
+Não precisa do SQL Server: usa o banco SQLite do src.synthetic.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+from src.connection_pool import configure_pool, reset_pool
+from src.extract import extract_all
+from src.interchange import InterchangeSchemaError, open_stage, write_stage
+from src.load import load_data
+from src.synthetic import clear_table, create_sqlite_database, generate_data
+from src.transform import transform_data
+
+
+def test_roundtrip_is_zero_copy():
+    """As tabelas voltam iguais e as colunas numéricas apontam para o arquivo."""
+    data = generate_data(scale=0.05, seed=7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        stage_dir = write_stage(data, "extract", directory)
+
+        allocated = pa.total_allocated_bytes()
+        frames = open_stage(stage_dir)
+        assert pa.total_allocated_bytes() - allocated < 64 * 1024
+
+        for name, df in data.items():
+            pd.testing.assert_frame_equal(frames[name], df)
+
+        line_total = frames["Sales.SalesOrderDetail"]["LineTotal"].to_numpy()
+        assert not line_total.flags.owndata
+        assert not line_total.flags.writeable
+
+    print("\n✅ Arrow IPC sem cópia OK!")
+
+
+def test_schema_checked_on_open():
+    """Coluna faltando ou com tipo errado falha na abertura, não no meio do STEP."""
+    data = generate_data(scale=0.05, seed=7)
+    header = data["Sales.SalesOrderHeader"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        stage_dir = write_stage({"sales_header": header.drop(columns="OrderDate")}, "extract", directory)
+        try:
+            open_stage(stage_dir, expected={"sales_header": ["SalesOrderID", "OrderDate"]})
+            raise AssertionError("OrderDate ausente deveria falhar")
+        except InterchangeSchemaError as e:
+            assert "OrderDate" in str(e)
+
+        stage_dir = write_stage({"sales_header": header.astype({"OrderDate": str})}, "extract", directory)
+        try:
+            open_stage(stage_dir, expected={"sales_header": ["OrderDate"]})
+            raise AssertionError("OrderDate como texto deveria falhar")
+        except InterchangeSchemaError as e:
+            assert "timestamp" in str(e)
+
+    print("\n✅ Conferência de schema OK!")
+
+
+def test_stages_in_separate_processes():
+    """
+    extract_all grava, o transform roda em outro processo lendo a pasta
+    e o load carrega a pasta gravada pelo transform.
+    """
+    data = generate_data(scale=0.05, seed=7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        factory = create_sqlite_database(os.path.join(directory, "db"), data)
+        configure_pool(factory=factory)
+        try:
+            extract_dir = os.path.join(directory, "extract")
+            extracted = extract_all(interchange_dir=extract_dir)
+            expected = transform_data(extracted)
+
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                transformed = executor.submit(transform_data, extract_dir).result()
+            pd.testing.assert_frame_equal(transformed, expected)
+
+            transform_dir = write_stage(transformed, "transform", os.path.join(directory, "transform"))
+            clear_table(factory)
+            assert load_data(transform_dir, truncate=False)
+
+            conn = factory()
+            count = conn.execute("SELECT COUNT(*) FROM Analytics.ProductSalesMetrics").fetchone()[0]
+            conn.close()
+            assert count == len(expected)
+        finally:
+            reset_pool()
+
+    print("\n✅ Estágios em processos separados OK!")
+
+
+if __name__ == "__main__":
+    test_roundtrip_is_zero_copy()
+    test_schema_checked_on_open()
+    test_stages_in_separate_processes()
@@ -0,0 +1,164 @@
+"""
+Script para testar a tabela sombra do modo swap, o staging do merge e a
+criação da tabela de janelas/períodos.
+
+Não precisa do SQL Server: uma conexão falsa grava o SQL enviado e o
+teste confere que a sombra nasce da tabela principal (colunas pelo
+SELECT TOP 0 * INTO; DEFAULT, CHECK, índices e permissões copiados do
+catálogo) e que o swap é recusado quando a tabela tem o que a sombra
+não reproduz. No load_rollups, a tabela é criada antes do DELETE/INSERT
+quando não existe.
+"""
+
+from src.connection_pool import configure_pool, reset_pool
+from src.load import load_data, load_rollups
+from src.metrics import start_run
+from src.synthetic import generate_data
+from src.transform import transform_data
+
+
+class RecordingCursor:
+    def __init__(self, statements, row_count, blockers):
+        self.statements = statements
+        self.row_count = row_count
+        self.blockers = blockers
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        self.statements.append(" ".join(sql.split()))
+
+    def executemany(self, sql, rows):
+        self.statements.append(" ".join(sql.split()))
+
+    def fetchall(self):
+        # Só a consulta de bloqueios do swap devolve linhas
+        if "sys.triggers" in self.statements[-1]:
+            return [(blocker,) for blocker in self.blockers]
+        return []
+
+    def fetchone(self):
+        # Só o SELECT COUNT(*) da validação lê uma linha
+        return (self.row_count,)
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, row_count, blockers=()):
+        self.statements = []
+        self.row_count = row_count
+        self.blockers = list(blockers)
+
+    def cursor(self):
+        return RecordingCursor(self.statements, self.row_count, self.blockers)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def transformed_sample():
+    data = generate_data(scale=0.02, seed=3)
+    return transform_data({
+        "sales_detail": data["Sales.SalesOrderDetail"],
+        "sales_header": data["Sales.SalesOrderHeader"],
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    })
+
+
+def run_load(strategy, blockers=(), expect_success=True):
+    transformed = transformed_sample()
+    conn = RecordingConnection(len(transformed), blockers)
+    configure_pool(factory=lambda: conn, max_size=1)
+    try:
+        start_run()
+        assert load_data(transformed, strategy=strategy) is expect_success
+    finally:
+        reset_pool()
+    return [sql for sql in conn.statements if sql != "SELECT 1"]
+
+
+def test_swap_shadow_from_live_table():
+    statements = run_load("swap")
+    table = "Analytics.ProductSalesMetrics"
+    shadow = f"{table}_shadow"
+
+    def position(predicate):
+        return next(i for i, sql in enumerate(statements) if predicate(sql))
+
+    blockers = position(lambda sql: "sys.triggers" in sql)
+    create = statements.index(f"SELECT TOP 0 * INTO {shadow} FROM {table}")
+    constraints = position(lambda sql: "sys.default_constraints" in sql)
+    grants = position(lambda sql: "sys.database_permissions" in sql)
+    insert = position(lambda sql: sql.startswith(f"INSERT INTO {shadow}"))
+    indexes = position(lambda sql: "sys.indexes" in sql and "STRING_AGG" in sql)
+    rename = position(lambda sql: "sp_rename" in sql)
+
+    # Conferência antes de tudo; constraints e permissões antes da carga;
+    # índices depois da carga; troca por último
+    assert blockers < create < constraints < insert < indexes < rename
+    assert create < grants < insert
+    for i in (constraints, grants, indexes):
+        assert f"OBJECT_ID(N'{table}')" in statements[i]
+        assert shadow in statements[i]
+    assert "sys.check_constraints" in statements[constraints]
+
+    print("\n✅ Sombra criada a partir da tabela principal OK!")
+
+
+def test_swap_refused_when_table_has_unsupported_objects():
+    statements = run_load("swap", blockers=["trigger trg_Audit"], expect_success=False)
+
+    assert not any("SELECT TOP 0" in sql for sql in statements)
+    assert not any("sp_rename" in sql for sql in statements)
+
+    print("\n✅ Swap recusado com trigger na tabela OK!")
+
+
+def test_merge_staging_from_live_table():
+    statements = run_load("merge")
+
+    assert ("SELECT TOP 0 * INTO #ProductSalesMetrics_staging "
+            "FROM Analytics.ProductSalesMetrics") in statements
+
+    print("\n✅ Staging criado a partir da tabela principal OK!")
+
+
+def test_rollups_table_created_when_missing():
+    data = generate_data(scale=0.02, seed=3)
+    _, rollups = transform_data({
+        "sales_detail": data["Sales.SalesOrderDetail"],
+        "sales_header": data["Sales.SalesOrderHeader"],
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    }, windows=[1], grains=["year"])
+
+    conn = RecordingConnection(len(rollups))
+    configure_pool(factory=lambda: conn, max_size=1)
+    try:
+        start_run()
+        assert load_rollups(rollups, table_name="Analytics.Rollups2")
+    finally:
+        reset_pool()
+    statements = [sql for sql in conn.statements if sql != "SELECT 1"]
+
+    create = next(i for i, sql in enumerate(statements) if "CREATE TABLE" in sql)
+    delete = next(i for i, sql in enumerate(statements) if sql.startswith("DELETE FROM"))
+    assert create < delete
+    assert statements[create].startswith("IF OBJECT_ID(N'Analytics.Rollups2', N'U') IS NULL "
+                                         "CREATE TABLE Analytics.Rollups2 (")
+    assert "PRIMARY KEY (RollupKey, PeriodStart, ProductID)" in statements[create]
+
+    print("\n✅ Tabela de janelas/períodos criada se não existe OK!")
+
+
+if __name__ == "__main__":
+    test_swap_shadow_from_live_table()
+    test_swap_refused_when_table_has_unsupported_objects()
+    test_merge_staging_from_live_table()
+    test_rollups_table_created_when_missing()
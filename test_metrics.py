@@ -0,0 +1,57 @@
+"""
+Script para testar a instrumentação do ETL (src.metrics).
+
+Não precisa do SQL Server.
+"""
+
+import numpy as np
+
+from src.metrics import current_rss_mb, peak_rss_mb, reset_peak_rss, start_run
+
+
+def test_stage_memory_is_per_stage():
+    """
+    A variação de RSS é da própria etapa: uma etapa leve depois de uma
+    pesada não herda o pico da pesada.
+    """
+    if current_rss_mb() is None:
+        print("\n⚠️  RSS indisponível nesta plataforma: teste ignorado")
+        return
+
+    metrics = start_run("teste_memoria")
+    with metrics.stage("transform", "pesada"):
+        heavy = np.ones(40 * 1024 ** 2 // 8)   # 40 MB
+        heavy[::512] = 2.0
+    with metrics.stage("transform", "leve"):
+        del heavy
+
+    heavy_record, light_record = metrics.stages
+    assert heavy_record["rss_delta_mb"] > 30
+    assert light_record["rss_delta_mb"] < 0
+    assert "peak_rss_mb" not in light_record
+    # VmHWM e VmRSS vêm de contadores que o kernel atualiza em lotes de
+    # páginas: uma folga de 1 MB evita comparar ruído
+    assert light_record["process_peak_rss_mb"] >= heavy_record["rss_mb"] - 1
+
+    print("\n✅ Memória por etapa OK!")
+
+
+def test_reset_peak_rss():
+    """Depois do reset, o pico volta para perto do RSS atual."""
+    block = np.ones(40 * 1024 ** 2 // 8)
+    block[::512] = 2.0
+    del block
+    before = peak_rss_mb()
+
+    if not reset_peak_rss():
+        print("\n⚠️  Reset do pico indisponível nesta plataforma: teste ignorado")
+        return
+
+    assert peak_rss_mb() < before - 30
+
+    print("\n✅ Reset do pico de memória OK!")
+
+
+if __name__ == "__main__":
+    test_stage_memory_is_per_stage()
+    test_reset_peak_rss()
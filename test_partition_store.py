@@ -0,0 +1,141 @@
+"""
+Script para testar o store de vendas particionado por mês.
+
+Não precisa do SQL Server.
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+from src.partition_store import SalesPartitionStore
+from src.transform import transform_data
+from src.synthetic import generate_data
+
+
+def make_extract():
+    data = generate_data(scale=0.2, seed=7)
+    return {
+        "sales_detail": data["Sales.SalesOrderDetail"],
+        "sales_header": data["Sales.SalesOrderHeader"],
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    }
+
+
+def test_window_reads_only_recent_partitions():
+    """A janela de 2 anos lê só os meses da janela e gera as mesmas métricas."""
+    extracted = make_extract()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SalesPartitionStore(directory)
+        assert store.append_extract(extracted) == len(extracted["sales_detail"])
+        # O mesmo extract de novo não duplica nada
+        assert store.append_extract(extracted) == 0
+
+        max_date = store.max_order_date()
+        cutoff = max_date - pd.DateOffset(years=2)
+        files = store.files_for(start=cutoff)
+        all_files = store.files_for()
+        assert len(files) < len(all_files)
+        assert len(files) <= 25  # 24 meses + o mês do corte
+
+        result = transform_data(store.window_data(extracted["products"], years=2))
+        expected = transform_data(extracted)
+        pd.testing.assert_frame_equal(result, expected)
+
+    print("\n✅ Leitura da janela com pruning OK!")
+
+
+def test_append_new_months():
+    """Meses novos entram em arquivos novos; os antigos não são reescritos."""
+    extracted = make_extract()
+    header = extracted["sales_header"]
+    split_date = header["OrderDate"].quantile(0.8)
+
+    old_orders = header.loc[header["OrderDate"] < split_date, "SalesOrderID"]
+    detail = extracted["sales_detail"]
+    first = {"sales_detail": detail[detail["SalesOrderID"].isin(old_orders)], "sales_header": header}
+    # IDs do detalhe crescem com a data no gerador: o delta só tem IDs maiores
+    second = {"sales_detail": detail[~detail["SalesOrderID"].isin(old_orders)], "sales_header": header}
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SalesPartitionStore(directory)
+        store.append_extract(first)
+        before = {path: os.path.getmtime(path) for path in store.files_for()}
+
+        store.append_extract(second)
+        for path, mtime in before.items():
+            assert os.path.getmtime(path) == mtime
+
+        reopened = SalesPartitionStore(directory)
+        assert reopened.num_rows == len(detail)
+        lines = reopened.read()
+        assert lines["SalesOrderDetailID"].tolist() == sorted(detail["SalesOrderDetailID"].tolist())
+
+    print("\n✅ Append de meses novos OK!")
+
+
+def test_updated_rows_supersede_stored_versions():
+    """
+    Linhas já guardadas que mudaram na origem (reextraídas pelo
+    ModifiedDate, com IDs menores que o último guardado) entram como
+    correção: a leitura devolve só a versão nova, inclusive quando a
+    correção muda a linha de mês.
+    """
+    extracted = make_extract()
+    detail = extracted["sales_detail"]
+    header = extracted["sales_header"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SalesPartitionStore(directory)
+        store.append_extract(extracted)
+        files_before = sum(len(p["files"]) for p in store.partitions.values())
+
+        # Delta do watermark: linhas antigas alteradas + uma linha sem mudança
+        updated_ids = detail["SalesOrderDetailID"].iloc[[10, 500, 1500]].tolist()
+        unchanged_id = int(detail["SalesOrderDetailID"].iloc[20])
+        delta_detail = detail[detail["SalesOrderDetailID"].isin(updated_ids + [unchanged_id])].copy()
+        is_updated = delta_detail["SalesOrderDetailID"].isin(updated_ids)
+        delta_detail.loc[is_updated, "OrderQty"] += 5
+        delta_detail.loc[is_updated, "LineTotal"] *= 2
+
+        # Um dos pedidos alterados também mudou de data (outro mês)
+        moved_order = int(delta_detail.loc[delta_detail["SalesOrderDetailID"] == updated_ids[0],
+                                           "SalesOrderID"].iloc[0])
+        delta_header = header.copy()
+        moved_date = delta_header["OrderDate"].max()
+        delta_header.loc[delta_header["SalesOrderID"] == moved_order, "OrderDate"] = moved_date
+
+        assert store.append_extract({"sales_detail": delta_detail, "sales_header": delta_header}) == 3
+        assert sum(len(p["files"]) for p in store.partitions.values()) > files_before
+
+        reopened = SalesPartitionStore(directory)
+        assert reopened.num_rows == len(detail)
+        lines = reopened.read().set_index("SalesOrderDetailID")
+        assert lines.index.is_unique
+        assert len(lines) == len(detail)
+
+        expected = delta_detail.set_index("SalesOrderDetailID")
+        for detail_id in updated_ids:
+            assert lines.loc[detail_id, "OrderQty"] == expected.loc[detail_id, "OrderQty"]
+            assert lines.loc[detail_id, "LineTotal"] == expected.loc[detail_id, "LineTotal"]
+        assert lines.loc[updated_ids[0], "OrderDate"] == moved_date
+
+        # Leitura só do mês antigo (com pruning) não traz a versão substituída
+        moved_line = detail[detail["SalesOrderDetailID"] == updated_ids[0]]
+        old_date = header.loc[header["SalesOrderID"] == moved_order, "OrderDate"].iloc[0]
+        old_month = reopened.read(start=old_date.replace(day=1), end=old_date)
+        assert updated_ids[0] not in old_month["SalesOrderDetailID"].tolist()
+        assert len(moved_line) == 1
+
+        # O mesmo delta de novo não muda nada
+        assert reopened.append_extract({"sales_detail": delta_detail, "sales_header": delta_header}) == 0
+
+    print("\n✅ Correção de linhas alteradas OK!")
+
+
+if __name__ == "__main__":
+    test_window_reads_only_recent_partitions()
+    test_append_new_months()
+    test_updated_rows_supersede_stored_versions()
@@ -0,0 +1,55 @@
+"""
+Script para testar o modo particionado do transform_data (workers > 1).
+
+Não precisa do SQL Server.
+"""
+
+import pandas as pd
+
+from src.synthetic import generate_data
+from src.transform import transform_data
+
+
+def make_extract():
+    data = generate_data(scale=0.1, seed=7)
+    return {
+        "sales_detail": data["Sales.SalesOrderDetail"],
+        "sales_header": data["Sales.SalesOrderHeader"],
+        "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+    }
+
+
+def test_partitioned_matches_serial():
+    """Com 3 processos, métricas e rollups iguais aos do caminho serial."""
+    extracted = make_extract()
+
+    pd.testing.assert_frame_equal(transform_data(extracted, workers=3), transform_data(extracted))
+
+    serial, serial_rollups = transform_data(extracted, windows=[1, 3], grains=["quarter"])
+    result, rollups = transform_data(extracted, workers=3, windows=[1, 3], grains=["quarter"])
+    pd.testing.assert_frame_equal(result, serial)
+    key = ["RollupType", "RollupKey", "ProductID"]
+    pd.testing.assert_frame_equal(
+        rollups.sort_values(key).reset_index(drop=True),
+        serial_rollups.sort_values(key).reset_index(drop=True),
+    )
+
+    print("\n✅ Modo particionado igual ao serial OK!")
+
+
+def test_partitioned_empty_window():
+    """Sem vendas, os dois caminhos devolvem a mesma tabela vazia."""
+    extracted = make_extract()
+    empty = {**extracted, "sales_detail": extracted["sales_detail"].iloc[0:0]}
+
+    serial = transform_data(empty)
+    result = transform_data(empty, workers=3)
+    assert serial is not None and serial.empty
+    pd.testing.assert_frame_equal(result, serial)
+
+    print("\n✅ Janela vazia no modo particionado OK!")
+
+
+if __name__ == "__main__":
+    test_partitioned_matches_serial()
+    test_partitioned_empty_window()
@@ -0,0 +1,51 @@
+"""
+Script para testar o ETL em pipeline (src.pipeline).
+
+Não precisa do SQL Server: o pipeline lê o banco SQLite do src.synthetic,
+em chunks pequenos, e o resultado é comparado com o caminho em lote
+(extract_all + transform_data) sobre o mesmo banco.
+"""
+
+import os
+import tempfile
+
+from src.connection_pool import configure_pool, reset_pool
+from src.dimension import invalidate_product_dimension
+from src.extract import extract_all
+from src.metrics import start_run
+from src.pipeline import run_pipeline
+from src.synthetic import create_sqlite_database, generate_data
+from src.transform import transform_data
+
+
+def test_pipeline_matches_batch():
+    data = generate_data(scale=0.1, seed=11)
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_pool(factory=create_sqlite_database(os.path.join(directory, "db"), data))
+        invalidate_product_dimension()
+        try:
+            start_run()
+            expected = transform_data(extract_all())
+            # Chunks pequenos: muitos parciais somados no fim da extração
+            result = run_pipeline(chunksize=500, queue_depth=2, load=False)
+        finally:
+            reset_pool()
+            invalidate_product_dimension()
+
+    assert result is not None
+    assert list(result.columns) == list(expected.columns)
+    assert result["ProductID"].tolist() == expected["ProductID"].tolist()
+    assert result["Performance"].tolist() == expected["Performance"].tolist()
+    assert result["ProductName"].tolist() == expected["ProductName"].tolist()
+    assert (result["QtySold"] == expected["QtySold"]).all()
+    assert (result["NumOrders"] == expected["NumOrders"]).all()
+    assert (result["LastSaleDate"] == expected["LastSaleDate"]).all()
+    for column in ("TotalSales", "AvgUnitPrice", "AvgTicket", "GrossMargin", "AvgQtyPerOrder"):
+        assert (result[column] - expected[column]).abs().max() < 1e-6, column
+
+    print("\n✅ Pipeline igual ao ETL em lote OK!")
+
+
+if __name__ == "__main__":
+    test_pipeline_matches_batch()
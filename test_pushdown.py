@@ -0,0 +1,71 @@
+"""
+Script para testar o modo pushdown (src.pushdown).
+
+Não precisa do SQL Server: a query do pushdown roda no banco SQLite do
+src.synthetic (dialect="sqlite") e o resultado é comparado com o
+transform_data sobre a extração do mesmo banco. O teste contra o SQL
+Server de verdade é o teste_pushdown.py.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from src.connection_pool import configure_pool, reset_pool
+from src.dimension import invalidate_product_dimension
+from src.extract import extract_all
+from src.metrics import start_run
+from src.pushdown import build_pushdown_query, transform_pushdown
+from src.synthetic import create_sqlite_database, generate_data
+from src.transform import transform_data
+
+
+NUMERIC_COLUMNS = [
+    'TotalSales', 'QtySold', 'AvgUnitPrice', 'ListPrice', 'StandardCost',
+    'NumOrders', 'AvgTicket', 'GrossMargin', 'AvgQtyPerOrder'
+]
+
+
+def test_pushdown_matches_transform_on_sqlite():
+    data = generate_data(scale=0.1, seed=13)
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_pool(factory=create_sqlite_database(os.path.join(directory, "db"), data))
+        invalidate_product_dimension()
+        try:
+            start_run()
+            expected = transform_data(extract_all())
+            result = transform_pushdown(dialect="sqlite")
+        finally:
+            reset_pool()
+            invalidate_product_dimension()
+
+    assert result is not None
+    assert list(result.columns) == list(expected.columns)
+    assert result["ProductID"].tolist() == expected["ProductID"].tolist()
+    assert result["Performance"].tolist() == expected["Performance"].tolist()
+    assert result["ProductName"].astype(str).tolist() == expected["ProductName"].astype(str).tolist()
+    assert (result["LastSaleDate"] == expected["LastSaleDate"]).all()
+    for column in NUMERIC_COLUMNS:
+        same = np.isclose(result[column].astype(float), expected[column].astype(float),
+                          rtol=1e-9, equal_nan=True)
+        assert same.all(), column
+
+    print("\n✅ Pushdown no SQLite igual ao transform_data OK!")
+
+
+def test_unknown_dialect():
+    try:
+        build_pushdown_query(dialect="oracle")
+        raise AssertionError("dialeto desconhecido aceito")
+    except ValueError:
+        pass
+    assert "DATEADD(year, -3, MAX(OrderDate))" in build_pushdown_query(years=3)
+
+    print("\n✅ Dialeto do pushdown conferido OK!")
+
+
+if __name__ == "__main__":
+    test_pushdown_matches_transform_on_sqlite()
+    test_unknown_dialect()
@@ -0,0 +1,94 @@
+"""
+Script para testar o sketch de quantis (KLL) e o modo exato.
+
+Não precisa do SQL Server.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.quantile_sketch import ExactQuantiles, KLLSketch, k_for_error
+from src.transform import classify_performance
+
+from test_backends import make_sample_data
+
+
+QUANTILES = [0.5, 0.8, 0.95, 0.99]
+
+
+def true_rank(sorted_values, value):
+    return np.searchsorted(sorted_values, value, side='right') / len(sorted_values)
+
+
+def test_kll_error_bound():
+    """Quantis do KLL (streaming e merge de partições) dentro do erro garantido."""
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(8, 2, 500_000)
+    sorted_values = np.sort(values)
+
+    streaming = KLLSketch(k=200, seed=1)
+    for chunk in np.array_split(values, 50):
+        streaming.update(chunk)
+
+    merged = KLLSketch(k=200, seed=2)
+    for i, part in enumerate(np.array_split(values, 8)):
+        merged.merge(KLLSketch(k=200, seed=10 + i).update(part))
+
+    for sketch in (streaming, merged):
+        assert sketch.n == len(values)
+        assert sketch.num_retained < 1_000
+        for q in QUANTILES:
+            error = abs(true_rank(sorted_values, sketch.quantile(q)) - q)
+            assert error <= sketch.rank_error(), f"q={q}: erro {error:.4f} > {sketch.rank_error():.4f}"
+
+    assert KLLSketch.with_error(0.001).rank_error() <= 0.001
+    assert k_for_error(0.01) < k_for_error(0.001)
+
+    print("\n✅ KLL dentro do erro garantido!")
+
+
+def test_exact_matches_pandas():
+    """O modo exato (inclusive após merge) é igual ao Series.quantile()."""
+    values = np.random.default_rng(1).uniform(0, 1_000, 10_001)
+
+    exact = ExactQuantiles()
+    for part in np.array_split(values, 3):
+        exact.merge(ExactQuantiles().update(part))
+
+    for q in QUANTILES:
+        assert exact.quantile(q) == pd.Series(values).quantile(q)
+
+    print("\n✅ Modo exato igual ao pandas!")
+
+
+def test_classification_with_sketch():
+    """
+    A classificação com KLL só pode divergir da exata em produtos cujo
+    TotalSales está dentro da faixa de erro dos percentis.
+    """
+    data = make_sample_data(num_orders=20_000)
+    sales = pd.merge(data['sales_detail'], data['sales_header'], on='SalesOrderID')
+    totals = sales.groupby('ProductID', as_index=False)['LineTotal'].sum()
+    totals = totals.rename(columns={'LineTotal': 'TotalSales'})
+
+    exact = classify_performance(totals.copy())
+    exact_sketch = classify_performance(totals.copy(), ExactQuantiles().update(totals['TotalSales']))
+    assert exact['Performance'].equals(exact_sketch['Performance'])
+
+    sketch = KLLSketch(k=64, seed=3).update(totals['TotalSales'])
+    approx = classify_performance(totals.copy(), sketch)
+
+    sorted_values = np.sort(totals['TotalSales'].to_numpy())
+    ranks = np.array([true_rank(sorted_values, v) for v in totals['TotalSales']])
+    different = exact['Performance'] != approx['Performance']
+    near_threshold = (np.abs(ranks - 0.95) <= sketch.rank_error() + 1 / len(totals)) | \
+                     (np.abs(ranks - 0.80) <= sketch.rank_error() + 1 / len(totals))
+    assert not (different & ~near_threshold).any()
+
+    print(f"\n✅ Classificação com sketch OK ({different.sum()} produtos na fronteira)")
+
+
+if __name__ == "__main__":
+    test_kll_error_bound()
+    test_exact_matches_pandas()
+    test_classification_with_sketch()
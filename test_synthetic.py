@@ -0,0 +1,136 @@
+"""
+Script para testar o gerador sintético e o ETL sobre o SQLite local.
+
+Não precisa do SQL Server.
+"""
+
+import tempfile
+
+import pandas as pd
+
+from src.connection_pool import configure_pool, reset_pool
+from src.extract import extract_all
+from src.load import load_data, load_rollups
+from src.synthetic import clear_table, create_sqlite_database, generate_data
+from src.transform import transform_data
+
+
+def test_generator_is_deterministic():
+    """A mesma semente deve gerar os mesmos dados."""
+    first = generate_data(scale=0.05, seed=7)
+    second = generate_data(scale=0.05, seed=7)
+
+    for table_name, df in first.items():
+        pd.testing.assert_frame_equal(df, second[table_name])
+
+    detail = first["Sales.SalesOrderDetail"]
+    header = first["Sales.SalesOrderHeader"]
+    products = first["Production.Product"]
+    assert detail["SalesOrderID"].isin(header["SalesOrderID"]).all()
+    assert detail["ProductID"].isin(products["ProductID"]).all()
+
+    print("\n✅ Gerador determinístico e consistente!")
+
+
+def test_etl_on_sqlite():
+    """
+    O ETL lendo do SQLite deve chegar ao mesmo resultado que o
+    transform_data aplicado direto nos DataFrames gerados.
+    """
+    data = generate_data(scale=0.05, seed=7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        factory = create_sqlite_database(directory, data)
+        configure_pool(factory=factory)
+        try:
+            extracted = extract_all()
+            assert extracted is not None
+
+            result = transform_data(extracted)
+            expected = transform_data({
+                "sales_detail": data["Sales.SalesOrderDetail"],
+                "sales_header": data["Sales.SalesOrderHeader"],
+                "products": data["Production.Product"].rename(columns={"Name": "ProductName"}),
+            })
+
+            assert result["ProductID"].tolist() == expected["ProductID"].tolist()
+            assert result["Performance"].tolist() == expected["Performance"].tolist()
+            assert (result["TotalSales"] - expected["TotalSales"]).abs().max() < 1e-6
+
+            clear_table(factory)
+            assert load_data(result, truncate=False)
+            # validate_load usa T-SQL (TOP); aqui basta contar as linhas
+            conn = factory()
+            count = conn.execute("SELECT COUNT(*) FROM Analytics.ProductSalesMetrics").fetchone()[0]
+            conn.close()
+            assert count == len(result)
+        finally:
+            reset_pool()
+
+    print("\n✅ ETL sobre SQLite OK!")
+
+
+def test_pruned_extraction_matches():
+    """
+    A extração podada pela linhagem (com o filtro de data no banco) deve
+    trazer menos colunas e gerar as mesmas métricas.
+    """
+    data = generate_data(scale=0.05, seed=7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_pool(factory=create_sqlite_database(directory, data))
+        try:
+            expected = transform_data(extract_all())
+            pruned = extract_all(prune=True, cutoff_years=2)
+        finally:
+            reset_pool()
+
+    assert list(pruned["sales_header"].columns) == ["SalesOrderID", "OrderDate"]
+    assert "Color" not in pruned["products"].columns
+
+    result = transform_data(pruned)
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True), result.reset_index(drop=True))
+
+    print("\n✅ Extração podada OK!")
+
+
+def test_rollups_on_sqlite():
+    """
+    As janelas e períodos saem da mesma passada: a janela de 2 anos bate
+    com as métricas principais e a carga substitui só os RollupKey enviados.
+    """
+    data = generate_data(scale=0.05, seed=7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        factory = create_sqlite_database(directory, data)
+        configure_pool(factory=factory)
+        try:
+            result, rollups = transform_data(extract_all(), windows=[1, 2], grains=["month"])
+
+            window = rollups[rollups["RollupKey"] == "2y"].set_index("ProductID")
+            expected = result.set_index("ProductID").loc[window.index]
+            assert len(window) == len(result)
+            assert (window["QtySold"] == expected["QtySold"]).all()
+            assert (window["NumOrders"] == expected["NumOrders"]).all()
+            assert (window["TotalSales"] - expected["TotalSales"]).abs().max() < 1e-6
+
+            months = rollups[rollups["RollupKey"] == "month"]
+            assert abs(months["TotalSales"].sum() - data["Sales.SalesOrderDetail"]["LineTotal"].sum()) < 1e-3
+
+            assert load_rollups(rollups)
+            assert load_rollups(months)
+            conn = factory()
+            count = conn.execute("SELECT COUNT(*) FROM Analytics.ProductSalesRollups").fetchone()[0]
+            conn.close()
+            assert count == len(rollups)
+        finally:
+            reset_pool()
+
+    print("\n✅ Janelas e períodos OK!")
+
+
+if __name__ == "__main__":
+    test_generator_is_deterministic()
+    test_etl_on_sqlite()
+    test_pruned_extraction_matches()
+    test_rollups_on_sqlite()
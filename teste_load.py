@@ -1,41 +1,63 @@
 """
 Script para testar a carga de dados.
+
+Se uma execução anterior falhou, ela é retomada: os estágios já concluídos
+são lidos do checkpoint e a carga continua do último lote confirmado.
+Use --fresh para começar do zero.
 """
 
+import sys
+
+from src.checkpoint import RunCheckpoint
 from src.extract import extract_all
 from src.transform import transform_data
 from src.load import load_data, validate_load
+from src.metrics import get_metrics
 
 
-def test_full_etl():
+def test_full_etl(resume=True):
     """Testa o ETL completo (Extract, Transform, Load)."""
     
     print("🧪 TESTANDO ETL COMPLETO\n")
     
+    checkpoint = RunCheckpoint.resume_or_start(resume=resume)
+    
     print("FASE 1: EXTRAÇÃO")
     print("="*60)
-    data = extract_all()
+    data = checkpoint.load_frames("extract")
     
-    if not data:
-        print(" Falha na extração. Abortando.")
-        return
+    if data is None:
+        data = extract_all()
+        
+        if not data:
+            print(" Falha na extração. Abortando.")
+            return
+        
+        checkpoint.save_frames("extract", data)
     
     print("\n  FASE 2: TRANSFORMAÇÃO")
     print("="*60)
-    transformed = transform_data(data)
+    transformed = checkpoint.load_frames("transform")
     
     if transformed is None:
-        print(" Falha na transformação. Abortando.")
-        return
+        transformed = transform_data(data)
+        
+        if transformed is None:
+            print(" Falha na transformação. Abortando.")
+            return
+        
+        checkpoint.save_frames("transform", transformed)
     
     print("\n FASE 3: CARGA")
     print("="*60)
-    success = load_data(transformed)
+    success = load_data(transformed, checkpoint=checkpoint)
     
     if not success:
-        print(" Falha na carga.")
+        print(f" Falha na carga. Rode de novo para retomar a execução {checkpoint.run_id}.")
         return
     
+    checkpoint.finish()
+    
     print("\n FASE 4: VALIDAÇÃO")
     print("="*60)
     stats = validate_load()
@@ -46,7 +68,11 @@ def test_full_etl():
         print("="*60)
     else:
         print("\n  ETL concluído mas validação falhou.")
+    
+    metrics = get_metrics()
+    metrics.print_summary()
+    metrics.write_report()
 
 
 if __name__ == "__main__":
-    test_full_etl()
\ No newline at end of file
+    test_full_etl(resume="--fresh" not in sys.argv)
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Script para comparar a transformação pandas com o modo pushdown.
+"""
+
+import numpy as np
+
+from src.extract import extract_all
+from src.pushdown import transform_pushdown
+from src.transform import transform_data
+
+
+NUMERIC_COLUMNS = [
+    'TotalSales', 'QtySold', 'AvgUnitPrice', 'ListPrice', 'StandardCost',
+    'NumOrders', 'AvgTicket', 'GrossMargin', 'AvgQtyPerOrder'
+]
+
+
+def test_pushdown_matches_pandas():
+    """
+    Roda os dois caminhos e confere se as métricas batem.
+    """
+
+    print("🧪 COMPARANDO PANDAS x PUSHDOWN\n")
+
+    data = extract_all()
+    if not data:
+        print("❌ Falha na extração. Abortando teste.")
+        return False
+
+    expected = transform_data(data)
+    result = transform_pushdown()
+
+    if expected is None or result is None:
+        print("❌ Uma das transformações falhou.")
+        return False
+
+    expected = expected.set_index('ProductID').sort_index()
+    result = result.set_index('ProductID').sort_index()
+
+    ok = True
+
+    if not expected.index.equals(result.index):
+        print("❌ Conjunto de produtos diferente")
+        return False
+
+    for col in NUMERIC_COLUMNS:
+        # SUM de decimal no banco x soma de float no pandas: só a ordem
+        # de soma muda, então a comparação é com tolerância relativa
+        same = np.isclose(
+            expected[col].astype(float),
+            result[col].astype(float),
+            rtol=1e-9,
+            equal_nan=True
+        ).all()
+        print(f"   {'✅' if same else '❌'} {col}")
+        ok = ok and same
+
+    for col in ['LastSaleDate', 'ProductName', 'Performance']:
+        # Texto evita falso negativo por dtype (datetime64[ns] x [us], object x str)
+        same = expected[col].astype(str).equals(result[col].astype(str))
+        print(f"   {'✅' if same else '❌'} {col}")
+        ok = ok and same
+
+    if ok:
+        print("\n✅ Pushdown igual ao caminho pandas!")
+    else:
+        print("\n❌ Diferenças encontradas.")
+
+    return ok
+
+
+if __name__ == "__main__":
+    test_pushdown_matches_pandas()